@@ -35,6 +35,7 @@ void print_misc(xed_decoded_inst_t* xedd) {
     xed_uint_t np = xed_decoded_inst_get_nprefixes(xedd);
 
     xed_isa_set_enum_t isaset = xed_decoded_inst_get_isa_set(xedd);
+    xed_uint_t classes = xed_isa_set_classify(isaset);
 
     if (xed_operand_values_has_real_rep(ov)) {
         xed_iclass_enum_t norep =
@@ -72,19 +73,19 @@ void print_misc(xed_decoded_inst_t* xedd) {
     if (xed_decoded_inst_is_broadcast(xedd))
         printf("BROADCAST\n");
     
-    if ( xed_classify_sse(xedd) || xed_classify_avx(xedd) || xed_classify_avx512(xedd) )
+    if (classes & (XED_CLASS_SSE|XED_CLASS_AVX|XED_CLASS_AVX512))
     {
-        if (xed_classify_avx512_maskop(xedd))
+        if (classes & XED_CLASS_AVX512_MASKOP)
             printf("AVX512 KMASK-OP\n");
         else {
             xed_bool_t sse = 0;
-            if (xed_classify_sse(xedd)) {
+            if (classes & XED_CLASS_SSE) {
                 sse = 1;
                 printf("SSE\n");
             }
-            else if (xed_classify_avx(xedd))
+            else if (classes & XED_CLASS_AVX)
                 printf("AVX\n");
-            else if (xed_classify_avx512(xedd))
+            else if (classes & XED_CLASS_AVX512)
                 printf("AVX512\n");
             
             if (xed_decoded_inst_get_attribute(xedd, XED_ATTRIBUTE_SIMD_SCALAR))
@@ -145,6 +145,10 @@ xed_stats_zero(xed_stats_t* p,
 
 static xed_stats_t xed_dec_stats; 
 static xed_stats_t xed_enc_stats;
+static xed_stats_t xed_fmt_stats; // only when printing the disassembly
+#if defined(XED_DECODER)
+static xed_uint64_t xed_iform_counts[XED_IFORM_LAST];
+#endif
 
 void xed_disas_info_init(xed_disas_info_t* p)
 {
@@ -406,9 +410,35 @@ print_decode_stats_internal( xed_disas_info_t*di,
         dump_histo(p->histo, XED_HISTO_BINS, XED_HISTO_CYCLES_PER_BIN);
 }
 
+#if defined(XED_DECODER)
+static void
+write_iform_histo(xed_disas_info_t* di)
+{
+    /* lines of "IFORM count" for the generator's --layout-profile */
+    unsigned int i;
+    FILE* f = fopen(di->iform_histo_file, "w");
+    if (!f) {
+        fprintf(stderr,"ERROR: Could not open %s\n", di->iform_histo_file);
+        return;
+    }
+    for(i=0;i<XED_IFORM_LAST;i++)
+        if (xed_iform_counts[i])
+            fprintf(f, "%s " XED_FMT_LU "\n",
+                    xed_iform_enum_t2str(XED_STATIC_CAST(xed_iform_enum_t,i)),
+                    xed_iform_counts[i]);
+    fclose(f);
+}
+#endif
+
 void xed_print_decode_stats(xed_disas_info_t* di)
 {
     print_decode_stats_internal(di, &xed_dec_stats, "XED3", "DECODE");
+    if (xed_fmt_stats.total_insts)
+        print_decode_stats_internal(di, &xed_fmt_stats, "XED3", "FORMAT");
+#if defined(XED_DECODER)
+    if (di->iform_histo_file)
+        write_iform_histo(di);
+#endif
 }
 
 void xed_print_encode_stats(xed_disas_info_t* di)
@@ -1065,17 +1095,21 @@ emit_disasm(xed_disas_info_t* di,
         {
             char buffer[XED_TMP_BUF_LEN];
             char const* fmt = "XDIS " XED_FMT_LX ": ";
+            xed_uint64_t t1,t2;
             if (di->format_options.lowercase_hex==0)
                 fmt = "XDIS " XED_FMT_LX_UPPER ": ";
                               
             printf(fmt, runtime_instruction_address);
             emit_cat_ext_ast(xedd,di);
             emit_hex(xedd, z);
+            t1 = xed_get_time();
             disassemble(di,
                         buffer,XED_TMP_BUF_LEN,
                         xedd, 
                         runtime_instruction_address, 
                         di->caller_symbol_data);
+            t2 = xed_get_time();
+            xed_stats_update(&xed_fmt_stats, t1, t2);
             printf( "%s",buffer);
             if (gs) {
                 xed_dot_graph_add_instruction(
@@ -1165,6 +1199,7 @@ void xed_disas_test(xed_disas_info_t* di)
 
     if (first) {
         xed_stats_zero(&xed_dec_stats, di);
+        xed_stats_zero(&xed_fmt_stats, di);
         first = 0;
     }
 
@@ -1275,6 +1310,8 @@ void xed_disas_test(xed_disas_info_t* di)
             
             xed_stats_update(&xed_dec_stats, t1, t2);
             length = xed_decoded_inst_get_length(&xedd);
+            if (okay && di->iform_histo_file)
+                xed_iform_counts[xed_decoded_inst_get_iform_enum(&xedd)]++;
 
             if (okay && length == 0) 
                 die_zero_len(runtime_instruction_address, z, di, xed_error);
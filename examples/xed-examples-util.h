@@ -80,6 +80,7 @@ typedef struct {
     unsigned int perf_tail_start;
     xed_bool_t ast;
     xed_bool_t histo;
+    char* iform_histo_file; /* write iform counts here */
     xed_chip_enum_t chip;
     xed_bool_t emit_isa_set;    
     xed_format_options_t format_options;
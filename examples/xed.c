@@ -39,8 +39,14 @@ END_LEGAL */
 #include <stdlib.h>
 #include <stdio.h>
 #include <assert.h>
+#if !defined(_WIN32)
+# include <unistd.h>
+# include <fcntl.h>
+# include <sys/wait.h>
+#endif
 
 int main(int argc, char** argv);
+static int xed_main(int argc, char** argv);
 static int intel_asm_emit = 0;
 
 ////////////////////////////////////////////////////////////////////////////
@@ -268,6 +274,8 @@ static void usage(char* prog) {
       "\t               for disassembly)",
       "\t-ast          (Show the AVX/SSE transition classfication)",
       "\t-histo        (Histogram decode times)",
+      "\t-iform-histo file (Write the decoded iform counts to file.",
+      "\t               Input for the generator's --layout-profile)",
       "",
       "\t-I            (Intel syntax for disassembly)",
       "\t-A            (ATT SYSV syntax for disassembly)",
@@ -309,6 +317,12 @@ static void usage(char* prog) {
 #endif
       "\t-version      (The version message)",
       "\t-help         (This help message)",
+#if !defined(_WIN32)
+      "\t--batch       (Run the commands read from stdin. Each line is:",
+      "\t               stdout-file stderr-file xed-path [options].",
+      "\t               Prints the exit status of each command.",
+      "\t               Must be the only option.)",
+#endif
       " ",
       0
     };      
@@ -373,9 +387,106 @@ static void list_chips(void)
     printf("\n");
 }
 
+#if !defined(_WIN32)
+# define XED_BATCH_MAX_LINE 65536
+# define XED_BATCH_MAX_ARGS 1024
+
+/* Run one command of the batch in a child process, with its stdout
+ * and stderr going to the named files. Return the exit status in the
+ * same way as the shell does. */
+static int batch_run_one(char* out_fn, char* err_fn, int argc, char** argv)
+{
+    pid_t pid;
+    int status;
+
+    fflush(stdout);
+    fflush(stderr);
+    pid = fork();
+    if (pid < 0) {
+        perror("fork");
+        return -1;
+    }
+    if (pid == 0) {
+        int in_fd = open("/dev/null", O_RDONLY);
+        int out_fd = open(out_fn, O_WRONLY|O_CREAT|O_TRUNC, 0644);
+        int err_fd = open(err_fn, O_WRONLY|O_CREAT|O_TRUNC, 0644);
+        if (in_fd < 0 || out_fd < 0 || err_fd < 0) {
+            perror("open");
+            _exit(127);
+        }
+        /* stdin is the pipe with the rest of the batch. Do not let a
+         * command that reads stdin (like -F) consume it. freopen also
+         * drops the batch lines already buffered in stdin. */
+        dup2(in_fd, 0);
+        dup2(out_fd, 1);
+        dup2(err_fd, 2);
+        close(in_fd);
+        close(out_fd);
+        close(err_fd);
+        if (!freopen("/dev/null", "r", stdin)) {
+            perror("freopen");
+            _exit(127);
+        }
+        exit(xed_main(argc, argv)); /* exit() flushes stdio */
+    }
+    if (waitpid(pid, &status, 0) < 0) {
+        perror("waitpid");
+        return -1;
+    }
+    if (WIFEXITED(status))
+        return WEXITSTATUS(status);
+    if (WIFSIGNALED(status))
+        return 128 + WTERMSIG(status);
+    return -1;
+}
+
+/* Read commands from stdin and run them without starting a new
+ * program or initializing the tables for each one. The tests in
+ * tests/run-cmd.py use this. The tables are initialized once here and
+ * the forked children inherit them. */
+static int xed_batch(void)
+{
+    static char line[XED_BATCH_MAX_LINE];
+    char* args[XED_BATCH_MAX_ARGS+1];
+    int nargs;
+    char* p;
+
+    xed_tables_init();
+    while (fgets(line, sizeof(line), stdin)) {
+        nargs = 0;
+        for(p = strtok(line, " \t\r\n");
+            p && nargs < XED_BATCH_MAX_ARGS;
+            p = strtok(0, " \t\r\n"))
+        {
+            args[nargs++] = p;
+        }
+        args[nargs] = 0;
+        if (nargs == 0)
+            continue;
+        if (nargs < 3) {
+            printf("-1\n");
+            fflush(stdout);
+            continue;
+        }
+        printf("%d\n", batch_run_one(args[0], args[1], nargs-2, args+2));
+        fflush(stdout);
+    }
+    return 0;
+}
+#endif
 
 int
 main(int argc, char** argv)
+{
+#if !defined(_WIN32)
+    if (argc == 2 && strcmp(argv[1], "--batch") == 0)
+        return xed_batch();
+#endif
+    return xed_main(argc, argv);
+}
+
+static int
+xed_main(int argc, char** argv)
 {
     xed_bool_t sixty_four_bit = 0;
     xed_bool_t mpx_mode = 0;
@@ -406,6 +517,7 @@ main(int argc, char** argv)
     xed_bool_t resync = 0;
     xed_bool_t ast = 0;
     xed_bool_t histo = 0;
+    char* iform_histo_file = 0;
     xed_bool_t line_numbers = 0;
     xed_chip_enum_t xed_chip = XED_CHIP_INVALID;
     xed_operand_enum_t operand = XED_OPERAND_INVALID;
@@ -476,6 +588,12 @@ main(int argc, char** argv)
             histo = 1;
 	    continue;
         }
+        if (strcmp(argv[i], "-iform-histo") ==0)   {
+            test_argc(i,argc);
+            iform_histo_file = argv[i+1];
+            i++;
+	    continue;
+        }
         else if (strcmp(argv[i],"-d")==0)         {
             test_argc(i,argc);
             for(j=i+1; j< argc;j++) 
@@ -779,6 +897,7 @@ main(int argc, char** argv)
     decode_info.perf_tail_start  = perf_tail;
     decode_info.ast              = ast;
     decode_info.histo            = histo;
+    decode_info.iform_histo_file = iform_histo_file;
     decode_info.chip             = xed_chip;
     decode_info.mpx_mode         = mpx_mode;
     decode_info.cet_mode         = cet_mode;
@@ -932,6 +1051,7 @@ main(int argc, char** argv)
     (void) resync;
     (void) ast;
     (void) histo;
+    (void) iform_histo_file;
     (void) line_numbers;
     (void) dot_output_file_name;
     (void) dot;
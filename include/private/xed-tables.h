@@ -73,26 +73,27 @@ extern const xed_uint32_t xed_iform_max_per_iclass_table[XED_ICLASS_LAST];
 /* more miscellaneous stuff */
 
 /* names for each over-ridden iclass.  Even entries are Intel. The subsquent odd
-   entry is the ATTY SYSV name. */
+   entry is the ATTY SYSV name. The names are offsets in to the pool. */
+XED_DLL_EXPORT extern const char xed_iclass_string_pool[];
 XED_DLL_EXPORT extern 
-char const* const xed_iclass_string[XED_ICLASS_NAME_STR_MAX];
+const xed_uint16_t xed_iclass_string_offset[XED_ICLASS_NAME_STR_MAX];
 
 // the high level reg class for each register.
-XED_GLOBAL_EXTERN xed_reg_class_enum_t xed_reg_class_array[XED_REG_LAST];
+extern const xed_reg_class_enum_t xed_reg_class_array[XED_REG_LAST];
 // for just the GPR types: refines to REG8,16,32,64
-XED_GLOBAL_EXTERN xed_reg_class_enum_t xed_gpr_reg_class_array[XED_REG_LAST];
+extern const xed_reg_class_enum_t xed_gpr_reg_class_array[XED_REG_LAST];
 
 // the width in bits for each register.
 // 2nd index 0=32b and 1=64b
-XED_GLOBAL_EXTERN xed_uint_t xed_reg_width_bits[XED_REG_LAST][2];
+extern const xed_uint_t xed_reg_width_bits[XED_REG_LAST][2];
 
 // map each register to the largest enclosing register (for nested
 // registers) or back to itself if there is no outer nesting.
-XED_GLOBAL_EXTERN xed_reg_enum_t xed_largest_enclosing_register_array[XED_REG_LAST];
-XED_GLOBAL_EXTERN xed_reg_enum_t xed_largest_enclosing_register_array_32[XED_REG_LAST];
+extern const xed_reg_enum_t xed_largest_enclosing_register_array[XED_REG_LAST];
+extern const xed_reg_enum_t xed_largest_enclosing_register_array_32[XED_REG_LAST];
 
 // OC2 width codes. The 2nd index is the effective operand size (1,2, or 3)
-XED_GLOBAL_EXTERN xed_uint16_t xed_width_bits[XED_OPERAND_WIDTH_LAST][4];
+extern const xed_uint16_t xed_width_bits[XED_OPERAND_WIDTH_LAST][4];
 
 // the default type of the operand elements 
 XED_GLOBAL_EXTERN 
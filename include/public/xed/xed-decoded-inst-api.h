@@ -687,6 +687,35 @@ xed_classify_avx(const xed_decoded_inst_t* d);
 XED_DLL_EXPORT xed_bool_t
 xed_classify_sse(const xed_decoded_inst_t* d);
 
+/// @ingroup DEC
+/// Class bits returned by #xed_isa_set_classify() and #xed_classify().
+/// They match the xed_classify_* functions above.
+#define XED_CLASS_AVX512         0x1
+#define XED_CLASS_AVX512_MASKOP  0x2
+#define XED_CLASS_AVX            0x4
+#define XED_CLASS_SSE            0x8
+
+/// @ingroup DEC
+/// The XED_CLASS_* bits of each #xed_isa_set_enum_t. Use
+/// #xed_isa_set_classify() or #xed_classify().
+XED_DLL_GLOBAL extern const xed_uint8_t
+xed_isa_set_class_table[XED_ISA_SET_LAST];
+
+/// @ingroup DEC
+/// Return the XED_CLASS_* bits of the ISA set. Several classes can be
+/// tested at once, for example (xed_isa_set_classify(isa_set) &
+/// (XED_CLASS_AVX|XED_CLASS_AVX512)).
+static XED_INLINE xed_uint_t
+xed_isa_set_classify(xed_isa_set_enum_t isa_set) {
+    return xed_isa_set_class_table[isa_set];
+}
+/// @ingroup DEC
+/// Return the XED_CLASS_* bits of the decoded instruction.
+static XED_INLINE xed_uint_t
+xed_classify(const xed_decoded_inst_t* d) {
+    return xed_isa_set_classify(xed_decoded_inst_get_isa_set(d));
+}
+
 //@}
 #endif
 
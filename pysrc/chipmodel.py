@@ -238,13 +238,14 @@ def work(arg):
     hfe.start()
 
     
-    cfe.write("xed_uint64_t xed_chip_features[XED_CHIP_LAST][4];\n")
-    hfe.write("extern xed_uint64_t xed_chip_features[XED_CHIP_LAST][4];\n")
+    # a fully initialized const table so that there is no init-time work
+    cfe.write("const xed_uint64_t xed_chip_features[XED_CHIP_LAST][4] = {\n")
+    hfe.write("extern const xed_uint64_t xed_chip_features[XED_CHIP_LAST][4];\n")
 
-    fo = codegen.function_object_t('xed_init_chip_model_info', 'void')    
-    fo.add_code_eol("const xed_uint64_t one=1")
+    one = 'XED_CAST(xed_uint64_t,1)'
     # make a set for each machine name
     spacing = "\n      |"
+    cfe.write("/* INVALID */ { 0, 0, 0, 0 },\n")
     for c in chips:
         s0 = ['0']
         s1 = ['0']
@@ -255,13 +256,13 @@ def work(arg):
             feature_index = _feature_index(isa_set,f)
 
             if feature_index < 64:
-                s0.append('(one<<XED_ISA_SET_%s)' % (f))
+                s0.append('(%s<<XED_ISA_SET_%s)' % (one,f))
             elif feature_index < 128:
-                s1.append('(one<<(XED_ISA_SET_%s-64))' % (f))
+                s1.append('(%s<<(XED_ISA_SET_%s-64))' % (one,f))
             elif feature_index < 192:
-                s2.append('(one<<(XED_ISA_SET_%s-128))' % (f))
+                s2.append('(%s<<(XED_ISA_SET_%s-128))' % (one,f))
             elif feature_index < 256:
-                s3.append('(one<<(XED_ISA_SET_%s-192))' % (f))
+                s3.append('(%s<<(XED_ISA_SET_%s-192))' % (one,f))
             else:
                 _die("Feature index > 256. Need anotehr features array")
 
@@ -269,13 +270,12 @@ def work(arg):
         s1s = spacing.join(s1)
         s2s = spacing.join(s2)
         s3s = spacing.join(s3)
-        
-        for i,x in enumerate([s0s, s1s, s2s,s3s]):
-            fo.add_code_eol("xed_chip_features[XED_CHIP_{}][{}] = {}".format(c,i,x) )
 
-    cfe.write(fo.emit())
+        cfe.write("/* {} */ {{\n      {},\n      {},\n      {},\n      {} }},\n".format(
+            c, s0s, s1s, s2s, s3s))
+
+    cfe.write("};\n")
     cfe.close()
-    hfe.write(fo.emit_header())
     hfe.close()
 
     return ( [ isa_set_per_chip_fn,
@@ -25,19 +25,30 @@ import genutil
 import codegen
 
 
-def _emit_function(fe, isa_sets, name):
+# (classifier function name suffix, XED_CLASS_* bit name). The bits are
+# defined in xed-decoded-inst-api.h.
+_classes = [('avx512',        'XED_CLASS_AVX512'),
+            ('avx512_maskop', 'XED_CLASS_AVX512_MASKOP'),
+            ('avx',           'XED_CLASS_AVX'),
+            ('sse',           'XED_CLASS_SSE')]
+
+def _emit_table(fe, all_isa_sets, isa_sets_per_class):
+    """Emit one byte of XED_CLASS_* bits for each ISA set, in the
+    xed_isa_set_enum_t order"""
+    fe.add_code('const xed_uint8_t xed_isa_set_class_table[XED_ISA_SET_LAST] = {')
+    for isa_set in all_isa_sets:
+        bits = [ bit for (name, bit) in _classes
+                 if isa_set in isa_sets_per_class[name] ]
+        if not bits:
+            bits = ['0']
+        fe.add_code('/* {} */ {},'.format(isa_set, '|'.join(bits)))
+    fe.add_code('};')
+
+def _emit_function(fe, name, bit):
     fo = codegen.function_object_t('xed_classify_{}'.format(name)) 
     fo.add_arg('const xed_decoded_inst_t* d')
     fo.add_code_eol('    const xed_isa_set_enum_t isa_set = xed_decoded_inst_get_isa_set(d)')
-    # FIXME: 2017-07-14 optimization: could use a static array for faster checking, smaller code
-    switch = codegen.c_switch_generator_t('isa_set', fo)
-    for c in isa_sets:
-        switch.add_case('XED_ISA_SET_{}'.format(c.upper()),[],do_break=False)
-    if len(isa_sets) > 0:
-        switch.add('return 1;')
-    switch.add_default(['return 0;'], do_break=False)
-    switch.finish()
-    
+    fo.add_code_eol('    return (xed_isa_set_class_table[isa_set] & {}) != 0'.format(bit))
     fo.emit_file_emitter(fe)
 
 
@@ -67,10 +78,20 @@ def work(agi):
                      and not re.search('X87',ii.isa_set) and not re.search('MWAIT',ii.isa_set)):
                      sse_isa_sets.add(ii.isa_set)
                  
+    isa_sets_per_class = { 'avx512':        avx512_isa_sets,
+                           'avx512_maskop': avx512_kmask_op,
+                           'avx':           avx_isa_sets,
+                           'sse':           sse_isa_sets }
+    all_isa_sets = agi.all_enums['xed_isa_set_enum_t']
+    for name, isa_sets in isa_sets_per_class.items():
+        for isa_set in isa_sets:
+            if isa_set.upper() not in all_isa_sets:
+                genutil.die("Classifier ISA set {} is not in the chip model".format(isa_set))
+        isa_sets_per_class[name] = set([ x.upper() for x in isa_sets ])
+
     fe = agi.open_file('xed-classifiers.c') # xed_file_emitter_t
-    _emit_function(fe, avx512_isa_sets, 'avx512')
-    _emit_function(fe, avx512_kmask_op, 'avx512_maskop')
-    _emit_function(fe, avx_isa_sets,    'avx')
-    _emit_function(fe, sse_isa_sets,    'sse')
+    _emit_table(fe, all_isa_sets, isa_sets_per_class)
+    for (name, bit) in _classes:
+        _emit_function(fe, name, bit)
     fe.close()
     return
@@ -24,6 +24,8 @@ import sys
 import os
 import re
 import glob
+import hashlib
+import zlib
 
 from genutil import *
 def find_dir(d):
@@ -68,6 +70,100 @@ class ip_header_t(object):
       return out
 
 
+class emit_manifest_t(object):
+   """Digests of the files we emitted in to one directory. Stored in
+   the directory and consulted on the next run so that we can leave
+   files with unchanged contents (and timestamps) alone. That keeps
+   the build from recompiling them."""
+   manifest_file_name = '.xed-emit-manifest.txt'
+
+   def __init__(self, gendir):
+      self.gendir = gendir
+      self.full_file_name = os.path.join(gendir,
+                                         emit_manifest_t.manifest_file_name)
+      self.entries = {} # file name -> (digest, size, mtime)
+      self.changed = 0
+      self.unchanged = 0
+      self.modified = False
+      self._read()
+
+   def _read(self):
+      if not os.path.exists(self.full_file_name):
+         return
+      for line in open(self.full_file_name,'r').readlines():
+         wrds = line.rstrip('\n').split(' ',3)
+         if len(wrds) == 4:
+            (digest, size, mtime, fn) = wrds
+            self.entries[fn] = (digest, int(size), float(mtime))
+
+   def write(self):
+      if not self.modified:
+         return
+      fp = base_open_file(self.full_file_name,'w')
+      for fn in sorted(self.entries.keys()):
+         (digest, size, mtime) = self.entries[fn]
+         fp.write('%s %d %r %s\n' % (digest, size, mtime, fn))
+      fp.close()
+      self.modified = False
+
+   def _record(self, fn, digest):
+      st = os.stat(fn)
+      self.entries[fn] = (digest, st.st_size, st.st_mtime)
+      self.modified = True
+
+   def unchanged_file(self, fn, contents):
+      """Return a tuple (same, digest) where same is True if the file fn
+      already holds contents and digest is the digest of contents."""
+      digest = hashlib.sha1(contents.encode('utf-8')).hexdigest()
+      if not os.path.exists(fn):
+         return (False, digest)
+      st = os.stat(fn)
+      if fn in self.entries:
+         (old_digest, size, mtime) = self.entries[fn]
+         # only trust the recorded digest if the file has not been
+         # touched since we recorded it.
+         if size == st.st_size and mtime == st.st_mtime:
+            return (old_digest == digest, digest)
+      if open(fn,'r').read() == contents:
+         self._record(fn, digest)
+         return (True, digest)
+      return (False, digest)
+
+   def emit(self, fn, contents, open_file):
+      """Write contents to the file fn unless the file already holds
+      exactly those contents. open_file is a function that takes a file
+      name and mode and returns a file object."""
+      (same, digest) = self.unchanged_file(fn, contents)
+      if same:
+         self.unchanged += 1
+         return False
+      fp = open_file(fn,"w")
+      fp.write(contents)
+      fp.close()
+      self._record(fn, digest)
+      self.changed += 1
+      return True
+
+_emit_manifests = {} # gendir -> emit_manifest_t
+def get_emit_manifest(gendir):
+   gendir = os.path.normpath(gendir)
+   if gendir not in _emit_manifests:
+      _emit_manifests[gendir] = emit_manifest_t(gendir)
+   return _emit_manifests[gendir]
+
+def write_emit_manifests():
+   """Save the manifests for all the directories we emitted files in
+   to. Returns a tuple of the number of (changed, unchanged) files."""
+   changed = 0
+   unchanged = 0
+   for gendir in sorted(_emit_manifests.keys()):
+      m = _emit_manifests[gendir]
+      m.write()
+      changed += m.changed
+      unchanged += m.unchanged
+   msgb("EMITTED FILES", "%d changed, %d unchanged" % (changed, unchanged))
+   return (changed, unchanged)
+
 class file_emitter_t(object):
    """Attach IP headers, standard includes, and namespace decorations
    to generated files. This replaces the file objects I was using for
@@ -165,10 +261,12 @@ class file_emitter_t(object):
          msge("FE: Closing an already-closed file: " + self.full_file_name)
 
    def emit_file(self):
-      msge("FE:EMIT_FILE " + self.full_file_name)
-      fp = self.open_file(self.full_file_name,"w")
-      fp.writelines(self.lines)
-      fp.close()
+      manifest = get_emit_manifest(self.gendir)
+      if manifest.emit(self.full_file_name, ''.join(self.lines),
+                       self.open_file):
+         msge("FE:EMIT_FILE " + self.full_file_name)
+      else:
+         msge("FE:UNCHANGED " + self.full_file_name)
 
    # # # # # # # # # #   # # # # # # # # # #   # # # # # # # # # #
 
@@ -420,6 +518,46 @@ def dump_flist_2_header(h_file, functions, headers,
 
     h_file.close()
 
+def _stable_shards(func_list, max_lines_per_file):
+   """Return a list of lists of functions. Each function goes in to the
+   shard selected by a crc of its name. The number of shards is a
+   power of two, starting with the smallest one that keeps the average
+   shard under 3/4 of max_lines_per_file. It is doubled, which splits
+   each shard in two, until no shard has more than max_lines_per_file
+   lines. Functions that are larger than max_lines_per_file by
+   themselves (and functions whose name crcs collide) are not counted
+   since no split can help them. Functions keep their relative order
+   within a shard."""
+   total_lines = 0
+   for func in func_list:
+      total_lines += func.lines()
+   target_lines = max(1, 3 * max_lines_per_file // 4)
+   nshards = 1
+   while nshards * target_lines < total_lines:
+      nshards *= 2
+   # (function, crc of its name, lines that count against the limit)
+   entries = []
+   for func in func_list:
+      crc = zlib.crc32(func.get_function_name().encode('utf-8')) & 0xffffffff
+      lines = func.lines()
+      if lines > max_lines_per_file:
+         lines = 0
+      entries.append((func, crc, lines))
+   while True:
+      shards = [ [] for i in range(nshards) ]
+      for entry in entries:
+         shards[entry[1] % nshards].append(entry)
+      too_big = False
+      for shard in shards:
+         crcs = set([ crc for (func, crc, lines) in shard ])
+         if len(crcs) > 1 and \
+            sum([ lines for (func, crc, lines) in shard ]) > max_lines_per_file:
+            too_big = True
+            break
+      if not too_big:
+         return [ [ func for (func, crc, lines) in shard ] for shard in shards ]
+      nshards *= 2
+
 def emit_function_list(func_list,
                        fn_prefix,
                        xeddir,
@@ -429,7 +567,8 @@ def emit_function_list(func_list,
                        other_headers=None,
                        max_lines_per_file=3000,
                        is_private_header=True,
-                       extra_public_headers=None): # list
+                       extra_public_headers=None, # list
+                       stable_shards=False):
    """Emit a list of functions to a numbered sequence of
    files. Breaking them up when the files get too big.
 
@@ -449,6 +588,11 @@ def emit_function_list(func_list,
     @param other_headers: extra headers to include
     @type max_lines_per_file: int
     @param max_lines_per_file: Approximate limit for file size, in lines. 
+    @type stable_shards: bool
+    @param stable_shards: pick the file for each function by hashing
+                          its name instead of filling files in order,
+                          so that adding or removing a function only
+                          changes the one file that holds it.
    """
    file_number = 0
    fe = None
@@ -465,32 +609,48 @@ def emit_function_list(func_list,
    fe_header.start()
    fe_list.append(fe_header)
 
-   # remove any numbered files that we previously emitted. We won't
-   # necessarily overwrite them all each build and do not want
-   # stale files remaining from previous builds
-   for fn in glob.glob(mbuild.join(gendir, fn_prefix + '-[0-9]*.c')):
-       mbuild.remove_file(fn)
-
-   for func in func_list:
-      fe_header.write(func.emit_header())
-      if not fe or fe.count_lines() + func.lines() >= max_lines_per_file:
-         if fe:
+   def new_file_emitter(file_number):
+      fn = "%s-%d.c" % (fn_prefix, file_number)
+      fe = xed_file_emitter_t(xeddir,gendir, fn, shell_file=False, namespace=namespace)
+      fe.add_header(companion_header)
+      if other_headers:
+         for header in other_headers:
+            fe.add_header(header)
+      fe.start()
+      fe_list.append(fe)
+      return fe
+
+   if stable_shards:
+      for func in func_list:
+         fe_header.write(func.emit_header())
+      shards = _stable_shards(func_list, max_lines_per_file)
+      for file_number, shard in enumerate(shards):
+         if shard:
+            fe = new_file_emitter(file_number)
+            for func in shard:
+               func.emit_file_emitter(fe)
             fe.close()
-         fn = "%s-%d.c" % (fn_prefix, file_number)
-         fe = xed_file_emitter_t(xeddir,gendir, fn, shell_file=False, namespace=namespace)
-         fe.add_header(companion_header)
-         if other_headers:
-            for header in other_headers:
-               fe.add_header(header)
-         fe.start()
-         fe_list.append(fe)
-         file_number += 1
-
-      func.emit_file_emitter(fe)
-
-
-   fe.close()
+   else:
+      for func in func_list:
+         fe_header.write(func.emit_header())
+         if not fe or fe.count_lines() + func.lines() >= max_lines_per_file:
+            if fe:
+               fe.close()
+            fe = new_file_emitter(file_number)
+            file_number += 1
+
+         func.emit_file_emitter(fe)
+
+      fe.close()
    fe_header.close()
+
+   # remove any numbered files that we previously emitted but did not
+   # emit this time. We do not want stale files remaining from
+   # previous builds.
+   emitted = set([ os.path.normpath(x.full_file_name) for x in fe_list ])
+   for fn in glob.glob(mbuild.join(gendir, fn_prefix + '-[0-9]*.c')):
+       if os.path.normpath(fn) not in emitted:
+           mbuild.remove_file(fn)
    return fe_list
 
 
@@ -152,30 +152,20 @@ def work(lines,   xeddir = '.',   gendir = 'obj'):
                                     hdr_file_name)
    hfe.start()
 
-   xfe.add_code('xed_convert_table_t xed_convert_table[XED_OPERAND_CONVERT_LAST];')
-   
    for t in tables:
        l = t.emit_init()
        l = [  x+'\n' for x in  l]
        xfe.writelines(l)
-   fo = codegen.function_object_t('xed_init_convert_tables', 'void')
-   
-   s1 = 'xed_convert_table[XED_OPERAND_CONVERT_%s].table_name = %s;' % ('INVALID', '0')
-   s2 = 'xed_convert_table[XED_OPERAND_CONVERT_%s].limit      = %s;' % ('INVALID', '0')
-   s3 = 'xed_convert_table[XED_OPERAND_CONVERT_%s].opnd       = %s;' % ('INVALID', 'XED_OPERAND_INVALID')
-   fo.add_code(s1)
-   fo.add_code(s2)
-   fo.add_code(s3)
-   
+
+   # a fully initialized const table so that there is no init-time work
+   xfe.add_code('const xed_convert_table_t xed_convert_table[XED_OPERAND_CONVERT_LAST] = {')
+   xfe.add_code('/* %s */ { %s, %s, %s },' % ('INVALID', '0',
+                                            'XED_OPERAND_INVALID', '0'))
    for t in tables:
-       s1 = 'xed_convert_table[XED_OPERAND_CONVERT_%s].table_name = %s;' % (t.name, t.string_table_name)
-       s2 = 'xed_convert_table[XED_OPERAND_CONVERT_%s].limit      = %s;' % (t.name, len(t.value_string_pairs))
-       s3 = 'xed_convert_table[XED_OPERAND_CONVERT_%s].opnd       = %s;' % (t.name, t.operand)
-       fo.add_code(s1)
-       fo.add_code(s2)
-       fo.add_code(s3)
-
-   fo.emit_file_emitter(xfe)
+       xfe.add_code('/* %s */ { %s, %s, %s },' % (t.name, t.string_table_name,
+                                                t.operand,
+                                                len(t.value_string_pairs)))
+   xfe.add_code('};')
    xfe.close()
 
    hdr = []
@@ -184,7 +174,7 @@ def work(lines,   xeddir = '.',   gendir = 'obj'):
    hdr.append("   xed_operand_enum_t opnd;\n") # which operand indexes the table!
    hdr.append("   unsigned int limit;\n")
    hdr.append("} xed_convert_table_t;")
-   hdr.append("extern xed_convert_table_t xed_convert_table[XED_OPERAND_CONVERT_LAST];")
+   hdr.append("extern const xed_convert_table_t xed_convert_table[XED_OPERAND_CONVERT_LAST];")
    hfe.writelines( [  x+'\n' for x in hdr] )
    hfe.close()
 
@@ -35,6 +35,8 @@ dbg_output = sys.stdout
 def set_dbg_output(x):
     global dbg_output
     dbg_output = x
+def get_dbg_output():
+    return dbg_output
 
 def dbg(s):
     global dbg_output
@@ -23,6 +23,7 @@ import sys
 import copy
 import re
 import argparse
+import io
 import itertools
 import collections
 import traceback
@@ -33,6 +34,7 @@ import mbuild
 import codegen
 import read_xed_db
 import gen_setup
+import phaseprof
 import enc2test
 import enc2argcheck
 
@@ -5070,11 +5072,11 @@ class enc_env_t(object):
 
 
 
-def dump_output_file_names(fn, fe_list):
+def dump_output_file_names(fn, file_names):
     ofn = os.path.join(fn)
     o = open(ofn,"w")
-    for fe in fe_list:
-        o.write(fe.full_file_name + "\n")
+    for full_file_name in file_names:
+        o.write(full_file_name + "\n")
     o.close()
 
 
@@ -5113,12 +5115,210 @@ def emit_encode_functions(args,
                                                other_headers = extra_headers,
                                                max_lines_per_file=15000,
                                                is_private_header=False,
-                                               extra_public_headers=['xed/xed-interface.h'])
+                                               extra_public_headers=['xed/xed-interface.h'],
+                                               stable_shards=True)
 
     return file_emitters
 
 
     
+def gen_config(args, xeddb, width_info_dict, mode, asz):
+    """Create the encoder, argument checker and test functions for one
+    mode/address-size configuration and emit them. Returns the list of
+    file emitters."""
+    global numbered_functions
+    numbered_functions = 0
+    # the function lists and skip flags hang off the instructions and
+    # are specific to one configuration.
+    for ii in xeddb.recs:
+        prep_instruction(ii)
+
+    output_file_emitters = []
+    #extra_headers =  ['xed/xed-encode-direct.h']
+    env = enc_env_t(mode, asz, width_info_dict)
+    enc2test.set_test_gen_counters(env)
+    env.tests_per_form = 1
+    env.test_checked_interface = args.chk
+
+    msge("Generating encoder functions for {}".format(env))
+    for ii in xeddb.recs:
+        # create encoder function. sets ii.encoder_functions
+        create_enc_fn(env, ii) 
+        spew(ii)
+        # create test(s) sets ii.enc_test_functions
+        enc2test.create_test_fn_main(env, ii)
+        # create arg checkers.  sets ii.enc_arg_check_functions
+        enc2argcheck.create_arg_check_fn_main(env, ii) 
+
+    fel = emit_encode_functions(args,
+                                env,
+                                xeddb,
+                                function_type_name='encode',
+                                fn_list_attr='encoder_functions',
+                                config_prefix='',
+                                srcdir='src')
+    output_file_emitters.extend(fel)
+
+    fel = emit_encode_functions(args,
+                                env,
+                                xeddb,
+                                function_type_name='encoder-check',
+                                fn_list_attr='enc_arg_check_functions',
+                                config_prefix='chk-',
+                                srcdir='src-chk',
+                                extra_headers = [ 'xed/xed-enc2-m{}-a{}.h'.format(env.mode, env.asz) ])
+    output_file_emitters.extend(fel)
+
+
+    msge("Writing encoder 'test' functions to .c and .h files")
+    func_list = []
+    iclasses = []
+    rec_indices = []
+    for i,ii in enumerate(xeddb.recs):
+        func_list.extend(ii.enc_test_functions)
+        # this is for the validation test to check  the iclass after decode
+        n = len(ii.enc_test_functions)
+        if n:
+            iclasses.extend(n*[ii.iclass])
+            rec_indices.extend(n*[i])
+
+    config_descriptor = 'enc2-m{}-a{}'.format(mode,asz)
+    fn_prefix = 'xed-test-{}'.format(config_descriptor)
+    test_fn_hdr='{}.h'.format(fn_prefix)
+    enc2_fn_hdr='xed/xed-{}.h'.format(config_descriptor)
+    enc2_chk_fn_hdr='xed/xed-chk-{}.h'.format(config_descriptor)            
+    gen_src_dir = os.path.join(args.gendir, config_descriptor, 'test', 'src')
+    gen_hdr_dir = os.path.join(args.gendir, config_descriptor, 'test', 'hdr')
+    mbuild.cmkdir(gen_src_dir)
+    mbuild.cmkdir(gen_hdr_dir)
+
+    file_emitters = codegen.emit_function_list(func_list,
+                                               fn_prefix,
+                                               args.xeddir,
+                                               gen_src_dir,
+                                               gen_hdr_dir,
+                                               other_headers = [enc2_fn_hdr, enc2_chk_fn_hdr],
+                                               max_lines_per_file=15000,
+                                               stable_shards=True)
+
+    output_file_emitters.extend(file_emitters)
+
+
+
+
+    # emit a C file initializing two arrays: one array with
+    # test function names, and another of the functdion names
+    # as strings so I can find them when I need to debug them.
+    fe = codegen.xed_file_emitter_t(args.xeddir,
+                                    gen_src_dir,
+                                    'testtable-m{}-a{}.c'.format(mode,asz))
+
+    fe.add_header(test_fn_hdr)
+    fe.start()
+    array_name = 'test_functions_m{}_a{}'.format(mode,asz)
+    fe.add_code_eol('typedef xed_uint32_t (*test_func_t)(xed_uint8_t* output_buffer)')
+    fe.add_code('test_func_t {}[] = {{'.format(array_name))
+    for fn in func_list:
+        fe.add_code('{},'.format(fn.get_function_name()))
+    fe.add_code('0')
+    fe.add_code('};')
+
+
+    fe.add_code('char const* {}_str[] = {{'.format(array_name))
+    for fn in func_list:
+        fe.add_code('"{}",'.format(fn.get_function_name()))
+    fe.add_code('0')
+    fe.add_code('};')
+
+    fe.add_code('const xed_iclass_enum_t {}_iclass[] = {{'.format(array_name))
+    for iclass in iclasses:
+        fe.add_code('XED_ICLASS_{},'.format(iclass))
+    fe.add_code('XED_ICLASS_INVALID')
+    fe.add_code('};')
+
+    fe.close()
+    output_file_emitters.append(fe)
+
+    # a text version of the test table for tools that select tests by
+    # the instruction properties, like gen_corpus.py. The record index
+    # is the position in the xed_reader_t recs list.
+    manifest_fn = os.path.join(gen_src_dir,
+                               'testtable-m{}-a{}.txt'.format(mode,asz))
+    f = open(manifest_fn,'w')
+    f.write('# test-id record-index iclass function-name ' +
+            'extension isa-set space\n')
+    for test_id, (fn, i, iclass) in enumerate(zip(func_list, rec_indices,
+                                                 iclasses)):
+        ii = xeddb.recs[i]
+        f.write('{} {} {} {} {} {} {}\n'.format(test_id, i, iclass,
+                                                fn.get_function_name(),
+                                                ii.extension, ii.isa_set,
+                                                ii.space))
+    f.close()
+
+    gather_stats(xeddb.recs)
+    return output_file_emitters
+
+# the xed db and width info for the pool workers. Passed once per
+# process through the pool initializer.
+_job_xeddb = None
+_job_width_info_dict = None
+def _init_config_job(xeddb, width_info_dict):
+    global _job_xeddb, _job_width_info_dict
+    _job_xeddb = xeddb
+    _job_width_info_dict = width_info_dict
+
+def _gen_config_job(job):
+    """Pool worker for one configuration. Returns the emitted file
+    names, the debug output and the numbered function creator counts,
+    or None if the generation died."""
+    (args, mode, asz) = job
+    # a worker runs several jobs; count only this configuration
+    numbered_function_creators.clear()
+    dbg_buffer = io.StringIO()
+    set_dbg_output(dbg_buffer)
+    try:
+        fel = gen_config(args, _job_xeddb, _job_width_info_dict, mode, asz)
+        codegen.write_emit_manifests()
+    except SystemExit:
+        # die() was called. Do not take down the worker process.
+        return None
+    return ([fe.full_file_name for fe in fel],
+            dbg_buffer.getvalue(),
+            dict(numbered_function_creators))
+
+def gen_configs_parallel(args, xeddb, width_info_dict, configs):
+    """Like calling gen_config() for each (mode,asz) pair in configs
+    but in a pool of args.jobs processes. The configurations are
+    independent; they only share the read-only xed db. Debug output is
+    buffered per configuration and written in order. Returns the list
+    of emitted file names."""
+    import multiprocessing
+    msge("Generating {} configurations with {} processes".format(
+        len(configs), args.jobs))
+    jobs = [ (args, mode, asz) for (mode,asz) in configs ]
+    # avoid replicating buffered output in the child processes
+    sys.stdout.flush()
+    sys.stderr.flush()
+    get_dbg_output().flush()
+    pool = multiprocessing.Pool(min(args.jobs, len(jobs)),
+                                _init_config_job,
+                                (xeddb, width_info_dict))
+    results = pool.map(_gen_config_job, jobs, 1)
+    pool.close()
+    pool.join()
+
+    output_file_names = []
+    for (mode,asz), result in zip(configs, results):
+        if result == None:
+            die("Encoder generation failed for mode {} asz {}".format(mode,asz))
+        (file_names, dbg_text, creators) = result
+        output_file_names.extend(file_names)
+        get_dbg_output().write(dbg_text)
+        for k,val in creators.items():
+            numbered_function_creators[k] += val
+    return output_file_names
+
 def work():
     
     arg_parser = argparse.ArgumentParser(description="Create XED encoder2")
@@ -5158,9 +5358,20 @@ def work():
                             dest='output_file_list',
                             help='Name of output file containing list of output files created. ' +
                             'Default: GENDIR/enc2-list-of-files.txt')
+    arg_parser.add_argument('--jobs', '-j',
+                            type=int,
+                            default=1,
+                            help='Number of processes used to generate the ' +
+                            'mode/address-size configurations. Default: 1')
+    arg_parser.add_argument('--profile-report',
+                            dest='profile_report',
+                            help='Write the wall time, CPU time and peak ' +
+                            'RSS of each generator phase to this JSON file.')
 
 
     args = arg_parser.parse_args()
+    if args.profile_report:
+        phaseprof.enable()
     args.prefix = os.path.join(args.gendir,'dgen')
     if args.output_file_list == None:
         args.output_file_list = os.path.join(args.gendir, 'enc2-list-of-files.txt')
@@ -5171,11 +5382,12 @@ def work():
     
     gen_setup.make_paths(args)
     msge('Reading XED db...')
-    xeddb = read_xed_db.xed_reader_t(args.state_bits_filename,
-                                     args.instructions_filename,
-                                     args.widths_filename,
-                                     args.element_types_filename,
-                                     args.cpuid_filename)
+    with phaseprof.phase('read_xed_db'):
+        xeddb = read_xed_db.xed_reader_t(args.state_bits_filename,
+                                         args.instructions_filename,
+                                         args.widths_filename,
+                                         args.element_types_filename,
+                                         args.cpuid_filename)
 
     width_info_dict = xeddb.get_width_info_dict()
     for k in width_info_dict.keys():
@@ -5203,9 +5415,6 @@ def work():
         if not args.asz_list:
             args.asz_list = [ 64 ]
     
-    for ii in xeddb.recs:
-        prep_instruction(ii)
-        
     def prune_asz_list_for_mode(mode,alist):
         '''make sure we only use addressing modes appropriate for our mode'''
         for asz in alist:
@@ -5216,120 +5425,32 @@ def work():
                 yield asz
 
 
-    output_file_emitters = []
-
-
-    
-    #extra_headers =  ['xed/xed-encode-direct.h']
+    configs = []
     for mode in args.modes:
         for asz in prune_asz_list_for_mode(mode,args.asz_list):
-            env = enc_env_t(mode, asz, width_info_dict)
-            enc2test.set_test_gen_counters(env)
-            env.tests_per_form = 1
-            env.test_checked_interface = args.chk
-            
-            msge("Generating encoder functions for {}".format(env))
-            for ii in xeddb.recs:
-                # create encoder function. sets ii.encoder_functions
-                create_enc_fn(env, ii) 
-                spew(ii)
-                # create test(s) sets ii.enc_test_functions
-                enc2test.create_test_fn_main(env, ii)
-                # create arg checkers.  sets ii.enc_arg_check_functions
-                enc2argcheck.create_arg_check_fn_main(env, ii) 
-
-            fel = emit_encode_functions(args,
-                                        env,
-                                        xeddb,
-                                        function_type_name='encode',
-                                        fn_list_attr='encoder_functions',
-                                        config_prefix='',
-                                        srcdir='src')
-            output_file_emitters.extend(fel)
-            
-            fel = emit_encode_functions(args,
-                                        env,
-                                        xeddb,
-                                        function_type_name='encoder-check',
-                                        fn_list_attr='enc_arg_check_functions',
-                                        config_prefix='chk-',
-                                        srcdir='src-chk',
-                                        extra_headers = [ 'xed/xed-enc2-m{}-a{}.h'.format(env.mode, env.asz) ])
-            output_file_emitters.extend(fel)
-
-
-            msge("Writing encoder 'test' functions to .c and .h files")
-            func_list = []
-            iclasses = []
-            for ii in xeddb.recs:
-                func_list.extend(ii.enc_test_functions)
-                # this is for the validation test to check  the iclass after decode
-                n = len(ii.enc_test_functions)
-                if n:
-                    iclasses.extend(n*[ii.iclass])
-                
-            config_descriptor = 'enc2-m{}-a{}'.format(mode,asz)
-            fn_prefix = 'xed-test-{}'.format(config_descriptor)
-            test_fn_hdr='{}.h'.format(fn_prefix)
-            enc2_fn_hdr='xed/xed-{}.h'.format(config_descriptor)
-            enc2_chk_fn_hdr='xed/xed-chk-{}.h'.format(config_descriptor)            
-            gen_src_dir = os.path.join(args.gendir, config_descriptor, 'test', 'src')
-            gen_hdr_dir = os.path.join(args.gendir, config_descriptor, 'test', 'hdr')
-            mbuild.cmkdir(gen_src_dir)
-            mbuild.cmkdir(gen_hdr_dir)
-                                       
-            file_emitters = codegen.emit_function_list(func_list,
-                                                       fn_prefix,
-                                                       args.xeddir,
-                                                       gen_src_dir,
-                                                       gen_hdr_dir,
-                                                       other_headers = [enc2_fn_hdr, enc2_chk_fn_hdr],
-                                                       max_lines_per_file=15000)
-
-            output_file_emitters.extend(file_emitters)
+            configs.append((mode,asz))
 
-
-            
-
-            # emit a C file initializing two arrays: one array with
-            # test function names, and another of the functdion names
-            # as strings so I can find them when I need to debug them.
-            fe = codegen.xed_file_emitter_t(args.xeddir,
-                                            gen_src_dir,
-                                            'testtable-m{}-a{}.c'.format(mode,asz))
-
-            fe.add_header(test_fn_hdr)
-            fe.start()
-            array_name = 'test_functions_m{}_a{}'.format(mode,asz)
-            fe.add_code_eol('typedef xed_uint32_t (*test_func_t)(xed_uint8_t* output_buffer)')
-            fe.add_code('test_func_t {}[] = {{'.format(array_name))
-            for fn in func_list:
-                fe.add_code('{},'.format(fn.get_function_name()))
-            fe.add_code('0')
-            fe.add_code('};')
-
-
-            fe.add_code('char const* {}_str[] = {{'.format(array_name))
-            for fn in func_list:
-                fe.add_code('"{}",'.format(fn.get_function_name()))
-            fe.add_code('0')
-            fe.add_code('};')
-
-            fe.add_code('const xed_iclass_enum_t {}_iclass[] = {{'.format(array_name))
-            for iclass in iclasses:
-                fe.add_code('XED_ICLASS_{},'.format(iclass))
-            fe.add_code('XED_ICLASS_INVALID')
-            fe.add_code('};')
-            
-            fe.close()
-            output_file_emitters.append(fe)
+    if args.jobs > 1 and len(configs) > 1:
+        with phaseprof.phase('gen_configs_parallel'):
+            output_file_names = gen_configs_parallel(args, xeddb,
+                                                     width_info_dict, configs)
+    else:
+        output_file_names = []
+        for (mode,asz) in configs:
+            with phaseprof.phase('gen_config:m{}a{}'.format(mode,asz)):
+                fel = gen_config(args, xeddb, width_info_dict, mode, asz)
+            output_file_names.extend([fe.full_file_name for fe in fel])
 
             
             
-    gather_stats(xeddb.recs)
     dump_numbered_function_creators()
     dump_output_file_names( args.output_file_list,
-                            output_file_emitters )
+                            output_file_names )
+    if args.jobs <= 1 or len(configs) <= 1:
+        # the workers write their own manifests
+        codegen.write_emit_manifests()
+    if args.profile_report:
+        phaseprof.write_report(args.profile_report)
     return 0
 
 if __name__ == "__main__":
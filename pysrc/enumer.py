@@ -23,6 +23,9 @@ import os
 import sys
 import re
 import codegen
+import hashfks
+import hashmul
+import strpool
 
 def find_dir(d):
     directory = os.getcwd()
@@ -86,6 +89,55 @@ def _make_foo2str():
     s = "\n".join(l)
     return s
 
+
+# str2enum conversions for enumerations with at least this many names
+# use a generated perfect hash instead of a linear scan.
+_str2enum_hash_min = 32
+
+def _str2enum_key(s):
+    """32b FNV-1a hash of the string s. Must match the C code emitted
+    by enumer_t._emit_str2enum_hash_convert."""
+    h = 2166136261
+    for c in bytearray(s.encode('utf-8')):
+        h = ((h ^ c) * 16777619) & 0xFFFFFFFF
+    return h
+
+def _find_str2enum_hash(keys):
+    """Two level perfect hash for the list of distinct integer keys. The
+    first level is a power of 2 sized multiplicative hash that picks a
+    bucket. Each bucket gets its own FKS perfect hash in to a
+    contiguous range of slots. Slot 0 is reserved as the empty slot
+    for empty buckets.
+
+    Returns (ilog2_buckets, buckets, slots) where buckets is a list of
+    (fks_hash_fn, base) tuples and slots maps each slot to the index of
+    its key in keys (or None). Returns None if no hash was found."""
+    ilog2 = max(1, (len(keys) // 2).bit_length())
+    while ilog2 <= 16:
+        l1 = hashmul.hashmul_t(1 << ilog2)
+        bucket_keys = [ [] for i in range(l1.get_table_size()) ]
+        for i,k in enumerate(keys):
+            bucket_keys[l1.apply_pow2(k)].append(i)
+
+        buckets = []
+        slots = [ None ]
+        for kl in bucket_keys:
+            if not kl:
+                buckets.append((None, 0))
+                continue
+            hash_f = hashfks.find_fks_perfect([keys[i] for i in kl])
+            if not hash_f:
+                break
+            base = len(slots)
+            slots.extend([None] * hash_f.get_table_size())
+            for i in kl:
+                slots[base + hash_f.apply(keys[i])] = i
+            buckets.append((hash_f, base))
+        else:
+            return (ilog2, buckets, slots)
+        ilog2 += 1
+    return None
+
         
 class enumer_t(object):
     def __init__(self, type_name, prefix, values, cfn, hfn,  gendir,
@@ -336,6 +388,7 @@ class enumer_t(object):
         
     def _emit_source_file(self):
         if self.string_convert == 1:
+            self._emit_name_pool()
             self._emit_name_table_type()
             self._emit_name_table()
             self._emit_duplicate_name_table()
@@ -407,22 +460,32 @@ class enumer_t(object):
                       (self.proto_prefix, self.type_name, self.type_name))
         self.hf.emit_eol()
         
+    def _emit_name_pool(self):
+        """The names are offsets in to one char array so that the name
+        tables need no relocations"""
+        self.pool = strpool.string_pool_t('name_pool_%s' % self.type_name)
+        for v in self.values + self.duplicates:
+            self.pool.add(v.display_str)
+        self.pool.finish()
+        for line in self.pool.emit():
+            self.cf.emit_eol(line)
+
     def _emit_name_table_type(self):
         nt_string = """
 typedef struct {
-    const char* name;
+    %(offset_type)s name;
     %(type)s value;
 } name_table_%(type)s;"""
-        self.cf.emit_eol(nt_string % {'type':self.type_name})
+        self.cf.emit_eol(nt_string % {'type':self.type_name,
+                                      'offset_type':self.pool.offset_ctype()})
 
     def _emit_name_table(self):
         s = "static const name_table_%(type)s name_array_%(type)s[] = {"
         self.cf.emit_eol(s % {'type':self.type_name})
         for v in self.values:
-            s = """{"%s", %s%s},""" % (v.display_str,self.prefix,v.name)
+            s = "{%d, %s%s}," % (self.pool.offset(v.display_str),
+                                 self.prefix,v.name)
             self.cf.emit_eol(s)
-        s = "{%s, %s%s}," % ('0',self.prefix,self.values[-1].name)
-        self.cf.emit_eol(s)
         self.cf.emit_eol('};')
 
     def _emit_duplicate_name_table(self):
@@ -432,10 +495,9 @@ typedef struct {
         s = "static const name_table_%(type)s dup_name_array_%(type)s[] = {"
         self.cf.emit_eol(s % {'type':self.type_name})
         for v in self.duplicates:
-            s = """{"%s", %s%s},""" % (v.display_str,self.prefix,v.name)
+            s = "{%d, %s%s}," % (self.pool.offset(v.display_str),
+                                 self.prefix,v.name)
             self.cf.emit_eol(s)
-        s = "{%s, %s%s}," % ('0',self.prefix,self.values[-1].name)
-        self.cf.emit_eol(s)
         self.cf.emit_eol('};')
 
     def _invalid_or_last(self):
@@ -500,26 +562,26 @@ const char* %(type)s2str(const %(type)s p)
        self._emit_enum2str_convert()
 
     def _emit_str2enum_convert(self):
+       if len(self.values) + len(self.duplicates) >= _str2enum_hash_min:
+          if self._emit_str2enum_hash_convert():
+             return
        top = """
         
 %(type)s str2%(type)s(const char* s)
 {
-   const name_table_%(type)s* p = name_array_%(type)s;
-   while( p->name ) {
-     if (strcmp(p->name,s) == 0) {
+   unsigned int i;
+   for( i=0 ; i < %(n)d ; i++ ) {
+     const name_table_%(type)s* p = name_array_%(type)s + i;
+     if (strcmp(name_pool_%(type)s + p->name,s) == 0) {
       return p->value;
      }
-     p++;
    }
         """
        dups = """
-   {
-     const name_table_%(type)s* q = dup_name_array_%(type)s;
-     while( q->name ) {
-       if (strcmp(q->name,s) == 0) {
-        return q->value;
-       }
-       q++;
+   for( i=0 ; i < %(ndups)d ; i++ ) {
+     const name_table_%(type)s* q = dup_name_array_%(type)s + i;
+     if (strcmp(name_pool_%(type)s + q->name,s) == 0) {
+      return q->value;
      }
    } 
         """
@@ -530,12 +592,99 @@ const char* %(type)s2str(const %(type)s p)
        invalid = self._invalid_or_last()
        d =  {'type':self.type_name,
              'prefix':self.prefix,
-             'invalid':invalid}
+             'invalid':invalid,
+             'n':len(self.values),
+             'ndups':len(self.duplicates)}
        self.cf.emit_eol(top % (d))
        if self.duplicates:
           self.cf.emit_eol(dups % (d))
        self.cf.emit_eol(end % (d))
 
+    def _emit_str2enum_hash_convert(self):
+       """Emit a str2enum converter that uses a perfect hash of the
+       names. Returns False and emits nothing if the names do not hash
+       perfectly."""
+       # entries are (1 + index in name_array followed by
+       # dup_name_array, key). 0 is the empty slot.
+       entries = []
+       seen = set()
+       for i,v in enumerate(self.values + self.duplicates):
+          # the linear scan returns the first match for a name
+          if v.display_str not in seen:
+             seen.add(v.display_str)
+             entries.append((i+1, _str2enum_key(v.display_str)))
+       keys = [ k for (e,k) in entries ]
+       if len(set(keys)) != len(keys):
+          return False
+       r = _find_str2enum_hash(keys)
+       if not r:
+          return False
+       (ilog2, buckets, slots) = r
+       if len(slots) > 0xFFFF: # bases are stored as unsigned shorts
+          return False
+       if len(self.values) + len(self.duplicates) >= 0xFFFF: # slots too
+          return False
+
+       d = {'type':self.type_name,
+            'prefix':self.prefix,
+            'invalid':self._invalid_or_last(),
+            'n':len(self.values),
+            'nbuckets':len(buckets),
+            'nslots':len(slots),
+            'shift':32-ilog2,
+            'mul':hashmul.hashmul_t(1).golden_ratio_recip2to32}
+
+       # per bucket FKS parameters {k, p, m, base}
+       s = "static const unsigned short str2_l2_%(type)s[%(nbuckets)d][4] = {"
+       self.cf.emit_eol(s % d)
+       for hash_f, base in buckets:
+          if hash_f:
+             s = "{%d, %d, %d, %d}," % (hash_f.k, hash_f.p, hash_f.m, base)
+          else:
+             s = "{1, 2, 1, 0},"
+          self.cf.emit_eol(s)
+       self.cf.emit_eol('};')
+
+       s = "static const unsigned short str2_slot_%(type)s[%(nslots)d] = {"
+       self.cf.emit_eol(s % d)
+       for i in slots:
+          if i is None:
+             self.cf.emit_eol('0,')
+          else:
+             self.cf.emit_eol('%d,' % (entries[i][0]))
+       self.cf.emit_eol('};')
+
+       if self.duplicates:
+          entry = ("(i <= %(n)d ? name_array_%(type)s + i - 1 : " +
+                   "dup_name_array_%(type)s + i - 1 - %(n)d)") % d
+       else:
+          entry = "name_array_%(type)s + i - 1" % d
+       d['entry'] = entry
+
+       s = """
+%(type)s str2%(type)s(const char* s)
+{
+   const unsigned char* c = (const unsigned char*)s;
+   const unsigned short* b;
+   const name_table_%(type)s* p;
+   unsigned int h = 2166136261U;
+   unsigned int i;
+   while (*c) {
+      h = ((h ^ *c) * 16777619U) & 0xFFFFFFFFU;
+      c++;
+   }
+   b = str2_l2_%(type)s[((h * %(mul)dU) & 0xFFFFFFFFU) >> %(shift)d];
+   i = str2_slot_%(type)s[b[3] + ((b[0] * (h %% b[1])) %% b[1]) %% b[2]];
+   if (i == 0)
+      return %(prefix)s%(invalid)s;
+   p = %(entry)s;
+   if (strcmp(name_pool_%(type)s + p->name,s) == 0)
+      return p->value;
+   return %(prefix)s%(invalid)s;
+}"""
+       self.cf.emit_eol(s % d)
+       return True
+
     def _emit_enum2str_convert(self):
        if self.density == 'sparse':
           self._emit_sparse_enum2str_convert()
@@ -547,12 +696,12 @@ const char* %(type)s2str(const %(type)s p)
 
 const char* %(type)s2str(const %(type)s p)
 {
-   const name_table_%(type)s* q = name_array_%(type)s;
-   while( q->name ) {
+   unsigned int i;
+   for( i=0 ; i < %(n)d ; i++ ) {
+      const name_table_%(type)s* q = name_array_%(type)s + i;
       if (q->value == p) {
-         return q->name;
+         return name_pool_%(type)s + q->name;
       }
-      q++;
    }
    return "???";
 }"""
@@ -560,7 +709,8 @@ const char* %(type)s2str(const %(type)s p)
        invalid = self._invalid_or_last()
        self.cf.emit_eol(s % {'type':self.type_name,
                              'prefix':self.prefix,
-                             'invalid':invalid})
+                             'invalid':invalid,
+                             'n':len(self.values)})
 
     def _emit_dense_enum2str_convert(self):
 
@@ -570,7 +720,7 @@ const char* %(type)s2str(const %(type)s p)
 {
    %(type)s type_idx = p;
    if ( p > %(prefix)sLAST) type_idx = %(prefix)sLAST;
-   return name_array_%(type)s[type_idx].name;
+   return name_pool_%(type)s + name_array_%(type)s[type_idx].name;
 }"""
        
        invalid = self._invalid_or_last()
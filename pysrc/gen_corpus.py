@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- python -*-
+#BEGIN_LEGAL
+#
+#Copyright (c) 2019 Intel Corporation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#END_LEGAL
+
+# Select a deterministic mix of enc2 test functions for building a
+# synthetic decoder benchmark input. The enc2 tester encodes the
+# selected tests back to back in to a raw file:
+#
+#   gen_corpus.py obj/dgen --chip SKYLAKE --space-mix legacy:70,vex:30 \
+#                 --count 100000 --output skl-ids.txt
+#   obj/enc2tester-enc2-m64-a64 --corpus skl-ids.txt skl.bin
+#   obj/examples/xed -64 -ir skl.bin -v 0
+#
+# The tests come from the testtable-m64-a64.txt file written by
+# enc2gen.py. Its record indices refer to the xed_reader_t recs.
+
+from __future__ import print_function
+import os
+import sys
+import random
+import bisect
+import collections
+import read_xed_db
+import gen_setup
+import chipmodel
+
+class test_t(object):
+    def __init__(self, test_id, inst):
+        self.test_id = test_id
+        self.inst = inst
+        self.weight = 1.0
+
+def space_class(inst):
+    if inst.space.startswith('evex'):
+        return 'evex'
+    return inst.space
+
+def read_manifest(fn, xeddb):
+    """Return a list of test_t for the tests in the enc2gen test table
+    file fn"""
+    tests = []
+    for line in open(fn,'r'):
+        if line.startswith('#'):
+            continue
+        wrds = line.split()
+        if len(wrds) < 4:
+            continue
+        (test_id, rec_index, iclass) = (int(wrds[0]), int(wrds[1]), wrds[2])
+        if rec_index >= len(xeddb.recs) or \
+           xeddb.recs[rec_index].iclass != iclass:
+            gen_setup.die("{} does not match the instructions in the xed db".format(fn))
+        tests.append(test_t(test_id, xeddb.recs[rec_index]))
+    return tests
+
+def parse_space_mix(s):
+    """Parse legacy:60,vex:30,evex:10 in to a dictionary of fractions"""
+    mix = {}
+    for chunk in s.split(','):
+        try:
+            (space, pct) = chunk.split(':')
+            mix[space.strip()] = float(pct)
+        except ValueError:
+            gen_setup.die("Bad --space-mix element: {}".format(chunk))
+    total = sum(mix.values())
+    if total <= 0:
+        gen_setup.die("Bad --space-mix: {}".format(s))
+    for space in mix:
+        mix[space] /= total
+    return mix
+
+def read_histogram(fn):
+    """Read lines of 'ICLASS count' in to a dictionary"""
+    histo = collections.defaultdict(float)
+    for line in open(fn,'r'):
+        wrds = line.split('#')[0].split()
+        if len(wrds) == 2:
+            histo[wrds[0].upper()] += float(wrds[1])
+        elif wrds:
+            gen_setup.die("Bad histogram line: {}".format(line.strip()))
+    return histo
+
+def select_tests(args, tests, chip_db):
+    if args.chip:
+        if args.chip not in chip_db:
+            gen_setup.die("Unknown chip {}".format(args.chip))
+        tests = [ t for t in tests if t.inst.isa_set in chip_db[args.chip] ]
+    if args.isa_sets:
+        isa_sets = set([ x.upper() for x in args.isa_sets ])
+        tests = [ t for t in tests if t.inst.isa_set.upper() in isa_sets ]
+    if args.no_undocumented:
+        tests = [ t for t in tests if not t.inst.undocumented ]
+    return tests
+
+def assign_weights(args, tests):
+    """Set the sampling weight of each test. Tests with no weight are
+    dropped."""
+    if args.histogram:
+        # the weight of an iclass is split between its tests
+        histo = read_histogram(args.histogram)
+        per_iclass = collections.defaultdict(int)
+        for t in tests:
+            per_iclass[t.inst.iclass] += 1
+        for t in tests:
+            t.weight = histo[t.inst.iclass] / per_iclass[t.inst.iclass]
+
+    if args.space_mix:
+        # scale the weights so that each space gets its share
+        mix = parse_space_mix(args.space_mix)
+        space_total = collections.defaultdict(float)
+        for t in tests:
+            space_total[space_class(t.inst)] += t.weight
+        for space in mix:
+            if mix[space] and not space_total[space]:
+                gen_setup.die("No tests for space {}".format(space))
+        for t in tests:
+            s = space_class(t.inst)
+            if s in mix:
+                t.weight = t.weight * mix[s] / space_total[s]
+            else:
+                t.weight = 0.0
+
+    return [ t for t in tests if t.weight > 0 ]
+
+def sample(tests, count, seed):
+    """Draw count tests with probability proportional to their
+    weights. Deterministic for a given seed."""
+    rng = random.Random(seed)
+    cumulative = []
+    total = 0.0
+    for t in tests:
+        total += t.weight
+        cumulative.append(total)
+    chosen = []
+    for i in range(0,count):
+        x = rng.random() * total
+        j = bisect.bisect_right(cumulative, x)
+        chosen.append(tests[min(j, len(tests)-1)])
+    return chosen
+
+def print_summary(chosen):
+    spaces = collections.Counter([ space_class(t.inst) for t in chosen ])
+    isa_sets = collections.Counter([ t.inst.isa_set for t in chosen ])
+    print("Tests:   {}".format(len(chosen)))
+    print("Unique:  {}".format(len(set([ t.test_id for t in chosen ]))))
+    for space, n in sorted(spaces.items()):
+        print("  {:8s} {:7d}  {:5.1f}%".format(space, n,
+                                              100.0 * n / len(chosen)))
+    print("Most frequent ISA sets:")
+    for isa_set, n in isa_sets.most_common(10):
+        print("  {:24s} {:7d}".format(isa_set, n))
+
+def work(args):
+    gen_setup.msge("READING XED DB")
+    xeddb = read_xed_db.xed_reader_t(args.state_bits_filename,
+                                     args.instructions_filename,
+                                     args.widths_filename,
+                                     args.element_types_filename,
+                                     args.cpuid_filename)
+    chip_db = {}
+    if args.chip:
+        (chips, chip_db) = chipmodel.read_database(args.chip_filename)
+    manifest = args.manifest
+    if not manifest:
+        manifest = os.path.join(args.prefix, '..', 'enc2-m64-a64', 'test',
+                                'src', 'testtable-m64-a64.txt')
+    tests = read_manifest(gen_setup.check_exist(manifest), xeddb)
+    tests = select_tests(args, tests, chip_db)
+    tests = assign_weights(args, tests)
+    if not tests:
+        gen_setup.die("No tests selected")
+
+    chosen = sample(tests, args.count, args.seed)
+    f = open(args.output,'w')
+    for t in chosen:
+        f.write("{}\n".format(t.test_id))
+    f.close()
+    print_summary(chosen)
+    gen_setup.msgb("WROTE", args.output)
+    return 0
+
+def setup():
+    parser = gen_setup.create('Select enc2 tests for a synthetic ' +
+                              'decoder benchmark input')
+    parser.add_argument('--manifest',
+                        help='enc2gen test table file. Default: ' +
+                        'PREFIX/../enc2-m64-a64/test/src/testtable-m64-a64.txt')
+    parser.add_argument('--output', default='corpus-ids.txt',
+                        help='Output test id file. Default: corpus-ids.txt')
+    parser.add_argument('--count', type=int, default=100000,
+                        help='Number of instructions. Default: 100000')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Random seed. Default: 1')
+    parser.add_argument('--chip',
+                        help='Only use instructions of this chip')
+    parser.add_argument('--isa-set', dest='isa_sets', action='append',
+                        help='Only use instructions of this ISA set. ' +
+                        'Repeatable')
+    parser.add_argument('--space-mix', dest='space_mix',
+                        help='Share of each encoding space, like ' +
+                        'legacy:60,vex:30,evex:10. Other spaces are ' +
+                        'not used')
+    parser.add_argument('--histogram',
+                        help='File with lines of "ICLASS count" giving ' +
+                        'the instruction frequencies. Other iclasses ' +
+                        'are not used')
+    parser.add_argument('--no-undocumented', dest='no_undocumented',
+                        action='store_true',
+                        help='Skip undocumented instructions')
+    args = gen_setup.parse(parser)
+    return args
+
+if __name__ == "__main__":
+    args = setup()
+    r = work(args)
+    sys.exit(r)
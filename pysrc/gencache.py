@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- python -*-
+#BEGIN_LEGAL
+#
+#Copyright (c) 2019 Intel Corporation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#END_LEGAL
+
+"""Content-addressed on-disk cache for generator intermediate state.
+
+Entries are pickles named by a digest of the generator inputs. The
+digest also covers the python sources in this directory so that any
+change to the generator invalidates every cached entry."""
+
+import os
+import sys
+import hashlib
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import genutil
+
+_code_digest = None
+def _get_code_digest():
+    """Digest of the generator python sources."""
+    global _code_digest
+    if not _code_digest:
+        h = hashlib.sha1()
+        pysrc = os.path.dirname(os.path.abspath(__file__))
+        fns = [ x for x in os.listdir(pysrc) if x.endswith('.py') ]
+        fns.sort()
+        for fn in fns:
+            h.update(fn.encode('utf-8'))
+            h.update(open(os.path.join(pysrc,fn),'rb').read())
+        _code_digest = h.hexdigest()
+    return _code_digest
+
+def digest(file_names, extra=None):
+    """Return a hex string digest of the contents of the files in the
+    file_names list, the generator sources, the python version and the
+    optional list of extra strings."""
+    h = hashlib.sha1()
+    h.update(_get_code_digest().encode('utf-8'))
+    h.update(sys.version.encode('utf-8'))
+    for fn in file_names:
+        h.update(fn.encode('utf-8'))
+        if fn and os.path.exists(fn):
+            h.update(open(fn,'rb').read())
+    if extra:
+        for s in extra:
+            h.update(str(s).encode('utf-8'))
+    return h.hexdigest()
+
+def _cache_file_name(cache_dir, kind, key):
+    return os.path.join(cache_dir, '%s-%s.pickle' % (kind, key))
+
+def load(cache_dir, kind, key):
+    """Return the cached object or None if there is no entry for
+    key. Unreadable entries are treated as misses."""
+    fn = _cache_file_name(cache_dir, kind, key)
+    if not os.path.exists(fn):
+        return None
+    try:
+        f = open(fn,'rb')
+        obj = pickle.load(f)
+        f.close()
+    except Exception as e:
+        genutil.warn("Ignoring unreadable cache file %s: %s" % (fn, str(e)))
+        return None
+    genutil.msgb("CACHE HIT", fn)
+    return obj
+
+def store(cache_dir, kind, key, obj):
+    """Pickle obj in to the cache. The file is written under a
+    temporary name and renamed so that concurrent builds sharing a
+    cache directory never see partial entries."""
+    genutil.cmkdir(cache_dir)
+    fn = _cache_file_name(cache_dir, kind, key)
+    tmp_fn = '%s.%d.tmp' % (fn, os.getpid())
+    f = open(tmp_fn,'wb')
+    pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+    f.close()
+    try:
+        os.rename(tmp_fn, fn)
+    except OSError: # windows will not rename over an existing file
+        if os.path.exists(fn):
+            os.remove(fn)
+        os.rename(tmp_fn, fn)
+    genutil.msgb("CACHE STORE", fn)
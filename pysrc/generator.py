@@ -52,7 +52,6 @@
 ## class graph_node(object):
 
 ## class code_gen_dec_args_t(object):
-## class table_init_object_t(object):
 ## class bit_group_info_t(object):
 ## class reg_info_t(object):
 ## class width_info_t(object):
@@ -64,6 +63,9 @@ import copy
 import glob
 import re
 import optparse
+import operator
+import functools
+import collections
 
 def find_dir(d):
     directory = os.getcwd()
@@ -102,6 +104,10 @@ from verbosity import *
 import opnds
 import opnd_types
 import cpuid_rdr
+import gencache
+import phaseprof
+import xedhash
+import ild_phash
 
 send_stdout_message_to_file = False
 if send_stdout_message_to_file:
@@ -117,6 +123,7 @@ import enum_txt_writer
 import chipmodel
 import ctables
 import ild
+import ild_info
 import refine_regs
 import classifier
 #import encgen
@@ -192,11 +199,6 @@ def setup_arg_parser():
                           dest='input_state', 
                           default='xed-state-bits.txt',
                           help='state input file')
-    arg_parser.add_option('--inst',
-                          action='store', 
-                          dest='inst_init_file', 
-                          default='xed-init-inst-table.c',
-                          help='Instruction table init file')
     arg_parser.add_option('--sout',
                           action='store', 
                           dest='structured_output_fn', 
@@ -272,6 +274,87 @@ def setup_arg_parser():
                           default=False,
                           help="use bit-fields to compress the "+
                           "operand storage.")
+    arg_parser.add_option('--optimize-operand-layout',
+                          action='store_true',
+                          dest='optimize_operand_layout',
+                          default=False,
+                          help='Order the operand storage fields by how ' +
+                          'often the decode rules use them. The hot ' +
+                          'fields go in the first cache line and are ' +
+                          'not bit fields. The cold small fields are ' +
+                          'packed in to bit fields.')
+    arg_parser.add_option('--operand-profile',
+                          action='store',
+                          dest='operand_profile',
+                          default='',
+                          help='Field access profile with lines of ' +
+                          '"FIELD count" for --optimize-operand-layout. ' +
+                          'Used instead of the counts from the decode ' +
+                          'rules. Implies --optimize-operand-layout.')
+    arg_parser.add_option('--parse-cache',
+                          action='store',
+                          dest='parse_cache_dir',
+                          default='',
+                          help='Directory for caching the parsed decoder ' +
+                          'input and the ILD hash function search results ' +
+                          'between runs. Keyed by the input contents.')
+    arg_parser.add_option('--jobs', '-j',
+                          action='store',
+                          type='int',
+                          dest='jobs',
+                          default=1,
+                          help='Number of processes to use for building ' +
+                          'the decode graphs. Default: 1')
+    arg_parser.add_option('--no-vectorized-hash',
+                          action='store_false',
+                          dest='vectorized_hash',
+                          default=True,
+                          help='Do not use numpy to search for the ILD ' +
+                          'hash functions. The output is the same.')
+    arg_parser.add_option('--ild-hash-select',
+                          action='store',
+                          dest='ild_hash_select',
+                          default='first',
+                          help='How to pick the ILD hash functions: ' +
+                          '"first" uses the first one that works, "cost" ' +
+                          'uses the cheapest and writes a ' +
+                          'ild_hash_select_vv*.txt report. Default: first')
+    arg_parser.add_option('--ild-hash-weights',
+                          action='store',
+                          dest='ild_hash_weights',
+                          default='',
+                          help='Comma separated name=value weights for ' +
+                          '--ild-hash-select cost. Names: byte, mul, mod, ' +
+                          'shift, add, validate.')
+    arg_parser.add_option('--memory-report',
+                          action='store_true',
+                          dest='memory_report',
+                          default=False,
+                          help='Print the resource usage and the number ' +
+                          'and size of the main generator objects at ' +
+                          'checkpoints.')
+    arg_parser.add_option('--layout-profile',
+                          action='store',
+                          dest='layout_profile',
+                          default='',
+                          help='Instruction frequency profile with lines ' +
+                          'of "IFORM count" or "ICLASS count", like the ' +
+                          'output of xed -iform-histo. The hot ' +
+                          'instructions and their operand sequences are ' +
+                          'placed first in the decoder tables.')
+    arg_parser.add_option('--profile-report',
+                          action='store',
+                          dest='profile_report',
+                          default='',
+                          help='Write the wall time, CPU time and peak ' +
+                          'RSS of each generator phase to this JSON file.')
+    arg_parser.add_option('--profile-dump-dir',
+                          action='store',
+                          dest='profile_dump_dir',
+                          default='',
+                          help='With --profile-report, also write a ' +
+                          'cProfile dump for each top level phase in ' +
+                          'this directory.')
     return arg_parser
 
 #####################################################################
@@ -434,6 +517,8 @@ class bit_info_t(object):
    bits are type bit.  The other kinds of bits are dontcares which are
    letter names, state bits, operand tests and nonterminals.
    """
+   # There are a lot of these. No per-instance __dict__ saves memory.
+   __slots__ = ('btype', 'value', 'pbit', 'token', 'test', 'requirement')
    
    bit_types = [ 'bit', 'dontcare', 'operand', 'nonterminal'  ]
    def __init__(self, value, btype='bit', pbit=-1):
@@ -527,13 +612,54 @@ class bit_info_t(object):
             die("Error finding NT name for " + self.value)
       return None
 
+# Bit masks summarizing the patterns of a list of instructions so that
+# build_sub_graph() can classify a bit position for all the
+# instructions of a graph node at once. Bit i of each mask is about
+# bit position i of the patterns: all_ods/all_nts are set if every
+# pattern has an operand decider/nonterminal there, the any_* masks
+# if some pattern has one. "others" are the bits that are not 1s or
+# 0s. Patterns shorter than i+1 bits contribute zeros.
+ilist_masks_t = collections.namedtuple('ilist_masks_t',
+                                       ['min_len', 'max_len',
+                                        'all_ods', 'all_nts', 'any_funky',
+                                        'any_ones', 'any_zeros',
+                                        'any_others'])
+
 # $$ bits_list_t
 class bits_list_t(object):
    """ list of bit_info_t """
+   __slots__ = ('bits', 'masks')
    def __init__(self):
       self.bits = []
+      # cached result of get_masks()
+      self.masks = None
    def append(self,x):
       self.bits.append(x)
+      self.masks = None
+
+   def get_masks(self):
+      """Return the ilist_masks_t for just this pattern. The masks
+      are cached; call invalidate_masks() after modifying self.bits."""
+      if self.masks == None:
+         ones = zeros = others = ods = nts = 0
+         for i,b in enumerate(self.bits):
+            if b.value == '1':
+               ones |= 1 << i
+            elif b.value == '0':
+               zeros |= 1 << i
+            else:
+               others |= 1 << i
+               if b.is_operand_decider():
+                  ods |= 1 << i
+               elif b.is_nonterminal():
+                  nts |= 1 << i
+         n = len(self.bits)
+         self.masks = ilist_masks_t(n, n, ods, nts, ods | nts,
+                                    ones, zeros, others)
+      return self.masks
+
+   def invalidate_masks(self):
+      self.masks = None
       
    def __str__(self):
       return self.just_bits()
@@ -950,6 +1076,16 @@ global_inum = 0
 
 # $$ partitionable
 class partitionable_info_t(object):
+   # oid_* are set by find_common_operand_sequences(). xed3_constraints
+   # is set by xed3_nt for nonterminal rules.
+   __slots__ = ('inum', 'name', 'input_str', 'ipattern_input', 'ipattern',
+                'prebindings', 'operands_input', 'operands',
+                'extra_ipatterns', 'extra_operands', 'extra_iforms_input',
+                'reset_for_prefix', 'encoder_func_obj', 'encoder_operands',
+                'otherwise_ok', 'all_nonterminals', 'all_operand_deciders',
+                'oid_list', 'oid_sequence', 'oid_sequence_start',
+                'xed3_constraints')
+
    def new_inum(self):
       global global_inum
       self.inum = global_inum
@@ -1093,6 +1229,15 @@ structured_input_tags = {'ICLASS':          True,
 
 # $$ instruction_info_t
 class instruction_info_t(partitionable_info_t):
+   # Unknown tokens in the instruction records, like REAL_OPCODE,
+   # become attributes so we keep a __dict__ for them.
+   # iclass_string_index is set by collect_iclass_strings().
+   __slots__ = ('iclass', 'uname', 'ucode', 'comment', 'exceptions',
+                'disasm_intel', 'disasm_att', 'iform_input', 'category',
+                'extension', 'isa_set', 'version', 'cpl', 'attributes',
+                'flags_input', 'flags_info', 'iform', 'iform_num',
+                'iform_enum', 'iclass_string_index', '__dict__')
+
    def __init__(self,
                 iclass='',
                 ipattern_input='',
@@ -1889,6 +2034,10 @@ def read_flat_input(agi, options, parser,lines,state_dict):
 
 # $$ graph_node_t
 class graph_node(object):
+   __slots__ = ('id', 'token', 'instructions', 'bitpos_mod8', 'decider_bits',
+                'skipped_bits', 'nonterminal', 'operand_decider',
+                'back_split_pos', 'otherwise_ok', 'next', 'capture_function',
+                'trimmed_values', 'child_od_key_values')
    
    global_node_num = 0
    
@@ -2006,6 +2155,28 @@ def get_bit(ii,bitpos):
       return 'badbit'
    return ii.ipattern.bits[bitpos]
 
+def get_ilist_masks(ilist):
+   """Return the ilist_masks_t for the list of instruction_info_t"""
+   for ii in ilist:
+      if isinstance(ii,tuple):
+         die("Bad tuple where instruction expected: "+ str(ii))
+   if len(ilist) == 1:
+      # most graph nodes are down to one instruction
+      return ilist[0].ipattern.masks or ilist[0].ipattern.get_masks()
+   masks = [ ii.ipattern.masks or ii.ipattern.get_masks() for ii in ilist ]
+   if len(masks) == 0:
+      return ilist_masks_t(0, 0, 0, 0, 0, 0, 0, 0)
+   (min_lens, max_lens, ods, nts, funky, ones, zeros, others) = zip(*masks)
+   _or = operator.or_
+   _and = operator.and_
+   return ilist_masks_t(min(min_lens), max(max_lens),
+                        functools.reduce(_and, ods),
+                        functools.reduce(_and, nts),
+                        functools.reduce(_or, funky),
+                        functools.reduce(_or, ones),
+                        functools.reduce(_or, zeros),
+                        functools.reduce(_or, others))
+
 
 def collect_required_values(instructions, bitpos):
    """Return a list of the required values for a list of operand
@@ -2233,6 +2404,7 @@ def rearrange_at_conflict(ilist,bitpos):
                if move_candidate_od_to_front(bitpos, 
                                              candidate_od, 
                                              i.ipattern.bits):
+                  i.ipattern.invalidate_masks()
                   msge("\tREARRANGE one pattern worked for %s inum %d" % 
                        ( i.get_iclass(), i.inum))
                else:
@@ -2436,9 +2608,10 @@ def back_split_graph(common, graph, bitpos, skipped_bits, splitpos):
 #                                  partition_by_required_values.
 g_operand_storage_dict = None
 
-def build_sub_graph(common, graph, bitpos, skipped_bits):
+def build_sub_graph(common, graph, bitpos, skipped_bits, masks=None):
    """Recursively partition instructions based on 1s, 0s and
-   placeholder letters"""
+   placeholder letters. masks is the ilist_masks_t for
+   graph.instructions if the caller has it."""
    global g_operand_storage_dict
    options = common.options
 
@@ -2513,7 +2686,12 @@ def build_sub_graph(common, graph, bitpos, skipped_bits):
    if vbuild():
       msge("Token " + str(graph.token) + "   Reached bit " + str(bitpos))
 
-   at_end = at_end_of_instructions(graph.instructions,bitpos)
+   if masks == None:
+      masks = get_ilist_masks(graph.instructions)
+   if bitpos < masks.min_len:
+      at_end = 0
+   else:
+      at_end = at_end_of_instructions(graph.instructions,bitpos)
    if at_end == 1:
       if vbuild():
          msge("Hit end of instructions -- skipped bits " + str(skipped_bits))
@@ -2564,8 +2742,10 @@ def build_sub_graph(common, graph, bitpos, skipped_bits):
       iterations += 1
          
       # Check for identical operand deciders
-      (all_same_decider, operand_decider) = \
-          all_same_operand_decider(graph.instructions,bitpos)
+      (all_same_decider, operand_decider) = (False, None)
+      if (masks.all_ods >> bitpos) & 1:
+         (all_same_decider, operand_decider) = \
+             all_same_operand_decider(graph.instructions,bitpos)
       if all_same_decider:
          if vbuild():
             msge("All same operand decider: %s" % operand_decider)
@@ -2678,7 +2858,9 @@ def build_sub_graph(common, graph, bitpos, skipped_bits):
       ####################################################################
       # Check for identical nonterminals
       # nt is the bit_info_t for the nonterminal
-      (all_same_nt, nt) = all_same_nonterminal(graph.instructions,bitpos)
+      (all_same_nt, nt) = (False, None)
+      if (masks.all_nts >> bitpos) & 1:
+         (all_same_nt, nt) = all_same_nonterminal(graph.instructions,bitpos)
       if all_same_nt:
          if vbuild():
             msge("All same nt")
@@ -2698,7 +2880,7 @@ def build_sub_graph(common, graph, bitpos, skipped_bits):
          nt_next_node.instructions.extend(graph.instructions)
 
          # carry on build the graph from the nt_next_node
-         build_sub_graph(common, nt_next_node, bitpos, 0)
+         build_sub_graph(common, nt_next_node, bitpos, 0, masks)
          return
       else:
          if vbuild():
@@ -2708,18 +2890,27 @@ def build_sub_graph(common, graph, bitpos, skipped_bits):
       # *AFTER* we advance the bit, we partition the nodes based on
       # *the current bit
 
-      (ones,zeros,others) = partition_nodes(graph.instructions,bitpos)
+      # The masks tell us which of the ones, zeros and others lists
+      # are nonempty. We only build the lists when we need them.
+      have_ones = (masks.any_ones >> bitpos) & 1
+      have_zeros = (masks.any_zeros >> bitpos) & 1
+      have_others = (masks.any_others >> bitpos) & 1
       if vbuild():
+         (ones,zeros,others) = partition_nodes(graph.instructions,bitpos)
          s =  "ones %d zeros %d others %d" % (len(ones), 
                                               len(zeros), len(others))
          msge('build_sub_graph ' + s )
 
       # make sure we do not have some things that hit the Nonterminal
       # and some that do not
-      if some_funky_spot(graph.instructions,bitpos):
+      if (masks.any_funky >> bitpos) & 1:
          msge('FUNKY SPOT: bitpos %d' % (bitpos))
+         (ones,zeros,others) = partition_nodes(graph.instructions,bitpos)
          print_split(others,ones,zeros,brief=True)
-         if rearrange_at_conflict(graph.instructions, bitpos):
+         rearranged = rearrange_at_conflict(graph.instructions, bitpos)
+         # the rearranging modifies the patterns
+         masks = get_ilist_masks(graph.instructions)
+         if rearranged:
             msge("REARRANGED ODs TO BYPASS PROBLEM at bitpos %d" % bitpos )
             # try resplitting the nodes now that we've juggled stuff
             continue 
@@ -2740,6 +2931,8 @@ def build_sub_graph(common, graph, bitpos, skipped_bits):
       else:
          splitting = False # we are good to exit
 
+   if verb7() or (expand_dont_cares and have_others):
+      (ones,zeros,others) = partition_nodes(graph.instructions,bitpos)
    if verb7():
       print_split(others,ones,zeros)
 
@@ -2755,11 +2948,11 @@ def build_sub_graph(common, graph, bitpos, skipped_bits):
    # just keep going. Similarly, if there are all 1s or all 0s then we
    # just keep going (when skip_constants is True). Only split the
    # node if it is a mix of 1s and 0s.
-   if len(others) > 0:
+   if have_others:
 
       ####OLD STUFF build_sub_graph(common,graph, skipped_bits+1)  # RECUR
 
-      if expand_dont_cares and (len(ones)>0 or len(zeros)>0):
+      if expand_dont_cares and (have_ones or have_zeros):
          # we only do the expansion if ones/zeros are floating around
          # at this point. Build two nodes. Put all the ones in the
          # "one" node, all hte zeros in the "zero" node and the others
@@ -2786,40 +2979,45 @@ def build_sub_graph(common, graph, bitpos, skipped_bits):
          build_sub_graph(common,onode,bitpos, 0)  # RECUR
 
       else:
-         build_sub_graph(common,graph,bitpos, skipped_bits+1)  # RECUR
+         build_sub_graph(common,graph,bitpos, skipped_bits+1,
+                         masks)  # RECUR
       
-   elif len(ones) > 0 and len(zeros) == 0:
+   elif have_ones and not have_zeros:
       # Some one's but no zeros, no others
       if vbuild():
          msge("some ones, no zeros no others")
       if skip_constants:
-         build_sub_graph(common,graph, bitpos, skipped_bits+1)  # RECUR
+         build_sub_graph(common,graph, bitpos, skipped_bits+1,
+                         masks)  # RECUR
       else:
          graph.skipped_bits = skipped_bits
          graph.decider_bits = 1
       
+         # all the instructions are ones
          onode = new_node(graph,'1',bitpos)
-         onode.instructions.extend(ones)
-         build_sub_graph(common,onode,bitpos, 0)   # RECUR
-   elif len(ones) == 0 and len(zeros) > 0:
+         onode.instructions.extend(graph.instructions)
+         build_sub_graph(common,onode,bitpos, 0, masks)   # RECUR
+   elif not have_ones and have_zeros:
       # Some zeros's but no ones, no others
       if vbuild():
          msge("some zeros, no ones  no others")
       if skip_constants:
-         build_sub_graph(common,graph,bitpos, skipped_bits+1)
+         build_sub_graph(common,graph,bitpos, skipped_bits+1, masks)
       else:
          graph.skipped_bits = skipped_bits
          graph.decider_bits = 1
       
+         # all the instructions are zeros
          znode = new_node(graph,'0',bitpos)
-         znode.instructions.extend(zeros)
-         build_sub_graph(common,znode, bitpos, 0)  # RECUR
+         znode.instructions.extend(graph.instructions)
+         build_sub_graph(common,znode, bitpos, 0, masks)  # RECUR
    else:
       # some zeros, some ones -> split it      
       if vbuild():
          msge("Just 0s and 1s, splitting, building a subgraph")
       graph.skipped_bits = skipped_bits
       graph.decider_bits = 1
+      (ones,zeros,others) = partition_nodes(graph.instructions,bitpos)
 
       # zero child node
       znode = new_node(graph,'0',bitpos)
@@ -2865,6 +3063,84 @@ def build_graph(common, parser_output, operand_storage_dict):
    return graph
 
          
+def build_graphs(agi):
+   """Build and optimize the graph for each generator"""
+   for gi in agi.generator_list:
+      with phaseprof.phase('build_graph:' + gi.nonterminal_name()):
+         gi.graph = build_graph(agi.common, 
+                                gi.parser_output, 
+                                agi.operand_storage.get_operands())
+         if not gi.parser_output.is_lookup_function():
+            optimize_graph(agi.common.options, gi.graph)
+
+def _build_graph_job(args):
+   """Process pool worker for build_graphs_parallel(). Returns the
+   parser output along with the graph so that the graph's references
+   to the instructions survive the trip back to the parent."""
+   global renum_node_id
+   (common, parser_output, operand_storage_dict) = args
+   set_verbosity_options(common.options.verbosity)
+   # node ids start at zero here and get offset by the parent
+   graph_node.global_node_num = 0
+   renum_node_id = -1
+   try:
+      graph = build_graph(common, parser_output, operand_storage_dict)
+      if not parser_output.is_lookup_function():
+         optimize_graph(common.options, graph)
+   except SystemExit:
+      # die() was called. Do not take down the worker process.
+      return None
+   return (parser_output, graph, 
+           graph_node.global_node_num, renum_node_id + 1)
+
+def _offset_node_ids(node, offset, visited):
+   if id(node) in visited:
+      return
+   visited[id(node)] = True
+   node.id += offset
+   for nxt in node.next.values():
+      _offset_node_ids(nxt, offset, visited)
+
+def build_graphs_parallel(agi):
+   """Like build_graphs() but build each generator's graph in a
+   separate process. The graphs are independent so we only need to
+   assign node ids as if they were built serially in generator order
+   to get the same output as build_graphs()."""
+   import multiprocessing
+   global renum_node_id
+
+   # the generator_common_t in the agi holds open files; make a copy
+   # with just what the graph build requires.
+   common = generator_common_t()
+   common.options = agi.common.options
+   common.state_bits = agi.common.state_bits
+   common.state_space = agi.common.state_space
+   operand_storage_dict = agi.operand_storage.get_operands()
+   jobs = [ (common, gi.parser_output, operand_storage_dict) 
+            for gi in agi.generator_list ]
+
+   msgb("BUILDING GRAPHS", "%d generators, %d processes" % 
+        (len(jobs), agi.common.options.jobs))
+   # avoid replicating buffered output in the child processes
+   sys.stdout.flush()
+   sys.stderr.flush()
+   pool = multiprocessing.Pool(agi.common.options.jobs)
+   results = pool.map(_build_graph_job, jobs, 1)
+   pool.close()
+   pool.join()
+
+   for gi, result in zip(agi.generator_list, results):
+      if result == None:
+         die("Graph build failed for " + gi.nonterminal_name())
+      (gi.parser_output, gi.graph, nodes_created, nodes_renumbered) = result
+      if gi.parser_output.is_lookup_function():
+         # graphs for lookup functions keep their creation ids
+         _offset_node_ids(gi.graph, graph_node.global_node_num, {})
+      else:
+         _offset_node_ids(gi.graph, renum_node_id + 1, {})
+         renum_node_id += nodes_renumbered
+      graph_node.global_node_num += nodes_created
+
 def print_graph(options, node, pad =''):
    s = node.dump_str(pad)
    msge(s)
@@ -4002,6 +4278,7 @@ global_id_to_operand = {}
 global_oid_sequences = {}
 global_max_operand_sequences = 0
 global_oid_sequence_id_to_oid_list = {}
+global_oid_sequence_table = []
 def remember_operand(xop):
    """Call this from wherever operands are created. It assigns unique
    IDs to each operand."""
@@ -4020,48 +4297,66 @@ def remember_operand(xop):
       global_operand_table_id = global_operand_table_id  + 1
 
 import hlist
+import seqpack
+import strpool
 def find_common_operand_sequences(agi):
     """Label each instruction with an oid_sequence number that
     corresponds to its operand sequence. The operands get their
-    unique_ids first. """
+    unique_ids first. The sequences are then packed in to one table
+    where they share their common prefixes and suffixes. Each
+    instruction gets the oid_sequence_start of its window in that
+    table."""
 
     global global_operand_table_id # counter of # of operands
     global global_oid_sequences 
     global global_max_operand_sequences
     global global_oid_sequence_id_to_oid_list
+    global global_oid_sequence_table
     next_oid_seqeuence = 0
     reused = 0
-    n_operands = 0
+    # number the operands and sequences of the hot instructions first
+    # so that they are next to each other in the tables
+    instructions = []
     for gi in agi.generator_list:
-        for ii in gi.parser_output.instructions:
-            # build up a list of operand unique indices
-            ii.oid_list  = []
-            for op in ii.operands:
-                # skip the internal operands
-                if op.internal:
-                    continue
-                remember_operand(op)
-                ii.oid_list.append(op.unique_id)
-
-            # then find out if other instructions share that operand sequence
-            hl = hlist.hlist_t(ii.oid_list)
-            try:
-                (ii.oid_sequence, ii.oid_sequence_start) = \
-                    global_oid_sequences[hl]
-                reused = reused + 1
-            except:
-                ii.oid_sequence = next_oid_seqeuence
-                ii.oid_sequence_start = n_operands
-                global_oid_sequences[hl] = (next_oid_seqeuence, n_operands)
-                global_oid_sequence_id_to_oid_list[next_oid_seqeuence] = hl
-                next_oid_seqeuence = next_oid_seqeuence + 1
-                n_operands = n_operands + len(ii.oid_list)
+        instructions.extend(gi.parser_output.instructions)
+    for ii in layout_order(agi, instructions):
+        # build up a list of operand unique indices
+        ii.oid_list  = []
+        for op in ii.operands:
+            # skip the internal operands
+            if op.internal:
+                continue
+            remember_operand(op)
+            ii.oid_list.append(op.unique_id)
+
+        # then find out if other instructions share that operand sequence
+        hl = hlist.hlist_t(ii.oid_list)
+        try:
+            ii.oid_sequence = global_oid_sequences[hl]
+            reused = reused + 1
+        except:
+            ii.oid_sequence = next_oid_seqeuence
+            global_oid_sequences[hl] = next_oid_seqeuence
+            global_oid_sequence_id_to_oid_list[next_oid_seqeuence] = hl
+            next_oid_seqeuence = next_oid_seqeuence + 1
 
     msgb("Unique Operand Sequences", str(next_oid_seqeuence))
     n = 0
     for k in list(global_oid_sequences.keys()):
         n = n + len(k.lst)
-    global_max_operand_sequences = n
+    msgb("Operand sequence pointers without overlapping", str(n))
+
+    seqs = [ tuple(global_oid_sequence_id_to_oid_list[i].lst)
+             for i in range(0, next_oid_seqeuence) ]
+    (global_oid_sequence_table, starts) = seqpack.pack(seqs)
+    for i,seq in enumerate(seqs):
+        b = starts[i]
+        if tuple(global_oid_sequence_table[b:b+len(seq)]) != seq:
+            die("Operand sequence packing failed for sequence {}".format(i))
+    for ii in instructions:
+        ii.oid_sequence_start = starts[ii.oid_sequence]
+
+    global_max_operand_sequences = len(global_oid_sequence_table)
     msgb("Number of required operand sequence pointers", 
          str(global_max_operand_sequences))
     msgb("Number of reused operand sequence pointers", str(reused))
@@ -4069,17 +4364,11 @@ def find_common_operand_sequences(agi):
 
 
 def code_gen_operand_sequences(agi):
-    global global_oid_sequences
-    global global_oid_sequence_id_to_oid_list
+    global global_oid_sequence_table
 
-    m = len(global_oid_sequences)
-    k = 0
-    for i in range(0, m):
-        hl = global_oid_sequence_id_to_oid_list[i]
-        for oi,n in enumerate(hl.lst):
-            s = '/* %4d %4d.%1d */ %6d,' % (k, i, oi, n)
-            agi.operand_sequence_file.add_code(s)
-            k = k + 1
+    for k,n in enumerate(global_oid_sequence_table):
+        s = '/* %4d */ %6d,' % (k, n)
+        agi.operand_sequence_file.add_code(s)
 
 def code_gen_unique_operands(agi):
     global global_operand_table_id
@@ -4095,7 +4384,7 @@ def code_gen_unique_operands(agi):
 max_operand_count = 0
 global_final_inum = 0
 global_emitted_zero_inum = False
-def code_gen_instruction(agi, options, ii, state_dict, fo, 
+def code_gen_instruction(agi, options, ii, state_dict,
                          nonterminal_dict, operand_storage_dict):
    """Emit code for one instruction entry"""
    global max_operand_count
@@ -4204,79 +4493,23 @@ def code_gen_instruction(agi, options, ii, state_dict, fo,
 
 
 
-#$$ table_init_object
-class table_init_object_t(object):
-   def __init__(self, file_name, function_name):
-      self.file_name_prefix = file_name
-      self.function_name_prefix = function_name
-      
-      self.fp = None # file pointer
-      self.fo = None # function_object_t
-      self.init_functions = []
-      self.max_lines_per_file = 3000
-
-   def get_init_functions(self):
-      return self.init_functions
-   
-   def get_fo(self,gi):
-      if not self.fp:
-         # make a new output file and new function obj if we don't
-         # already have one
-         n = str(len(self.init_functions))
-         self.fp = gi.common.open_file(self.file_name_prefix + n + '.c', 
-                                       start=False)
-         self.fp.start()
-         
-         full_function_name = self.function_name_prefix + n
-         self.fo = function_object_t(full_function_name,"void")
-         self.init_functions.append(self.fo)
-      return self.fo
-   
-   def check_file(self):
-      if self.fo:
-         if self.fo.lines() >= self.max_lines_per_file:
-
-            self.fp.write(self.fo.emit())
-            self.fp.close()
-            del self.fp
-
-            self.fo = None
-            self.fp = None
-         
-   def finish_fp(self):
-      # write anything that didn't get emitted already
-      if self.fp:
-         self.fp.write(self.fo.emit())
-         self.fp.close()
-         del self.fp
-
-         self.fo = None
-         self.fp = None
-
-
-   
-   
-   
-def code_gen_instruction_table(agi, gi, itable_init, nonterminal_dict,
+def code_gen_instruction_table(agi, nonterminal_dict,
                                operand_storage_dict):
-   """Emit a table of all instructions. itable_init is a
-   table_init_object_t with a list of function_object_ts to which we add
-   those that we create."""
+   """Emit the xed_inst_table entries as static initialized data, in
+   the itable order from relabel_itable()"""
    if vtrace():
       msge("code_gen_instruction_table")
 
-   for ii in gi.parser_output.instructions:
-      fo = itable_init.get_fo(gi)
+   instructions = itable_instructions(agi)
+   instructions.sort(key=lambda ii: ii.inum)
+   for ii in instructions:
       code_gen_instruction(agi,
-                           gi.common.options,
+                           agi.common.options,
                            ii,
-                           gi.common.state_bits,
-                           fo,
+                           agi.common.state_bits,
                            nonterminal_dict,
                            operand_storage_dict)
       
-      itable_init.check_file()
-      
 
 def rewrite_default_operand_visibilities(generator,
                                          operand_field_dict):
@@ -4302,10 +4535,19 @@ def emit_string_table(agi, iclass_strings):
     f.add_misc_header('#include "xed-gen-table-defs.h"')
     f.add_misc_header('#include "xed-tables-extern.h"')
     f.start()
-    s = 'char const* const xed_iclass_string[XED_ICLASS_NAME_STR_MAX] = {\n'
+    pool = strpool.string_pool_t('xed_iclass_string_pool')
+    for i in iclass_strings:
+        pool.add(i)
+    pool.finish()
+    if pool.size > 0xFFFF:
+        die("The iclass string pool does not fit 16b offsets")
+    for line in pool.emit(qualifiers='const'):
+        f.write(line + '\n')
+    s = ('const xed_uint16_t ' +
+         'xed_iclass_string_offset[XED_ICLASS_NAME_STR_MAX] = {\n')
     f.write(s)
-    for i in iclass_strings:        
-        f.write('"%s",\n' % (i))
+    for i in iclass_strings:
+        f.write('/* %s */ %d,\n' % (i, pool.offset(i)))
     f.write('};\n')
     f.close()
         
@@ -4571,20 +4813,81 @@ def collect_and_emit_iforms(agi,options):
    
 ############################################################################
 
+def read_name_counts(fn, prefix, what):
+   """Read lines of "NAME count" from fn. Return a dictionary of name
+   to count. The prefix pattern is removed from the names."""
+   profile = {}
+   for line in open(fn,'r'):
+      wrds = no_comments(line).split()
+      if not wrds:
+         continue
+      if len(wrds) != 2:
+         die("Bad {} line: {}".format(what, line.strip()))
+      name = re.sub(prefix, '', wrds[0])
+      try:
+         profile[name] = profile.get(name,0) + int(wrds[1])
+      except ValueError:
+         die("Bad {} count: {}".format(what, line.strip()))
+   msgb(what.upper(), "{} names from {}".format(len(profile), fn))
+   return profile
+
+def read_layout_profile(fn):
+   """Read the --layout-profile file. Return a dictionary of iform or
+   iclass name to count."""
+   return read_name_counts(fn, r'^XED_(IFORM|ICLASS)_', 'layout profile')
+
+def instruction_heat(agi, ii, profiled_iclasses):
+   """The layout profile count of the iform of the instruction or, if
+   none of the iforms of its iclass are in the profile, of its
+   iclass. Some iforms have the name of their iclass."""
+   if not field_check(ii,'iclass'):
+      return 0
+   if ii.iform_enum in agi.layout_profile:
+      return agi.layout_profile[ii.iform_enum]
+   if ii.iclass in profiled_iclasses:
+      return 0
+   return agi.layout_profile.get(ii.iclass, 0)
+
+def find_profiled_iclasses(agi, instructions):
+   """The iclasses that have iforms in the layout profile"""
+   profiled_iclasses = set()
+   for ii in instructions:
+      if field_check(ii,'iclass') and ii.iform_enum in agi.layout_profile:
+         profiled_iclasses.add(ii.iclass)
+   return profiled_iclasses
+
+def layout_order(agi, instructions):
+   """Return the instructions hottest first if we have a layout
+   profile. Equally hot instructions, like all the ones that are not
+   in the profile, stay in the grammar order."""
+   if not agi.layout_profile:
+      return instructions
+   profiled_iclasses = find_profiled_iclasses(agi, instructions)
+   return sorted(instructions,
+                 key=lambda ii: -instruction_heat(agi, ii, profiled_iclasses))
+
+def itable_instructions(agi):
+   """The instructions of the generators that are not lookup functions
+   in grammar order"""
+   instructions = []
+   for gi in agi.generator_list:
+      if not gi.parser_output.is_lookup_function():
+         instructions.extend(gi.parser_output.instructions)
+   return instructions
+
 def relabel_itable(agi):
-   """Renumber the itable so that it is sequential."""
+   """Renumber the itable so that it is sequential. With a layout
+   profile the hot instructions get the low numbers."""
    global global_inum
    inum = 1
-   for gi in agi.generator_list:
-      if not gi.parser_output.is_lookup_function():
-         for ii in gi.parser_output.instructions:
-            has_iclass =  field_check(ii,'iclass')
-            if has_iclass:
-                ii.inum = inum
-                inum += 1
-            else:
-                # make all the non-instruction leaves point to node zero
-                ii.inum = 0
+   for ii in layout_order(agi, itable_instructions(agi)):
+      has_iclass =  field_check(ii,'iclass')
+      if has_iclass:
+          ii.inum = inum
+          inum += 1
+      else:
+          # make all the non-instruction leaves point to node zero
+          ii.inum = 0
    global_inum = inum
 
 
@@ -4927,7 +5230,6 @@ class generator_common_t(object):
                               # restriction (operand_decider)
 
       self.enc_file = None
-      self.inst_file = None
       self.operand_storage_hdr_file = None
       self.operand_storage_src_file = None
       
@@ -4967,16 +5269,6 @@ class generator_common_t(object):
             self.source_file_names.append(fn)
       return fn
    
-   def open_all_files(self):
-      "Open the major output files"
-      msge("Opening output files")
-
-      header = True
-
-
-      self.inst_file = self.open_file(self.build_fn(
-                                          self.options.inst_init_file))
-
    def open_new_inst_table_file(self):
       i = len(self.inst_table_file_names)
       base_fn = 'xed-inst-table-init-'
@@ -5050,7 +5342,6 @@ class all_generator_info_t(object):
       #common has mostly input and output files and names
       self.common = generator_common_t()
       self.common.options = options
-      self.common.open_all_files()
       
       self.generator_list = []
       self.generator_dict = {} # access by NT name
@@ -5078,8 +5369,6 @@ class all_generator_info_t(object):
       self.iclasses_enum_order = None
 
       # function_object_ts
-      self.itable_init_functions = table_init_object_t('xed-init-inst-table-',
-                                                       'xed_init_inst_table_')
       self.encode_init_function_objects = []
       
       # dictionaries of code snippets that map to function names
@@ -5116,6 +5405,9 @@ class all_generator_info_t(object):
       self.attr_next_pos  = 0
       self.attributes_ordered  = None
       self.sorted_attributes_dict = {}
+      # iform or iclass name -> count, from --layout-profile
+      self.layout_profile = None
+
       # a dict of all the enum names to their values. 
       # passed to operand storage in order to calculate 
       # the number of required bits
@@ -5356,26 +5648,6 @@ class all_generator_info_t(object):
 
 
 
-def init_functions_for_table(agi, fp, function_name, init_object):
-   """emit, to the file pointer fp, headers and calls to each init
-   function for the init_object. The function we build is named
-   function_name."""
-   print_resource_usage('init.0')   
-   # emit prototype for each subgraph init function
-   for dfo in init_object.get_init_functions():
-      #print_resource_usage('init.1')
-      fp.write(dfo.emit_header())
-
-   #print_resource_usage('init.2')
-   # a function that calls each init function
-   init_fo = function_object_t(function_name,'void')
-   for dfo in init_object.get_init_functions():
-      init_fo.add_code_eol(dfo.function_name + '()')
-   fp.write(init_fo.emit())
-   fp.close()
-   del fp
-   #print_resource_usage('init.3')
-
 ############################################################################
 
 def generator_emit_function_list(fo_list, file_emitter):
@@ -5454,11 +5726,9 @@ def collect_convert_decorations(agi):
 # Generate the graph and most tables
 ############################################################################
 
-
-def gen_everything_else(agi):
-    """This is the major work function of the generator. We read the
-    main input files and build the decoder graph and then the decoder"""
-
+def read_decoder_input(agi):
+    """Read the state bits and the spine, pattern and ISA input
+    files. Creates a generator with a parser_t for each nonterminal."""
     msge("Reading state bits")
     if agi.common.options.input_state != '':
        #parse the xed-state-bits.txt (or something similar) file and return
@@ -5495,17 +5765,6 @@ def gen_everything_else(agi):
     
     lines = process_continuations(lines)
 
-    # Open structured output file
-    if agi.common.options.structured_output_fn.startswith(os.path.sep):
-       fn = agi.common.options.structured_output_fn
-    else:
-       fn = os.path.join(agi.common.options.gendir,
-                         agi.common.options.structured_output_fn)
-    print_structured_output  = False
-    if print_structured_output:
-       sout = open(fn,"w")
-       print_resource_usage('everything.0')
-
     # read all the input
     while len(lines) != 0:
        msge("=============================================")
@@ -5520,7 +5779,79 @@ def gen_everything_else(agi):
     #removed for all parsers, that have instructions.
     #Also all instructions with old versions will be dropped. 
     remove_instructions(agi)
-    
+
+def parse_cache_key(agi):
+    """Digest of every input that can influence the parsed
+    records. The operand storage, widths and element types are
+    consulted while parsing operands."""
+    options = agi.common.options
+    input_fns = [ options.input_state,
+                  options.spine,
+                  options.structured_input_fn,
+                  options.isa_input_file,
+                  options.input_fields,
+                  options.input_regs,
+                  options.input_widths,
+                  options.input_extra_widths,
+                  options.input_element_types,
+                  options.input_element_type_base ]
+    return gencache.digest(input_fns, [options.compress_operands])
+
+def read_decoder_input_cached(agi):
+    """Like read_decoder_input() but reuse the parse results from an
+    earlier run with identical inputs, if available in the
+    --parse-cache directory."""
+    global global_inum
+    cache_dir = agi.common.options.parse_cache_dir
+    key = parse_cache_key(agi)
+    cached = gencache.load(cache_dir, 'parse', key)
+    if cached:
+       agi.common.state_bits = cached['state_bits']
+       agi.common.state_space = cached['state_space']
+       agi.nonterminal_dict = cached['nonterminal_dict']
+       for (nt_name, parser) in cached['parsers']:
+          gi = agi.make_generator(nt_name)
+          gi.parser_output = parser
+       global_inum = cached['global_inum']
+       return
+
+    read_decoder_input(agi)
+    # the graph build modifies the instruction records so we must
+    # save them before that happens.
+    nt_names = {}
+    for nt_name, gi in agi.generator_dict.items():
+       nt_names[id(gi)] = nt_name
+    parsers = [ (nt_names[id(gi)], gi.parser_output)
+                for gi in agi.generator_list ]
+    cached = { 'state_bits': agi.common.state_bits,
+               'state_space': agi.common.state_space,
+               'nonterminal_dict': agi.nonterminal_dict,
+               'parsers': parsers,
+               'global_inum': global_inum }
+    gencache.store(cache_dir, 'parse', key, cached)
+
+
+def gen_everything_else(agi):
+    """This is the major work function of the generator. We read the
+    main input files and build the decoder graph and then the decoder"""
+
+    with phaseprof.phase('read_decoder_input'):
+       if agi.common.options.parse_cache_dir:
+          read_decoder_input_cached(agi)
+       else:
+          read_decoder_input(agi)
+
+    print_structured_output  = False
+    if print_structured_output:
+       # Open structured output file
+       if agi.common.options.structured_output_fn.startswith(os.path.sep):
+          fn = agi.common.options.structured_output_fn
+       else:
+          fn = os.path.join(agi.common.options.gendir,
+                            agi.common.options.structured_output_fn)
+       sout = open(fn,"w")
+       print_resource_usage('everything.0')
+
     # first pass on the input, build the graph, collect information
     for gi in agi.generator_list:
        # if anything has flags, then add a flags register
@@ -5536,15 +5867,17 @@ def gen_everything_else(agi):
        mark_operands_internal(agi, gi.parser_output)
        if print_structured_output:
           gi.parser_output.print_structured_output(sout)
-       ###############################################
-       # BUILD THE GRAPH BY RECURSIVE PARTITIONING
-       ###############################################
-       gi.graph = build_graph(agi.common, 
-                              gi.parser_output, 
-                              agi.operand_storage.get_operands())
 
-       if not gi.parser_output.is_lookup_function():
-          optimize_graph(agi.common.options, gi.graph)
+    ###############################################
+    # BUILD THE GRAPH BY RECURSIVE PARTITIONING
+    ###############################################
+    with phaseprof.phase('build_graphs'):
+       if agi.common.options.jobs > 1:
+          build_graphs_parallel(agi)
+       else:
+          build_graphs(agi)
+
+    for gi in agi.generator_list:
        nt_name  = gi.graph.token
        #msge("GRAPHROOT: " + nt_name)
        agi.nonterminal_dict.add_graph_node(nt_name, gi.graph.id)
@@ -5570,11 +5903,6 @@ def gen_everything_else(agi):
        del sout
     
     print_resource_usage('everything.3')
-    # Renumber the itable nodes so that they are sequential, skipping
-    # over the lookup function itable entries.
-    relabel_itable(agi)
-    
-    print_resource_usage('everything.3a')
     
     # some stuff needs to be created first so that the pass2 stuff can
     # refer to it.
@@ -5583,9 +5911,16 @@ def gen_everything_else(agi):
        rewrite_default_operand_visibilities(generator,
                                             agi.operand_storage.get_operands())
 
-       compute_iforms(generator.common.options, 
-                      generator,
-                      agi.operand_storage.get_operands())
+       with phaseprof.phase('compute_iforms'):
+          compute_iforms(generator.common.options, 
+                         generator,
+                         agi.operand_storage.get_operands())
+
+    # Renumber the itable nodes so that they are sequential, skipping
+    # over the lookup function itable entries. After compute_iforms()
+    # because the layout profile can refer to iforms.
+    relabel_itable(agi)
+    print_resource_usage('everything.3a')
 
     collect_convert_decorations(agi)
 
@@ -5594,7 +5929,8 @@ def gen_everything_else(agi):
     emit_iclass_enum_info(agi)
     emit_iclass_rep_ops(agi)
     
-    collect_and_emit_iforms(agi,agi.common.options)
+    with phaseprof.phase('collect_and_emit_iforms'):
+       collect_and_emit_iforms(agi,agi.common.options)
     collect_iclass_strings(agi)
     collect_instruction_types(agi, agi.iform_info)
     agi.isa_sets = collect_isa_sets(agi)
@@ -5605,7 +5941,8 @@ def gen_everything_else(agi):
     
     print_resource_usage('everything.4b')
     # mark bit positions in each "instruction"
-    decorate_operands(agi.common.options,agi)
+    with phaseprof.phase('decorate_operands'):
+       decorate_operands(agi.common.options,agi)
     print_resource_usage('everything.4c')
 
     decorate_instructions_with_exception_types(agi)
@@ -5619,61 +5956,33 @@ def gen_everything_else(agi):
     agi.open_operand_data_file()
     agi.open_operand_sequence_file()
     
-    cg_args = code_gen_dec_args_t()
-
     agi.encode_init_function_objects.append(
               function_object_t('xed_encode_init', 'void'))
     print_resource_usage('everything.5')          
 
-    find_common_operand_sequences(agi)
+    with phaseprof.phase('find_common_operand_sequences'):
+       find_common_operand_sequences(agi)
 
-    for generator in agi.generator_list:
-       print_resource_usage('everything.6')
-       if generator.parser_output.is_lookup_function():
-          pass
-       else:
-          cg_args.gi = generator
-          cg_args.options = generator.common.options
-          cg_args.node = generator.graph
-          cg_args.nonterminal_dict = agi.nonterminal_dict
-          cg_args.state_bits = agi.common.state_bits
-          cg_args.itable_init_functions = agi.itable_init_functions
-
-          cg_args.encode_init_function_object =  \
-                    agi.encode_init_function_objects[0]
-          cg_args.operand_storage_dict = agi.operand_storage.get_operands()
-
-          # generate the itable
-          code_gen_instruction_table(agi,
-                                     cg_args.gi,
-                                     cg_args.itable_init_functions,
-                                     cg_args.nonterminal_dict,
-                                     cg_args.operand_storage_dict)
-
-          print_resource_usage('everything.7')        
+    print_resource_usage('everything.6')
+    # generate the itable
+    with phaseprof.phase('code_gen_instruction_table'):
+       code_gen_instruction_table(agi,
+                                  agi.nonterminal_dict,
+                                  agi.operand_storage.get_operands())
+    print_resource_usage('everything.7')        
 
     global max_operand_count
     msgb("MAX OPERAND COUNT {}".format(max_operand_count))
 
-    code_gen_unique_operands(agi)
-    code_gen_operand_sequences(agi)
+    with phaseprof.phase('code_gen_operands'):
+       code_gen_unique_operands(agi)
+       code_gen_operand_sequences(agi)
     agi.close_operand_data_file()
     agi.close_operand_sequence_file()
     agi.inst_fp.write('};\n')
     agi.inst_fp.close()
 
-    # finish emitting the last function for the itable and the decode graph
-    agi.itable_init_functions.finish_fp()
-
     print_resource_usage('everything.10')
-       
-    # THIS NEXT FUNCTION IS THE BIGGEST TIME HOG
-    init_functions_for_table(agi,
-                             agi.common.inst_file,
-                             'xed_init_inst_table',
-                             agi.itable_init_functions)
-    
-    print_resource_usage('everything.12')          
     # some states are not assigned to in the graph and we must reserve
     # storage for them anyway. MODE is one example.
     agi.extend_operand_names_with_input_states()
@@ -5691,12 +6000,110 @@ def gen_everything_else(agi):
     agi.close_flags_files()
     print_resource_usage('everything.16')          
 
-    call_chipmodel(agi)
-    call_ctables(agi) 
-    emit_operand_storage(agi)
+    with phaseprof.phase('call_chipmodel'):
+       call_chipmodel(agi)
+    with phaseprof.phase('call_ctables'):
+       call_ctables(agi) 
+    with phaseprof.phase('emit_operand_storage'):
+       emit_operand_storage(agi)
 
 ################################################
+def rule_nonterminals(ii):
+    """The nonterminals called by the capture code of a rule"""
+    nts = [ bt.nonterminal_name() for bt in ii.ipattern.bits
+            if bt.is_nonterminal() ]
+    for op in ii.operands:
+        if op.type == 'nt_lookup_fn':
+            nts.append(op.lookupfn_name)
+    return nts
+
+def rule_fields(ii):
+    """The operand storage fields that the capture code of a rule reads
+    or writes"""
+    names = set([ bt.token for bt in ii.ipattern.bits
+                  if bt.is_operand_decider() ])
+    if ii.prebindings:
+        names.update(ii.prebindings.keys())
+    for op in ii.operands:
+        names.add(op.name)
+        if op.type == 'nt_lookup_fn':
+            names.add('OUTREG')
+    return names
+
+def nonterminal_call_order(agi):
+    """The generators, callers before the nonterminals they call"""
+    order = []
+    visited = set()
+    def visit(gi):
+        visited.add(gi)
+        for ii in gi.parser_output.instructions:
+            for nt in rule_nonterminals(ii):
+                if nt in agi.generator_dict and \
+                   agi.generator_dict[nt] not in visited:
+                    visit(agi.generator_dict[nt])
+        order.append(gi)
+    for gi in agi.generator_list:
+        if gi not in visited:
+            visit(gi)
+    order.reverse()
+    return order
+
+def ild_fields(agi):
+    """The operand storage fields used by the hand written length
+    decoder. It runs for every decoded instruction."""
+    fields = set()
+    pattern = re.compile(r'xed3_operand_[gs]et_(\w+)\s*[(]')
+    for fn in ['xed-ild.c', 'xed-decode.c']:
+        path = os.path.join(agi.common.options.xeddir, 'src', 'dec', fn)
+        for m in pattern.finditer(open(path,'r').read()):
+            fields.add(m.group(1).upper())
+    return fields
+
+def operand_field_heat(agi):
+    """Estimate how often the decoder touches each operand storage
+    field from the decode rules. The fields of an instruction are
+    weighted by the layout profile count of the instruction, if we
+    have a profile. The nonterminals get the weight of their callers,
+    split evenly over their rules. The fields the length decoder uses
+    count for every instruction. Returns a dictionary of field name to
+    heat."""
+    instructions = [ ii for gi in agi.generator_list
+                     for ii in gi.parser_output.instructions
+                     if field_check(ii,'iclass') ]
+    if agi.layout_profile:
+        profiled_iclasses = find_profiled_iclasses(agi, instructions)
+
+    heat = collections.defaultdict(float)
+    nt_weight = collections.defaultdict(float)
+    total = 0.0
+    for gi in nonterminal_call_order(agi):
+        rules = gi.parser_output.instructions
+        for ii in rules:
+            if field_check(ii,'iclass'):
+                if agi.layout_profile:
+                    w = instruction_heat(agi, ii, profiled_iclasses)
+                else:
+                    w = 1.0
+                total += w
+            else:
+                w = nt_weight[gi.nonterminal_name()] / len(rules)
+            for f in rule_fields(ii):
+                heat[f] += w
+            for nt in rule_nonterminals(ii):
+                nt_weight[nt] += w
+    for f in ild_fields(agi):
+        heat[f] += total
+    fields = agi.operand_storage.get_operands()
+    return dict([ (f, heat[f]) for f in heat if f in fields ])
+
 def emit_operand_storage(agi):
+    options = agi.common.options
+    if options.operand_profile:
+        heat = read_name_counts(options.operand_profile, r'^XED_OPERAND_',
+                                'operand profile')
+        agi.operand_storage.set_field_heat(heat)
+    elif options.optimize_operand_layout:
+        agi.operand_storage.set_field_heat(operand_field_heat(agi))
     agi.operand_storage.emit(agi)
 
 def call_ctables(agi):
@@ -5856,7 +6263,12 @@ def gen_ild(agi):
     else:
         agi.common.ild_getters_dict = None
     
+    cache_dir = agi.common.options.parse_cache_dir
+    if cache_dir:
+        ild_phash.load_search_cache(cache_dir)
     ild.work(agi)
+    if cache_dir:
+        ild_phash.store_search_cache(cache_dir)
 
 
 def emit_regs_enum(options, regs_list):
@@ -5873,7 +6285,10 @@ def emit_regs_enum(options, regs_list):
                                            'XED_REG_', cplusplus=False)
    reg_enum.print_enum()
    reg_enum.run_enumer()
-   return (reg_enum.src_full_file_name,reg_enum.hdr_full_file_name)
+   # the registers in enumeration order, without the FIRST/LAST aliases
+   reg_order = [ x.name for x in enumvals if x.value == None ]
+   return (reg_enum.src_full_file_name,reg_enum.hdr_full_file_name,
+           reg_order)
 
 def emit_reg_class_enum(options, regs_list):
    rclasses = {}
@@ -5904,38 +6319,55 @@ def emit_reg_class_enum(options, regs_list):
    reg_enum.run_enumer()
    return (reg_enum.src_full_file_name,reg_enum.hdr_full_file_name)
 
-def emit_reg_class_mappings(options, regs_list):
-   """Emit code to map any reg to its regclass. Also emit code to map
-   GPRs to a more specific GPR regclass (GPR8,16,32,64)"""
-   
-   fo = function_object_t('xed_init_reg_mappings', 'void')
+def enum_order(names):
+   """Return the list of names in the order that enumer assigns them
+   values: INVALID first and then the first occurrence of each name."""
+   seen = set(['INVALID'])
+   order = []
+   if 'INVALID' in names:
+      order.append('INVALID')
+   for name in names:
+      if name not in seen:
+         seen.add(name)
+         order.append(name)
+   return order
+
+def emit_reg_class_mappings(options, regs_list, reg_order):
+   """Emit tables to map any reg to its regclass. Also emit a table to
+   map GPRs to a more specific GPR regclass (GPR8,16,32,64). The
+   reg_order list has the register names in enumeration order. The
+   tables are fully initialized const data."""
+
+   # like the assignments in an init function, the last entry for a
+   # register wins.
+   regs_dict = {}
    for ri in regs_list:
-      s = 'xed_reg_class_array[XED_REG_%s]= XED_REG_CLASS_%s' % (ri.name, 
-                                                                 ri.type)
-      fo.add_code_eol(s)
+      regs_dict[ri.name] = ri
+   ordered_regs = [ regs_dict[x] for x in enum_order(reg_order) ]
 
-   for ri in regs_list:
-      s = 'xed_largest_enclosing_register_array[XED_REG_%s]= XED_REG_%s' % (
-          ri.name, ri.max_enclosing_reg)
-      fo.add_code_eol(s)
+   reg_class = []
+   gpr_reg_class = []
+   largest = []
+   largest32 = []
+   width_bits = []
+   for ri in ordered_regs:
+      reg_class.append('/* %s */ XED_REG_CLASS_%s' % (ri.name, ri.type))
+
+      if ri.type == 'GPR':
+         gpr_reg_class.append('/* %s */ XED_REG_CLASS_%s%s' % (ri.name,
+                                                               ri.type,
+                                                               ri.width))
+      else:
+         gpr_reg_class.append('/* %s */ XED_REG_CLASS_INVALID' % (ri.name))
+
+      largest.append('/* %s */ XED_REG_%s' % (ri.name, ri.max_enclosing_reg))
 
       if ri.max_enclosing_reg_32:
           m32 = ri.max_enclosing_reg_32
       else:
           m32 = 'INVALID' # used for 64b GPRs
+      largest32.append('/* %s */ XED_REG_%s' % (ri.name, m32))
 
-      s = 'xed_largest_enclosing_register_array_32[XED_REG_%s]= XED_REG_%s' % (
-          ri.name, m32)
-      fo.add_code_eol(s)
-      
-   for ri in regs_list:
-      if ri.type == 'GPR':
-         s = 'xed_gpr_reg_class_array[XED_REG_%s]= XED_REG_CLASS_%s%s' % (
-             ri.name, ri.type, ri.width)
-         fo.add_code_eol(s)
-
-
-   for ri in regs_list:
       if 'NA' == ri.width:
          width   = '0'
          width64 = '0'
@@ -5946,18 +6378,27 @@ def emit_reg_class_mappings(options, regs_list):
       else:
          width   = ri.width
          width64 = ri.width
-      
-      s = 'xed_reg_width_bits[XED_REG_%s][0] = %s' % (ri.name, width)
-      fo.add_code_eol(s)
-      s = 'xed_reg_width_bits[XED_REG_%s][1] = %s' % (ri.name, width64)
-      fo.add_code_eol(s)
+      width_bits.append('/* %s */ { %s, %s }' % (ri.name, width, width64))
 
    # write the file in our customized way
    fp = xed_file_emitter_t(options.xeddir,
                            options.gendir,
                            'xed-init-reg-class.c')
    fp.start()
-   fp.write(fo.emit())
+   for (decl, values) in [
+         ('xed_reg_class_enum_t xed_reg_class_array[XED_REG_LAST]',
+          reg_class),
+         ('xed_reg_class_enum_t xed_gpr_reg_class_array[XED_REG_LAST]',
+          gpr_reg_class),
+         ('xed_uint_t xed_reg_width_bits[XED_REG_LAST][2]',
+          width_bits),
+         ('xed_reg_enum_t xed_largest_enclosing_register_array[XED_REG_LAST]',
+          largest),
+         ('xed_reg_enum_t xed_largest_enclosing_register_array_32[XED_REG_LAST]',
+          largest32) ]:
+      fp.write('const %s = {\n' % decl)
+      fp.write(',\n'.join(values))
+      fp.write('\n};\n')
    fp.close()
    return fp.full_file_name
 
@@ -5973,7 +6414,7 @@ def gen_regs(options,agi):
    regs = [  x.name for x in  regs_list]
    agi.all_enums['xed_reg_enum_t'] = regs
 
-   (cfn, hfn) = emit_regs_enum(options, regs_list)
+   (cfn, hfn, reg_order) = emit_regs_enum(options, regs_list)
    agi.add_file_name(cfn)
    agi.add_file_name(hfn,header=True)
    
@@ -5981,7 +6422,7 @@ def gen_regs(options,agi):
    agi.add_file_name(cfn)
    agi.add_file_name(hfn,header=True)
    
-   cfn_map = emit_reg_class_mappings(options, regs_list)
+   cfn_map = emit_reg_class_mappings(options, regs_list, reg_order)
    agi.add_file_name(cfn_map)
 
    agi.regs_info = regs_list
@@ -6054,30 +6495,28 @@ def emit_widths_enum(options, widths_list):
 
 
 def emit_width_lookup(options, widths_list):
-   """Emit code to map XED_OPERAND_WIDTH_* and an effective operand size to a
-   number of bytes. """
+   """Emit a const table to map XED_OPERAND_WIDTH_* and an effective
+   operand size to a number of bits. """
 
-   fo = function_object_t('xed_init_width_mappings', 'void')
+   # like the assignments in an init function, the last entry for a
+   # width wins.
+   widths_dict = {}
    for ri in widths_list:
-      for i,w in enumerate(ri.widths):
-         s = 'xed_width_bits[XED_OPERAND_WIDTH_%s][%d] = %s' % (ri.name, i, w)
-         fo.add_code_eol(s)
-         
-         if 0: # DISABLED!!!
-            if int(w) % 8  == 0:
-               multiple = '1'
-            else:
-               multiple = '0'
-            s = 'xed_width_is_bytes[XED_OPERAND_WIDTH_%s][%d] = %s' % (
-                ri.name, i, multiple)
-            fo.add_code_eol(s)
+      widths_dict[ri.name] = ri
+   rows = []
+   for name in enum_order([ ri.name for ri in widths_list ]):
+      rows.append('/* %s */ { %s }' % (name,
+                                       ', '.join(widths_dict[name].widths)))
 
    # write the file in our customized way
    fp = xed_file_emitter_t(options.xeddir,
                            options.gendir,
                            'xed-init-width.c')
    fp.start()
-   fp.write(fo.emit())
+   fp.write('const xed_uint16_t ' +
+            'xed_width_bits[XED_OPERAND_WIDTH_LAST][4] = {\n')
+   fp.write(',\n'.join(rows))
+   fp.write('\n};\n')
    fp.close()
    return fp.full_file_name
 
@@ -6180,20 +6619,12 @@ def emit_pointer_name_lookup(options, widths_list):
    hfp.close()
 
 
-   fo = function_object_t('xed_init_pointer_names', 'void')
-   fo.add_code_eol("memset((void*)xed_pointer_name,0," +
-                   "sizeof(const char*)*XED_MAX_POINTER_NAMES)")
-   for bbytes, name, suffix in widths_list:
-      # add a trailing space to the name for formatting.
-      s = 'xed_pointer_name[%s] = \"%s \"' % (bbytes, name)
-      fo.add_code_eol(s)
-
-   fo.add_code_eol("memset((void*)xed_pointer_name_suffix,0,"+
-                   "sizeof(const char*)*XED_MAX_POINTER_NAMES)")
+   # trailing spaces on the names are for formatting.
+   names = ['0'] * max_width
+   suffixes = ['0'] * max_width
    for bbytes, name, suffix in widths_list:
-      # add a trailing space to the name for formatting.
-      s = 'xed_pointer_name_suffix[%s] = \"%s \"' % (bbytes, suffix)
-      fo.add_code_eol(s)
+      names[int(bbytes)] = '"%s "' % (name)
+      suffixes[int(bbytes)] = '"%s "' % (suffix)
 
    # write the file in our customized way
    fp = xed_file_emitter_t(options.xeddir,
@@ -6201,10 +6632,11 @@ def emit_pointer_name_lookup(options, widths_list):
                            'xed-init-pointer-names.c')
    fp.start()
    fp.write("#include \"xed-init-pointer-names.h\"\n")
-   fp.write("#include <string.h>\n") # for memset
-   fp.write("const char* xed_pointer_name[XED_MAX_POINTER_NAMES];\n")
-   fp.write("const char* xed_pointer_name_suffix[XED_MAX_POINTER_NAMES];\n")
-   fp.write(fo.emit())
+   for (var, values) in [ ('xed_pointer_name', names),
+                          ('xed_pointer_name_suffix', suffixes) ]:
+      fp.write("const char* const %s[XED_MAX_POINTER_NAMES] = {\n" % var)
+      fp.write(",\n".join(["/*%3d*/ %s" % (i,x) for i,x in enumerate(values)]))
+      fp.write("\n};\n")
    fp.close()
    return [fp.full_file_name, hfp.full_file_name]
 
@@ -6380,6 +6812,18 @@ def main():
        activate_debugger() # genutil
        
    set_verbosity_options(options.verbosity)
+   xedhash.set_vectorized(options.vectorized_hash)
+   weights = ild_phash.parse_cost_weights(options.ild_hash_weights)
+   ild_phash.set_selection(options.ild_hash_select, weights)
+   if options.memory_report:
+      enable_resource_usage([bit_info_t, bits_list_t, graph_node,
+                             partitionable_info_t, instruction_info_t,
+                             opnds.operand_info_t, ild.pattern_t,
+                             ild_info.ild_info_t])
+   if options.profile_report:
+      phaseprof.enable(options.profile_dump_dir)
+   elif options.profile_dump_dir:
+      die("--profile-dump-dir requires --profile-report")
    if options.xeddir == '':
       path_to_generator = sys.argv[0]
       (path_to_src, configure) = os.path.split(path_to_generator)
@@ -6387,43 +6831,51 @@ def main():
       msge("[ASSUMING PATH TO XED SRC] " + options.xeddir)
 
    agi = all_generator_info_t(options)
+   if options.layout_profile:
+      agi.layout_profile = read_layout_profile(options.layout_profile)
 
    if not os.path.exists(agi.common.options.gendir):
       die("Need a subdirectory called " + agi.common.options.gendir)
    
-   gen_operand_storage_fields(options,agi)
+   with phaseprof.phase('gen_operand_storage_fields'):
+      gen_operand_storage_fields(options,agi)
    
-   gen_regs(options,agi)
-
-   gen_widths(options,agi) # writes agi.widths_list and agi.widths_dict
-   gen_extra_widths(agi) # writes agi.extra_widths_nt and agi.exta_widths_reg
-   gen_element_types_base(agi) 
-   gen_element_types(agi) # write agi.xtypes dict, agi.xtypes
-   gen_pointer_names(options,agi)
+   with phaseprof.phase('gen_regs'):
+      gen_regs(options,agi)
+
+   with phaseprof.phase('gen_widths_and_types'):
+      gen_widths(options,agi) # writes agi.widths_list and agi.widths_dict
+      gen_extra_widths(agi) # writes agi.extra_widths_nt and agi.exta_widths_reg
+      gen_element_types_base(agi) 
+      gen_element_types(agi) # write agi.xtypes dict, agi.xtypes
+      gen_pointer_names(options,agi)
    
    
    # this reads the pattern input, builds a graph, emits the decoder
    # graph and the itable, emits the extractor functions, computes the
    # iforms, writes map using iforms, computes capture
    # functions, gathers and emits enums. (That part should move out).
-   gen_everything_else(agi)
+   with phaseprof.phase('gen_everything_else'):
+      gen_everything_else(agi)
    
    # emit functions to identify AVX and AVX512 instruction groups
-   classifier.work(agi) 
-   gen_ild(agi)
-   gen_cpuid_map(agi)
-   agi.close_output_files()
-   agi.dump_generated_files()
+   with phaseprof.phase('classifier'):
+      classifier.work(agi) 
+   with phaseprof.phase('gen_ild'):
+      gen_ild(agi)
+   with phaseprof.phase('gen_cpuid_map'):
+      gen_cpuid_map(agi)
+   with phaseprof.phase('write_output_files'):
+      agi.close_output_files()
+      agi.dump_generated_files()
+      write_emit_manifests() # codegen
+   strpool.report()
+   if options.profile_report:
+      phaseprof.write_report(options.profile_report)
 
 ################################################
 
 if __name__ == '__main__':
-   _profile = False
-   if _profile:
-      # profiling takes A REAL LONG TIME
-      import profile
-      profile.run('main()','profile.out')
-   else:
-      main()
-      sys.exit(0)
+   main()
+   sys.exit(0)
 #eof
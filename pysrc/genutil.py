@@ -27,6 +27,7 @@ import copy
 import re
 import stat
 import platform
+import gc
 
 psystem = platform.system()
 if (psystem == 'Microsoft' or
@@ -148,14 +149,51 @@ def get_memory_usage():
     except:
         return (0,0,0)
    
+def object_usage(classes):
+    """Return a list of (class name, number of objects, bytes) for the
+    classes in the classes list. The bytes are the sizes of the
+    objects and of their __dict__s, not of the attribute values."""
+    usage = {}
+    for c in classes:
+        usage[c] = [0, 0]
+    for obj in gc.get_objects():
+        u = usage.get(type(obj))
+        if u:
+            u[0] += 1
+            u[1] += sys.getsizeof(obj)
+            if not hasattr(type(obj), '__slots__'):
+                u[1] += sys.getsizeof(obj.__dict__)
+    return [ (c.__name__, usage[c][0], usage[c][1]) for c in classes ]
+
+# the classes print_resource_usage() reports on, None when disabled.
+_resource_usage_classes = None
+# checkpoints we already printed the object_usage() for
+_resource_usage_seen = set()
+def enable_resource_usage(classes):
+    """Turn on print_resource_usage(). The first time it is called for
+    each checkpoint, it also prints the object_usage() for the classes
+    in the classes list. Some checkpoints are in loops and scanning
+    all the objects is slow."""
+    global _resource_usage_classes
+    _resource_usage_classes = list(classes)
+
 def print_resource_usage(i=''):
-    # 2014-05-19: disabled for now.
-    return
+    # 2014-05-19: disabled unless enable_resource_usage() was called.
+    if _resource_usage_classes == None:
+        return
 
     x = resource_usage()
     s = format_resource_usage(x)
     mem = get_memory_usage()
-    msge('RUSAGE: %s %s vmsize: %s' % (str(i), str(s), str(mem[0])))
+    msge('RUSAGE: %s %s vmsize: %s vmrss: %s' % (str(i), str(s),
+                                                str(mem[0]), str(mem[1])))
+    if i in _resource_usage_seen:
+        return
+    _resource_usage_seen.add(i)
+    for (name, count, nbytes) in object_usage(_resource_usage_classes):
+        if count:
+            msge('RUSAGE: %s   %-22s %8d objects %10d bytes' % 
+                 (str(i), name, count, nbytes))
     
 
 
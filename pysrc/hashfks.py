@@ -57,6 +57,13 @@ class hash_fun_fks_t(xedhash.hash_fun_interface_t):
             expr = '((%d*%s %% %d) %% %d)' % (self.k, key_str, self.p, self.m)
         return expr
     
+    def op_counts(self):
+        if self.m == 1:
+            return {}
+        if self.p == self.m:
+            return {'mul':1, 'mod':1}
+        return {'mul':1, 'mod':2}
+
     def need_hash_index_validation(self):
         return True
     
@@ -118,11 +125,49 @@ def _get_l1_mlist(n):
         mlist = [n, 2*n] #just to try
     return mlist
 
+# Bound on the number of hash values computed at once by the
+# vectorized searches.
+_vector_chunk = 1<<20
+
+def _find_fks_vectorized(keys, mlist, first_ok, min_p=0):
+    """Evaluate the (k,p,m) candidates in the same order as the scalar
+    searches using numpy. first_ok(hash_vals, m) returns the index of
+    the first acceptable row. Primes smaller than min_p are skipped."""
+    numpy = xedhash.numpy
+    klist = numpy.arange(3, _max_k, dtype=numpy.int64)
+    plist = [ p for p in _primes if p >= min_p ]
+    max_chunk = max(1, _vector_chunk // (len(klist) * len(keys)))
+    for m in mlist:
+        # most searches succeed early so start with a few primes
+        i = 0
+        chunk = 4
+        while i < len(plist):
+            primes = numpy.array(plist[i:i+chunk], dtype=numpy.int64)
+            # (k*x mod p) == (k*(x mod p) mod p) keeps the products small
+            xmodp = keys[None,:] % primes[:,None]
+            hash_vals = (klist[None,:,None] * xmodp[:,None,:]) % \
+                        primes[:,None,None]
+            hash_vals %= numpy.minimum(primes, m)[:,None,None]
+            row = first_ok(hash_vals.reshape(-1, len(keys)), m)
+            if row is not None:
+                p = plist[i + row // len(klist)]
+                k = int(klist[row % len(klist)])
+                return hash_fun_fks_t(k,p,m)
+            i += chunk
+            chunk = min(2*chunk, max_chunk)
+    return None
+
 def find_fks_perfect(keylist):
     """Return a perfect hash function for a given key list. Or None if no
        perfect hash function could be found."""
     global _max_k
     mlist = _get_l1_mlist(len(keylist))
+    keys = xedhash.key_array(keylist)
+    if keys is not None:
+        # when p < n the table (of size min(p,m)) is too small to be perfect
+        return _find_fks_vectorized(keys, mlist,
+                                    lambda hv,m: xedhash.first_perfect(hv),
+                                    min_p=len(keylist))
     for m in mlist: # of buckets
         for p in _primes:
             for k in range(3, _max_k):
@@ -140,6 +185,12 @@ def find_fks_well_distributed(keylist):
     global _max_k
     global _l1_bucket_max
     mlist = _get_l1_mlist(len(keylist)) # number of buckets
+    keys = xedhash.key_array(keylist.values())
+    if keys is not None:
+        def first_ok(hash_vals, m):
+            return xedhash.first_well_distributed(hash_vals, m,
+                                                  _l1_bucket_max)
+        return _find_fks_vectorized(keys, mlist, first_ok)
     for m in mlist:
         for p in _primes:
             for k in range(3, _max_k):
@@ -40,6 +40,8 @@ class linear_func_t(xedhash.hash_fun_interface_t):
         return x - self.k
     def emit_cexpr(self, key_str='key'):
         return "%s - %d" % (key_str,self.k) 
+    def op_counts(self):
+        return {'add':1}
     def need_hash_index_validation(self):
         ''' the linear function does not need to do hash index validation since 
             it does not do hashing'''
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- python -*-
+#BEGIN_LEGAL
+#
+#Copyright (c) 2019 Intel Corporation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#END_LEGAL
+
+# Linear combination hash functions:
+#
+#   h(t) = (Sigma(Ai*Ti)) mod m
+#
+# where the Ti are the constraint values that tup2int.tuple2int
+# concatenates in to the key and the Ai are coefficients in [0,m).
+# For a prime m this family is universal (see the FIXME in
+# hashfks.py). Table sizes that are a power of 2 replace the modulo
+# with a mask.
+
+import math
+import xedhash
+
+class hash_fun_lincomb_t(xedhash.hash_fun_interface_t):
+    def __init__(self, coeffs, widths, m):
+        """coeffs and widths are lists with one element per key
+        component. widths are the bit widths used by tup2int.tuple2int."""
+        self.coeffs = coeffs
+        self.widths = widths
+        self.m = m
+        self.shifts = []
+        shift = 0
+        for w in widths:
+            self.shifts.append(shift)
+            shift += w
+        self.pow2 = (m & (m-1)) == 0
+
+    def kind(self):
+        return "lincomb"
+
+    def get_table_size(self):
+        return self.m
+
+    def apply(self, x):
+        return _combine(self.coeffs, _split_key(x, self.widths), self.m)
+
+    def _terms(self):
+        """Return a list of (coefficient, shift, mask) for the key
+        components with a nonzero coefficient. mask is None when the
+        component is in the top bits of the key."""
+        terms = []
+        last = len(self.widths) - 1
+        for i, a in enumerate(self.coeffs):
+            if a:
+                mask = None
+                if i != last:
+                    mask = (1 << self.widths[i]) - 1
+                terms.append((a, self.shifts[i], mask))
+        return terms
+
+    def op_counts(self):
+        if self.m == 1:
+            return {}
+        counts = {'mul':0, 'shift':0, 'add':0}
+        terms = self._terms()
+        for (a, shift, mask) in terms:
+            if a != 1:
+                counts['mul'] += 1
+            if shift:
+                counts['shift'] += 1
+            if mask is not None:
+                counts['add'] += 1 # the mask
+        counts['add'] += len(terms) - 1
+        if self.pow2:
+            counts['add'] += 1
+        else:
+            counts['mod'] = 1
+        return counts
+
+    def emit_cexpr(self, key_str='key'):
+        if self.m == 1:
+            return '(0)'
+        terms = []
+        for (a, shift, mask) in self._terms():
+            t = key_str
+            if shift:
+                t = '(%s >> %d)' % (t, shift)
+            if mask is not None:
+                t = '(%s & 0x%x)' % (t, mask)
+            if a != 1:
+                t = '%d*%s' % (a, t)
+            terms.append(t)
+        if not terms:
+            terms = ['0']
+        expr = '(%s)' % (' + '.join(terms))
+        if self.pow2:
+            return '(%s & %d)' % (expr, self.m - 1)
+        return '(%s %% %d)' % (expr, self.m)
+
+    def need_hash_index_validation(self):
+        return True
+
+    def add_key_validation(self, strings_dict):
+        key_str = strings_dict['key_str']
+        hentry_str ='%s[%s]' % (strings_dict['table_name'],
+                                strings_dict['hidx_str'])
+
+        return 'if(%s.key == %s)' % (hentry_str, key_str)
+
+    def __str__(self):
+        terms = ' + '.join([ '%d*T%d' % (a,i) for
+                             i,a in enumerate(self.coeffs) ])
+        return 'h(x) = (%s) mod %d' % (terms, self.m)
+
+
+def _split_key(x, widths):
+    """Inverse of tup2int.tuple2int"""
+    t = []
+    for w in widths:
+        t.append(x & ((1 << w) - 1))
+        x >>= w
+    if x:
+        t[-1] += x << widths[-1]
+    return t
+
+def _combine(coeffs, t, m):
+    s = 0
+    for a, v in zip(coeffs, t):
+        s += a*v
+    return s % m
+
+# number of coefficient vectors tried for each table size
+_tries_per_size = 256
+
+# Do not search for key sets larger than this. The largest constraint
+# dictionaries (thousands of keys) get 2-level hash tables anyway and
+# the search for them is slow and does not succeed.
+_max_keys = 1024
+
+_vectors_cache = {}
+def _coefficient_vectors(ncomp, m):
+    """A deterministic list of pseudo random coefficient vectors with
+    values in [0,m). The first one just sums the components."""
+    if (ncomp, m) in _vectors_cache:
+        return _vectors_cache[(ncomp, m)]
+    vectors = [ [1]*ncomp ]
+    state = m
+    for i in range(_tries_per_size - 1):
+        v = []
+        for j in range(ncomp):
+            state = (state * 6364136223846793005 +
+                     1442695040888963407) & 0xFFFFFFFFFFFFFFFF
+            v.append((state >> 33) % m)
+        vectors.append(v)
+    _vectors_cache[(ncomp, m)] = vectors
+    return vectors
+
+def _get_table_sizes(n):
+    """Table sizes n, n*1.1, ... n*2 and the power of 2 in that range"""
+    sizes = set([ int(math.ceil((1 + x/10.0)*n)) for x in range(0,11)])
+    sizes.add(1 << (n-1).bit_length())
+    return sorted(sizes)
+
+def find_perfect(keylist, widths):
+    """Return a perfect linear combination hash function for the keys
+    in keylist, split in to components of the given bit widths. Or None
+    if no perfect hash function could be found."""
+    n = len(keylist)
+    if n == 0 or n > _max_keys or not widths:
+        return None
+    if n == 1:
+        return hash_fun_lincomb_t([0]*len(widths), widths, 1)
+    comps = [ _split_key(x, widths) for x in keylist ]
+    keys = xedhash.key_array(keylist)
+    if keys is not None:
+        numpy = xedhash.numpy
+        comp_array = numpy.array(comps, dtype=numpy.int64)
+    for m in _get_table_sizes(n):
+        vectors = _coefficient_vectors(len(widths), m)
+        if keys is not None:
+            coeffs = numpy.array(vectors, dtype=numpy.int64)
+            hash_vals = numpy.dot(coeffs, comp_array.T) % m
+            i = xedhash.first_perfect(hash_vals)
+            if i is not None:
+                return hash_fun_lincomb_t(vectors[i], widths, m)
+            continue
+        for coeffs in vectors:
+            if _is_perfect(coeffs, comps, m):
+                return hash_fun_lincomb_t(coeffs, widths, m)
+    return None
+
+def _is_perfect(coeffs, comps, m):
+    """Like xedhash.is_perfect but on the already split keys"""
+    seen = set()
+    for t in comps:
+        h = _combine(coeffs, t, m)
+        if h in seen:
+            return False
+        seen.add(h)
+    return True
@@ -84,6 +84,11 @@ class hashmul_t(xedhash.hash_fun_interface_t):
         # no collisions in the output of the hash: perfect
         return True
 
+    def op_counts(self):
+        if self.pow2:
+            return {'mul':1, 'shift':1}
+        return {'mul':2}
+
     def need_hash_index_validation(self):
         """Need to validate that we landed on live bucket"""
         return True
@@ -120,6 +125,17 @@ class hashmul_t(xedhash.hash_fun_interface_t):
 
         return c_hash_expr
 
+def vector_apply(keys, table_sizes):
+    """numpy version of hashmul_t.apply for the numpy key array keys.
+    Returns one row of hash values for each table size."""
+    numpy = xedhash.numpy
+    recip = numpy.uint64(hashmul_t(1).golden_ratio_recip2to32)
+    # the uint64 product wraps but the low 32b are exact
+    fraction = (keys.astype(numpy.uint64) * recip) & numpy.uint64(0xFFFFFFFF)
+    sizes = numpy.array(table_sizes, dtype=numpy.uint64)
+    v = (fraction[None,:] * sizes[:,None]) >> numpy.uint64(32)
+    return v.astype(numpy.int64)
+
 def find_perfect(keylist):
     n = len(keylist)
     for m in range(n,2*n):
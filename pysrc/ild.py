@@ -35,9 +35,11 @@ import collections
 import shutil
 import ild_codegen
 import ild_cdict
+import ild_phash
 import xed3_nt
 import actions
 import verbosity
+import phaseprof
 
 
 op_bin_pattern = re.compile(r'[_10]{2,}$')
@@ -142,6 +144,10 @@ def gen_xed3(agi, ild_info, is_3dnow, ild_patterns,
         
         constraints_log_file = mbuild.join(ild_gendir,
                                            'all_constraints_vv%s.txt' %vv)
+        hash_report_file = None
+        if ild_phash.get_selection() == 'cost':
+            hash_report_file = mbuild.join(ild_gendir,
+                                           'ild_hash_select_vv%s.txt' % vv)
 
         #now generate the C hash functions for the constraint
         #dictionaries.
@@ -156,7 +162,8 @@ def gen_xed3(agi, ild_info, is_3dnow, ild_patterns,
             is_3dnow,
             constraints_log_file,
             ptrn_dict, 
-            vv)
+            vv,
+            hash_report_file)
         #hold only one instance of each function
         for op in operands_lu_list :
             if op.function_name not in op_lu_map:
@@ -238,8 +245,10 @@ def work(agi):
 
     #generate a list of pattern_t objects that describes the ISA.
     #This is the main data structure for XED3
-    ild_patterns = get_patterns(agi, is_3dnow, eosz_nts, easz_nts, imm_nts,
-                                disp_nts, brdisp_nts, all_state_space)
+    with phaseprof.phase('ild.get_patterns'):
+        ild_patterns = get_patterns(agi, is_3dnow, eosz_nts, easz_nts,
+                                    imm_nts, disp_nts, brdisp_nts,
+                                    all_state_space)
 
     if ild_patterns:
         if agi.common.options.gen_ild_storage:
@@ -255,6 +264,7 @@ def work(agi):
         #defined in ild_storage_data.py file, ILD will have information
         #about illegal map-opcodes too.
         united_lookup = _get_united_lookup(ild_patterns,is_3dnow)
+        genutil.print_resource_usage('ild.1')
 
         #generate modrm lookup tables
         ild_modrm.work(agi, united_lookup, debug)
@@ -290,8 +300,10 @@ def work(agi):
         getters_dict =  agi.common.ild_getters_dict
         dump_header_with_header(agi, 'xed-ild-getters.h', getters_dict)
         
-        gen_xed3(agi, ild_info, is_3dnow, ild_patterns, 
-                 all_state_space, ild_gendir, all_ops_widths)
+        with phaseprof.phase('ild.gen_xed3'):
+            gen_xed3(agi, ild_info, is_3dnow, ild_patterns, 
+                     all_state_space, ild_gendir, all_ops_widths)
+        genutil.print_resource_usage('ild.2')
 
 def dump_header_with_header(agi, fname, header_dict):
     """ emit the header fname.
@@ -464,6 +476,13 @@ def dump_patterns(patterns, fname):
 #Maybe pattern_t should inherit from instruction_info_t
 #Let it inherit from object for now.
 class pattern_t(object):
+    # index is set by the ILD hash table generation
+    __slots__ = ('ptrn', 'ptrn_wrds', 'iclass', 'legal', 'category',
+                 'mode', 'insn_map', 'opcode', 'space', 'has_modrm',
+                 'imm_nt_seq', 'disp_nt_seq', 'eosz_nt_seq',
+                 'easz_nt_seq', 'ext_opcode', 'incomplete_opcode',
+                 'missing_bits', 'constraints', 'special_constraints',
+                 'actions', 'amd3dnow_build', 'ii', 'index')
 
     # keys will be in a special order which is why we build it
     # from a list.
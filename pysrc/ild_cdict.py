@@ -464,8 +464,10 @@ def _get_united_cdict(ptrn_list, state_space, vexvalid, all_ops_widths):
     #combinations (MOD=1 REG=0), (MOD=1, REG=1) ,..., (MOD=1, REG=7)
     #and for PATTERN2 we will have (MOD=0 REG=2), (MOD=1 REG=2), ...
     cdicts = []
+    key_widths = get_key_widths(cnames, state_space, all_ops_widths)
     for ptrn in ptrns:
-        cdict = constraint_dict_t(cnames, ptrn.constraints, state_space, ptrn)
+        cdict = constraint_dict_t(cnames, ptrn.constraints, state_space, ptrn,
+                                  all_ops_widths, key_widths)
         cdicts.append(cdict)
     insn_map = ptrns[0].insn_map
     opcode = ptrns[0].opcode
@@ -477,8 +479,8 @@ def _get_united_cdict(ptrn_list, state_space, vexvalid, all_ops_widths):
     # constraints. All patterns now have same constraints.
     united_dict = constraint_dict_t.unite_dicts(cdicts, msg, cnames)
     
-    #generate the int value for each tuple
-    united_dict.create_tuple2int(all_ops_widths)
+    #generate the tuples for each int value
+    united_dict.create_tuple2int()
 
     #print "UNITED DICT: VV {} OPCODE {} MAP {}:  tuples {}".format(
     #    vexvalid, opcode, insn_map, len(united_dict.tuple2rule) )
@@ -496,16 +498,34 @@ def _get_united_cdict(ptrn_list, state_space, vexvalid, all_ops_widths):
 
 #FIXME: maybe it should contain tuple2int function?
 #Now tuple2int is a part of phash object.
+def get_key_widths(cnames, all_state_space, op_widths):
+    """Return the list of bit widths of the constraints (in sorted
+    cnames order) in the packed keys of constraint_dict_t: the operand
+    width, widened if some legal value does not fit in it."""
+    widths = []
+    for name in sorted(cnames):
+        width = op_widths.get(name, 0)
+        if all_state_space.get(name):
+            maxval = max(all_state_space[name].keys())
+            width = max(width, maxval.bit_length())
+        widths.append(max(width, 1))
+    return widths
+
 class constraint_dict_t(object):
     def __init__(self, cnames=None, state_space=None, all_state_space=None,
-                 rule=None):
+                 rule=None, op_widths=None, key_widths=None):
          """cnames is sorted list of constraint names.
         
            state_space is the constraints from the pattern_t.
 
            all_state_space is a dict w/legal values for all constraints in grammar.
 
-           rule is the ild.py pattern_t object (essentially the instruction). """
+           rule is the ild.py pattern_t object (essentially the instruction).
+
+           op_widths is a dict of all operands -> bit width.
+
+           key_widths is the list of the bit widths of the constraints in
+           the packed keys, see get_key_widths(). Computed if not given. """
          #cnames is sorted list of strings - constraints' names that we want
          #this cdict to have.
          if cnames:
@@ -542,20 +562,38 @@ class constraint_dict_t(object):
          # this is the ild.py:pattern_t
          self.rule = rule
          
+         #dict of all operands -> bit width.
+         if op_widths:
+             self.op_widths = op_widths
+         else:
+             self.op_widths = {}
+
+         #The constraint value tuples are packed in to integer keys,
+         #with key_widths bits for each constraint. A single pattern
+         #cdict holds the list of keys for all the combinations of its
+         #constraint values. unite_dicts() makes a key2rule dict. The
+         #tuple dicts below are only created, by create_tuple2int(),
+         #for the final united cdicts.
+         if key_widths:
+             self.key_widths = key_widths
+         else:
+             self.key_widths = get_key_widths(self.cnames,
+                                              self.all_state_space,
+                                              self.op_widths)
+         self.keys = []
+         self.key2rule = None
+         if self.state_space:
+             self.keys = self._initialize_keys()
+
          #tuple2int maps the same tuples as tuple2int to hash key values.
          self.tuple2int = {}
          
          #reverse mapping from hash key to list of constraint value tuples.
          self.int2tuple = {}
          
-         #dict of all operands -> bit width.
-         self.op_widths = {}
-         
          #dict mapping tuples to rules. 
          #tuples are the constraint values (without the constraint names).
          self.tuple2rule = {}
-         if self.state_space:
-             self.tuple2rule = self._initialize_tuple2rule(self.cnames, {})
 
     @staticmethod
     def unite_dicts(dict_list, err_msg, cnstr_names):
@@ -573,77 +611,100 @@ class constraint_dict_t(object):
         if dlen == 1:
             return dict_list[0]
         
-        res = constraint_dict_t(cnames=cnstr_names)
+        res = constraint_dict_t(cnames=cnstr_names,
+                                op_widths=dict_list[0].op_widths)
+        res.key_widths = dict_list[0].key_widths
+        key2rule = {}
         for cdict in dict_list:
-            for key in list(cdict.tuple2rule.keys()):
-                if key in res.tuple2rule:  # keys are tuples of constraint values
+            for key in cdict.keys:
+                if key in key2rule:  # keys are packed constraint values
                     msg = []
-                    msg.append("key: %s" % (key,))
-                    msg.append("cdict:%s" % cdict)
-                    msg.append("res:%s" % res)
+                    msg.append("key: %s" % (res._key2tuple(key),))
+                    msg.append("rule:%s" % cdict.rule)
+                    msg.append("conflicting rule:%s" % key2rule[key])
                     msg = "\n".join(msg)
                     ildutil.ild_err(err_msg + msg)
                     return None
                 else:
-                    res.tuple2rule[key] = cdict.tuple2rule[key]
-                    
+                    key2rule[key] = cdict.rule
+        res.key2rule = key2rule
         return res
 
 
-    def _initialize_tuple2rule(self, cnames, tuple2rule): # recursive
-        """look @ first cnames, get the possible values for it.  Add an entry
-        to the current tuple2rule dictionary with each possible value
-        and the current rule (which is the ild.py pattern_t, pointed
-        to by the set of constraints.).  Each time we recursively
-        call, we take the next constraint and add its values to the
-        key tuple for the dictionary.
-
-        """
-        if len(cnames) == 0:
-            # when we are out of constraints, we return the fully
-            # constructed tuple.
-            return tuple2rule
-        # pick off the cnames one at a time
-        name = cnames[0]
-        if name in self.state_space:
-            vals = sorted(self.state_space[name].keys())
-        else:
-            vals = sorted(self.all_state_space[name].keys())
-        if len(tuple2rule) == 0:
-            #initialize tuple2rule with singleton tuples
-            for val in vals:
-                tuple2rule[(val,)] = self.rule
-            return self._initialize_tuple2rule(cnames[1:], tuple2rule)
-
-        new_tuple2rule = {}
-        for key_tuple in list(tuple2rule.keys()):
-            for val in vals:
-                new_key = key_tuple + (val,)
-                new_tuple2rule[new_key] = self.rule
-        return self._initialize_tuple2rule(cnames[1:], new_tuple2rule)
+    def _initialize_keys(self):
+        """Return the list of packed integer keys for all the
+        combinations of the legal values of the constraints. The
+        combinations are enumerated with the first constraint varying
+        slowest."""
+        if len(self.cnames) == 0:
+            return []
+        keys = [0]
+        bit_shift = 0
+        for name, width in zip(self.cnames, self.key_widths):
+            if name in self.state_space:
+                vals = sorted(self.state_space[name].keys())
+            else:
+                vals = sorted(self.all_state_space[name].keys())
+            if vals and (vals[0] < 0 or vals[-1] >> width):
+                genutil.die("constraint %s values %s do not fit in %d bits" %
+                            (name, vals, width))
+            vals = [ v << bit_shift for v in vals ]
+            keys = [ k | v for k in keys for v in vals ]
+            bit_shift += width
+        return keys
+
+    def _get_key_fields(self):
+        """List of (shift, mask) for the constraints in the packed keys"""
+        fields = []
+        bit_shift = 0
+        for width in self.key_widths:
+            fields.append((bit_shift, (1 << width) - 1))
+            bit_shift += width
+        return fields
+
+    def _key2tuple(self, key, fields=None):
+        """Unpack a key in to the tuple of constraint values"""
+        if fields is None:
+            fields = self._get_key_fields()
+        return tuple([ (key >> s) & m for (s,m) in fields ])
 
     def get_all_keys_by_val(self, val):
         return [k for k,v in self.tuple2rule.items() if v == val]
     
-    def create_tuple2int(self, all_ops_widths):
-        '''create the mapping of tuple to its int value by CONCATENTATING all
-        the input constraint values to make an integer that is
-        ultimately the input to the hash function. '''
+    def create_tuple2int(self):
+        '''create the tuple2rule dict from the packed keys and the mapping
+        of tuple to its int value by CONCATENTATING all the input
+        constraint values to make an integer that is ultimately the
+        input to the hash function. '''
+        tuple2rule = {}
         tuple2int = {}
         int2tuple = {}
-        for t in self.tuple2rule.keys():
-            res = tup2int.tuple2int(t, self.cnames, all_ops_widths)
+        if self.key2rule is None:
+            items = [ (key, self.rule) for key in self.keys ]
+        else:
+            items = self.key2rule.items()
+        fields = self._get_key_fields()
+        # when no constraint was widened the key is the tuple2int value
+        same_widths = self.key_widths == [ self.op_widths.get(x)
+                                           for x in self.cnames ]
+        for key, rule in items:
+            t = self._key2tuple(key, fields)
+            tuple2rule[t] = rule
+            if same_widths:
+                res = key
+            else:
+                res = tup2int.tuple2int(t, self.cnames, self.op_widths)
             if res in int2tuple:
-                err = "the tuple % and the tuple %s generate the same value:%d"
+                err = "the tuple %s and the tuple %s generate the same value:%d"
                 genutil.die(err % (t,str(int2tuple[res]),res))    
             else:
                 tuple2int[t] = res
                 int2tuple[res] = t
-        
-        #later using the op_widths for the code generation             
-        self.op_widths = all_ops_widths
+        self.tuple2rule = tuple2rule
         self.tuple2int = tuple2int
-        self.int2tuple = int2tuple    
+        self.int2tuple = int2tuple
+        self.keys = []
+        self.key2rule = None
     
     def get_ptrn(self, tup):
         ''' return the pattern that represents the given tuple '''
@@ -735,8 +796,44 @@ def get_constraints_lu_table(ptrns_by_map_opcode, is_amd, state_space,
                 cnames = cnames.union(set(cdict.cnames))
     return cdict_by_map_opcode,cnames
 
+def _add_report_totals(totals, cdict, phash):
+    """Accumulate the table bytes and expression operations of the
+    selected 1-level hash functions"""
+    if phash.hash_f.kind() == 'trivial' or isinstance(phash,
+                                                       ild_phash.l2_phash_t):
+        totals['hashes (trivial or 2-level)'] += 1
+        return
+    totals['hashes (%s)' % phash.hash_f.kind()] += 1
+    (cost, table_bytes) = ild_phash.hash_cost(cdict, phash.hash_f)
+    totals['table bytes'] += table_bytes
+    for op, n in phash.hash_f.op_counts().items():
+        totals['op %s' % op] += n
+
+    # compare the hash function families: how often each one finds a
+    # perfect hash and the size of its smallest table.
+    smallest = {}
+    for (hash_f, cost, table_bytes) in phash.candidates:
+        kind = hash_f.kind()
+        size = hash_f.get_table_size()
+        if kind not in smallest or size < smallest[kind]:
+            smallest[kind] = size
+    for kind, size in smallest.items():
+        totals['family %s found' % kind] += 1
+        totals['family %s table entries' % kind] += size
+
+def _write_hash_report(report_fn, report, totals):
+    f = open(report_fn, 'w')
+    f.write('# Hash function candidates per map-opcode. ' +
+            'The selected one is marked with a *\n')
+    for line in report:
+        f.write(line + '\n')
+    f.write('\n# Totals for the selected hash functions\n')
+    for key in sorted(totals.keys()):
+        f.write('%s: %s\n' % (key, totals[key]))
+    f.close()
+
 def gen_ph_fos(agi, cdict_by_map_opcode, is_amd, log_fn,
-               ptrn_dict, vv):
+               ptrn_dict, vv, report_fn=None):
     """
     Returns a tuple (phash_lu_table, phash_fo_list, op_lu_list)
     * phash_lu_table:  is a traditional 2D dict by map, opcode to a
@@ -746,10 +843,13 @@ def gen_ph_fos(agi, cdict_by_map_opcode, is_amd, log_fn,
       2-level hash functions).
     * op_lu_list:  is a list for all the operands lookup functions
 
-    Also writes log file for debugging.
+    Also writes log file for debugging and, if report_fn is given, a
+    report of the hash function candidates for each map-opcode.
     """
     maps = ild_info.get_maps(is_amd)
     log_f = open(log_fn, 'w')
+    report = []
+    report_totals = collections.defaultdict(int)
     cnames = set() # only for logging
     stats = {
              '0. #map-opcodes': 0,
@@ -800,6 +900,11 @@ def gen_ph_fos(agi, cdict_by_map_opcode, is_amd, log_fn,
                     phlu_fn = lu_fo_list[-1]
                     phash_lu[insn_map][opcode] = phlu_fn.function_name
                     phash.update_stats(stats)
+                    if report_fn:
+                        report.append('MAP:%s OPCODE:%s keys=%d' % (
+                            insn_map, opcode, len(cdict.tuple2int)))
+                        report.extend(ild_phash.selection_report(phash))
+                        _add_report_totals(report_totals, cdict, phash)
                 else:
                     _log(log_f,'---NOPHASH-----\n')
                     msg = "Failed to gen phash for map %s opcode %s"
@@ -810,5 +915,7 @@ def gen_ph_fos(agi, cdict_by_map_opcode, is_amd, log_fn,
     for key in sorted(stats.keys()):
         _log(log_f,"%s %s\n" % (key,stats[key]))
     log_f.close()
+    if report_fn:
+        _write_hash_report(report_fn, report, report_totals)
     return phash_lu,lu_fo_list,list(op_lu_map.values())
 
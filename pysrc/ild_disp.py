@@ -88,7 +88,7 @@ def get_all_disp_seq(united_lookup):
         all_seq.add(tuple(info.disp_nt_seq))
     #convert back to lists, in order not to surprise user
     return_list = []
-    for nt_tuple in all_seq:
+    for nt_tuple in sorted(all_seq):
         return_list.append(list(nt_tuple))
     return return_list
 
@@ -314,7 +314,7 @@ def _gen_l3_array_dict(agi, nt_names, target_op):
     return a dictionary from nt_name to array_t.
     """
     nt_dict = {}
-    for nt_name in nt_names:
+    for nt_name in sorted(nt_names):
         array = ild_nt.gen_nt_lookup(agi, nt_name, target_op, 
                         target_type=ildutil.ild_c_op_type, level='l3')
         nt_dict[nt_name] = array
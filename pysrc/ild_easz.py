@@ -124,7 +124,7 @@ def get_all_easz_seq(united_lookup):
         all_seq.add(tuple(info.easz_nt_seq))
     #convert back to lists, in order not to surprise user
     return_list = []
-    for nt_tuple in all_seq:
+    for nt_tuple in sorted(all_seq):
         return_list.append(list(nt_tuple))
     return return_list
 
@@ -147,7 +147,7 @@ def work(agi, united_lookup, easz_nts, ild_gendir, debug):
     #dump lookup tables for each NT
     #just for debugging
     nt_arrays = []
-    for nt_name in easz_nts:
+    for nt_name in sorted(easz_nts):
         array = ild_nt.gen_nt_lookup(agi, nt_name, 'EASZ')
         if not array:
             return
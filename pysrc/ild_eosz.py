@@ -161,7 +161,7 @@ def get_all_eosz_seq(united_lookup):
         all_seq.add(tuple(info.eosz_nt_seq))
     #convert back to lists, in order not to surprise user
     return_list = []
-    for nt_tuple in all_seq:
+    for nt_tuple in sorted(all_seq):
         return_list.append(list(nt_tuple))
     return return_list
 
@@ -185,7 +185,7 @@ def work(agi, united_lookup, eosz_nts, ild_gendir, debug):
     #dump lookup tables for each NT
     #just for debugging
     nt_arrays = []
-    for nt_name in eosz_nts:
+    for nt_name in sorted(eosz_nts):
         array = ild_nt.gen_nt_lookup(agi, nt_name, 'EOSZ')
         if not array:
             return None
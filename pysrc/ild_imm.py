@@ -88,7 +88,7 @@ def get_all_imm_seq(united_lookup):
         all_seq.add(tuple(info.imm_nt_seq))
     #convert back to lists, in order not to surprise user
     return_list = []
-    for nt_tuple in all_seq:
+    for nt_tuple in sorted(all_seq):
         return_list.append(list(nt_tuple))
     return return_list
 
@@ -317,7 +317,7 @@ def work(agi, united_lookup, imm_nts, ild_gendir, eosz_dict,
     
     #UIMM8_1 doesn't bind IMM_WIDTH operand, it is a special case
     #there is nothing to generate for it. 
-    for nt_name in _filter_uimm1_nt(imm_nts):
+    for nt_name in sorted(_filter_uimm1_nt(imm_nts)):
         array = ild_nt.gen_nt_lookup(agi, nt_name, _imm_token, 
                                      target_type=ildutil.ild_c_op_type,
                                      level='l3')
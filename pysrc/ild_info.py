@@ -44,6 +44,10 @@ storage_priority = 10
                 
 
 class ild_info_t(object):
+    __slots__ = ('insn_map', 'opcode', 'incomplete_opcode', 'missing_bits',
+                 'has_modrm', 'eosz_nt_seq', 'easz_nt_seq', 'imm_nt_seq',
+                 'disp_nt_seq', 'ext_opcode', 'mode', 'priority')
+
     def __init__(self, insn_map=None, opcode=None, incomplete_opcode=None,
                 missing_bits=None, has_modrm=None, eosz_nt_seq=None,
                 easz_nt_seq=None,
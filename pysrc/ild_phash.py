@@ -16,6 +16,7 @@
 #  
 #END_LEGAL
 import math
+import hashlib
 import genutil
 import ildutil
 import collections
@@ -23,7 +24,9 @@ import codegen
 import hashmul
 import hashfks
 import hashlin
+import hashlincomb
 import xedhash
+import gencache
 # phash means "perfect hash".
 
 _l1_bucket_max = 8  # FIXME: also in hashfks.py
@@ -42,6 +45,9 @@ class phash_t(object):
         self.hash_f = hash_f
         self.x2hx = {}
         self.hx2x = {}
+        # (hash_f, cost, table_bytes) for each candidate considered
+        # by the cost based selection
+        self.candidates = []
 
     def is_minimal(self):
         return self.hash_f.get_table_size() == len(self.cdict.tuple2rule)
@@ -490,6 +496,8 @@ class trivial_hash_func_t(xedhash.hash_fun_interface_t):
         return 0 # not used
     def emit_cexpr(self, key_str='key'):
         return '0' # not used
+    def op_counts(self):
+        return {}
     
     def need_hash_index_validation(self):
         return False
@@ -520,8 +528,88 @@ def _get_linear_hash_function(cdict):
     
 
 
+# Persistent cache of the hash function searches. Maps a digest of
+# the kind of search and its key set to the hash function that the
+# search found, or None. The searches are deterministic functions of
+# the key set so the cached results are the same as searching again.
+# Enabled by load_search_cache().
+_search_cache = None
+_search_cache_used = {}
+_search_cache_stats = collections.defaultdict(int)
+
+def _search_cache_file_key():
+    # the digest covers the generator sources, and thus the searches
+    return gencache.digest([], ['ild-hash-search'])
+
+def load_search_cache(cache_dir):
+    global _search_cache
+    cached = gencache.load(cache_dir, 'ildhash', _search_cache_file_key())
+    if cached is None:
+        cached = {}
+    _search_cache = cached
+
+def store_search_cache(cache_dir):
+    """Store the search results used by this run. Entries that were
+    not used are dropped."""
+    if _search_cache is None:
+        return
+    genutil.msgb("ILD HASH SEARCH CACHE", "%d hits, %d misses" % (
+        _search_cache_stats['hit'], _search_cache_stats['miss']))
+    if _search_cache_stats['miss'] or \
+       len(_search_cache_used) != len(_search_cache):
+        gencache.store(cache_dir, 'ildhash', _search_cache_file_key(),
+                       _search_cache_used)
+
+def _cached_search(kind, keys, search, check, extra=()):
+    """Return search(), reusing the result of an earlier search of the
+    same kind for the same keys if the cache is enabled. check(hash_f)
+    validates cached hash functions."""
+    if _search_cache is None:
+        return search()
+    s = repr((kind, sorted(keys), extra))
+    digest = hashlib.sha1(s.encode('utf-8')).hexdigest()
+    if digest in _search_cache:
+        hash_f = _search_cache[digest]
+        if hash_f is None or check(hash_f):
+            _search_cache_stats['hit'] += 1
+            _search_cache_used[digest] = hash_f
+            return hash_f
+    _search_cache_stats['miss'] += 1
+    hash_f = search()
+    _search_cache[digest] = hash_f
+    _search_cache_used[digest] = hash_f
+    return hash_f
+
+def _is_perfect_check(keys):
+    return lambda hash_f: xedhash.is_perfect(keys, hash_f)
+
+def _well_distributed_check(cdict):
+    return lambda hash_f: xedhash.is_well_distributed(cdict.tuple2int, hash_f,
+                                                      _l1_bucket_max)
+
+def _find_fks_hash(cdict):
+    keys = list(cdict.tuple2int.values())
+    return _cached_search('fks', keys,
+                          lambda: hashfks.find_fks_perfect(keys),
+                          _is_perfect_check(keys))
+
 def _find_l1_phash_fks(cdict):
-    hashfn =  hashfks.find_fks_perfect(list(cdict.tuple2int.values()))
+    hashfn = _find_fks_hash(cdict)
+    if hashfn:
+        return l1_phash_t(cdict, hashfn)
+    return None
+
+
+def _find_lincomb_hash(cdict):
+    keys = list(cdict.tuple2int.values())
+    widths = [ cdict.op_widths[cname] for cname in cdict.cnames ]
+    return _cached_search('lincomb', keys,
+                          lambda: hashlincomb.find_perfect(keys, widths),
+                          _is_perfect_check(keys),
+                          extra=tuple(widths))
+
+def _find_l1_phash_lincomb(cdict):
+    hashfn = _find_lincomb_hash(cdict)
     if hashfn:
         return l1_phash_t(cdict, hashfn)
     return None
@@ -541,22 +629,51 @@ def _find_candidate_lengths_mul(lst):
             s.add(a)
     return sorted(list(s))
 
-def _find_l1_phash_mul(cdict):
+def _search_l1_hash_mul(cdict):
     candidate_lengths = _find_candidate_lengths_mul(cdict.tuple2int)
+    keys = xedhash.key_array(cdict.tuple2int.values())
+    if keys is not None and candidate_lengths:
+        i = xedhash.first_perfect(hashmul.vector_apply(keys,
+                                                       candidate_lengths))
+        if i is None:
+            return None
+        return hashmul.hashmul_t(candidate_lengths[i])
     for p in candidate_lengths:
         hash_f = hashmul.hashmul_t(p)
         if hash_f.is_perfect(iter(cdict.tuple2int.values())):
-            return l1_phash_t(cdict, hash_f)
+            return hash_f
         del hash_f
     return None
+
+def _find_l1_phash_mul(cdict):
+    keys = list(cdict.tuple2int.values())
+    hash_f = _cached_search('mul', keys,
+                            lambda: _search_l1_hash_mul(cdict),
+                            _is_perfect_check(keys))
+    if hash_f:
+        return l1_phash_t(cdict, hash_f)
+    return None
     
 
 
 def _find_l2_hash_mul(cdict):
     """Similar to the _find_l1_phash_mul, but not looking for perfection, just
     well distributed stuff"""
+    return _cached_search('mul-l2', list(cdict.tuple2int.values()),
+                          lambda: _search_l2_hash_mul(cdict),
+                          _well_distributed_check(cdict))
+
+def _search_l2_hash_mul(cdict):
     global _l1_bucket_max
     candidate_lengths = _find_candidate_lengths_mul(cdict.tuple2int)
+    keys = xedhash.key_array(cdict.tuple2int.values())
+    if keys is not None and candidate_lengths:
+        i = xedhash.first_well_distributed(
+            hashmul.vector_apply(keys, candidate_lengths),
+            max(candidate_lengths), _l1_bucket_max)
+        if i is None:
+            return None
+        return hashmul.hashmul_t(candidate_lengths[i])
     for p in candidate_lengths:
         hash_f = hashmul.hashmul_t(p)
         if xedhash.is_well_distributed(cdict.tuple2int, hash_f, _l1_bucket_max):
@@ -576,7 +693,9 @@ def _find_l2_phash(cdict):
 
     # otherwise try a FKS for the first level of the 2 level hash
     # function.
-    hash_f = hashfks.find_fks_well_distributed(cdict.tuple2int)
+    hash_f = _cached_search('fks-l2', list(cdict.tuple2int.values()),
+                    lambda: hashfks.find_fks_well_distributed(cdict.tuple2int),
+                    _well_distributed_check(cdict))
     if hash_f:
         return l2_phash_t(cdict, hash_f)
 
@@ -584,6 +703,152 @@ def _find_l2_phash(cdict):
     return None
 
 
+# Hash function selection. In 'first' mode gen_hash uses the first hash
+# function that works, in the order: trivial, linear, hashmul, FKS,
+# linear combination, 2-level. In 'cost' mode it builds all the viable 1-level hash
+# functions and uses the one with the lowest weighted cost of table
+# bytes, operations in the hash expression and key validation.
+_selection = 'first'
+_default_cost_weights = { 'byte':0.25, 'mul':3, 'mod':20, 'shift':1,
+                          'add':1, 'validate':2 }
+_cost_weights = dict(_default_cost_weights)
+
+def set_selection(mode, weights=None):
+    global _selection
+    global _cost_weights
+    if mode not in ['first', 'cost']:
+        genutil.die("Unknown hash function selection mode: %s" % mode)
+    _selection = mode
+    _cost_weights = dict(_default_cost_weights)
+    if weights:
+        _cost_weights.update(weights)
+
+def get_selection():
+    return _selection
+
+def parse_cost_weights(s):
+    """Parse a comma separated list of name=value hash cost weights"""
+    weights = {}
+    for nv in s.split(','):
+        nv = nv.strip()
+        if not nv:
+            continue
+        try:
+            (name, value) = nv.split('=')
+            value = float(value)
+        except ValueError:
+            genutil.die("Bad hash cost weight: %s" % nv)
+        if name not in _default_cost_weights:
+            genutil.die("Unknown hash cost weight: %s. Expected one of: %s" %
+                        (name, ', '.join(sorted(_default_cost_weights))))
+        weights[name] = value
+    return weights
+
+_ctype_bytes = { 'xed_int8_t':1,  'xed_uint8_t':1,
+                 'xed_int16_t':2, 'xed_uint16_t':2,
+                 'xed_int32_t':4, 'xed_uint32_t':4,
+                 'xed_int64_t':8, 'xed_uint64_t':8 }
+
+def _lu_entry_bytes(cdict, need_validation):
+    """Estimated size of one lookup table entry including padding.
+    Types that are not listed in _ctype_bytes are function pointers."""
+    sizes = []
+    if need_validation:
+        sizes.append(4)
+    for field in cdict.action_codegen.get_actions_desc().split(';'):
+        field = field.strip()
+        if field:
+            sizes.append(_ctype_bytes.get(field.split()[0], 8))
+    if not sizes:
+        return 0
+    offset = 0
+    for size in sizes:
+        offset = (offset + size - 1) // size * size + size
+    align = max(sizes)
+    return (offset + align - 1) // align * align
+
+def hash_cost(cdict, hash_f):
+    """Return (cost, table_bytes) for using hash_f for cdict"""
+    validate = hash_f.need_hash_index_validation()
+    if cdict.action_codegen.no_actions() and not validate:
+        table_bytes = 0 # see phash_t.add_lu_table
+    else:
+        table_bytes = (hash_f.get_table_size() *
+                       _lu_entry_bytes(cdict, validate))
+    cost = _cost_weights['byte'] * table_bytes
+    for op, n in hash_f.op_counts().items():
+        cost += _cost_weights[op] * n
+    if validate:
+        cost += _cost_weights['validate']
+    return (cost, table_bytes)
+
+def _one_level_candidates(cdict):
+    """Return all the viable 1-level hash functions for cdict"""
+    keys = list(cdict.tuple2int.values())
+    candidates = []
+    if _is_linear(keys):
+        candidates.append(hashlin.get_linear_hash_function(keys))
+
+    # a power of 2 table size replaces a multiply with a shift
+    lengths = _find_candidate_lengths_mul(cdict.tuple2int)
+    n = len(keys)
+    pow2 = 1 << (n-1).bit_length()
+    if pow2 > 1 and pow2 not in lengths:
+        lengths = sorted(lengths + [pow2])
+    for length in lengths:
+        hash_f = hashmul.hashmul_t(length)
+        if hash_f.is_perfect(keys):
+            candidates.append(hash_f)
+
+    hash_f = _find_fks_hash(cdict)
+    if hash_f:
+        candidates.append(hash_f)
+
+    hash_f = _find_lincomb_hash(cdict)
+    if hash_f:
+        candidates.append(hash_f)
+    return candidates
+
+def _gen_hash_lowest_cost(cdict):
+    """Generate the 1-level hash function with the lowest cost or give up"""
+    scored = []
+    best = None
+    for hash_f in _one_level_candidates(cdict):
+        (cost, table_bytes) = hash_cost(cdict, hash_f)
+        scored.append((hash_f, cost, table_bytes))
+        if best is None or cost < best[1]:
+            best = scored[-1]
+    if not best:
+        return None
+    phash = l1_phash_t(cdict, best[0])
+    phash.candidates = scored
+    return phash
+
+def _describe_hash(hash_f):
+    s = '%s m=%d' % (hash_f.kind(), hash_f.get_table_size())
+    if hash_f.kind() == 'fks':
+        s += ' p=%d k=%d' % (hash_f.p, hash_f.k)
+    elif hash_f.kind() == 'lincomb':
+        s += ' a=%s' % (','.join([str(a) for a in hash_f.coeffs]))
+    return s
+
+def selection_report(phash):
+    """Return a list of report lines describing the hash function
+    candidates of phash. The selected one is marked with a *."""
+    lines = []
+    if not phash.candidates:
+        lines.append('    %s (no 1-level candidates)' %
+                     _describe_hash(phash.hash_f))
+    for (hash_f, cost, table_bytes) in phash.candidates:
+        ops = hash_f.op_counts()
+        op_str = ' '.join(['%s=%d' % (op, ops[op]) for op in sorted(ops)])
+        mark = '*' if hash_f is phash.hash_f else ' '
+        lines.append('  %s cost=%-8.2f bytes=%-5d validate=%d %-16s %s' % (
+            mark, cost, table_bytes,
+            hash_f.need_hash_index_validation(), op_str,
+            _describe_hash(hash_f)))
+    return lines
+
 def _gen_hash_one_level(cdict):
     """Generate a 1 level hash function or give up"""
 
@@ -602,12 +867,19 @@ def _gen_hash_one_level(cdict):
     if phash:
         return phash
 
+    phash = _find_l1_phash_lincomb(cdict)
+    if phash:
+        return phash
+
     return None
 
 def gen_hash(cdict):
     """ Main entry point for generating hash functions."""
 
-    phash = _gen_hash_one_level(cdict)
+    if _selection == 'cost' and not _zero_constraints(cdict):
+        phash = _gen_hash_lowest_cost(cdict)
+    else:
+        phash = _gen_hash_one_level(cdict)
     if phash:
         return phash
 
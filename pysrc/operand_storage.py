@@ -25,6 +25,11 @@ import codegen
 import genutil
 import ildutil
 import math
+import collections
+
+_cache_line_bytes = 64
+_storage_bytes = { 'xed_uint8_t':1, 'xed_uint16_t':2,
+                   'xed_uint32_t':4, 'xed_uint64_t':8 }
 
 
 class operand_field_t(object): 
@@ -81,6 +86,9 @@ class operand_field_t(object):
       
       #if True using bit fields 
       self.compressed = False
+
+      # how often the decoder uses this field. for the layout.
+      self.heat = 0
       
    def print_field(self):
       if self.xprint == 'PRINT':
@@ -133,6 +141,9 @@ class operands_storage_t(object):
         #list of bin, each bin is operands
         #used for squeezing operands with a few bits to one 32 bit variable 
         self.bins = []
+
+        #if True the layout is by the heat of the operands
+        self.layout_by_heat = False
         
       
     def _read_storage_fields(self,lines):
@@ -189,6 +200,16 @@ class operands_storage_t(object):
     
     def get_storage_type(self,operand):
         return self.operand_fields[operand].storage_type
+
+    def set_field_heat(self,heat):
+        ''' heat is a dict of operand name to a count of how often the
+            decoder uses it. emit() lays out the operands by it '''
+        for name,count in heat.items():
+            if name in self.operand_fields:
+                self.operand_fields[name].heat = count
+            else:
+                genutil.warn("No operand storage field %s" % name)
+        self.layout_by_heat = True
     
     def _gen_op_getter_fo(self,opname):
         ''' generate the function object for the getter accessors
@@ -394,31 +415,30 @@ class operands_storage_t(object):
         #compute the ctype of the operand ad represented in the operand storage
         self._compute_type_in_storage()
         
-        if self.compressed:
+        if self.layout_by_heat:
+            (un_compressed, self.bins) = self._layout_by_heat()
+        elif self.compressed:
             self.bins = self._compress_operands()
             
             operands = list(self.operand_fields.values())
             un_compressed = list(filter(lambda x: x.compressed == False, operands ))
             un_compressed = sort_cmp_operands(un_compressed)
-            
-            # first emit all the operands that does not use bit fields 
-            for op in un_compressed:
-                cgen.add_var(op.name.lower(), op.storage_type, 
-                             accessors='none')
-            
-            #emit the operand with bit fields
-            for i,xbin in enumerate(self.bins):
-                for op in xbin.operands:
-                    cgen.add_var(op.name.lower(), xbin.storage_ctype, 
-                                 bit_width=op.bitwidth, accessors='none')
-        
         else:
-            operands_sorted = list(self.operand_fields.values())
-            operands_sorted = sort_cmp_operands(operands_sorted)
-            for op in operands_sorted:
-                cgen.add_var(op.name.lower(), op.storage_type, 
-                             accessors='none')
-        
+            un_compressed = list(self.operand_fields.values())
+            un_compressed = sort_cmp_operands(un_compressed)
+            
+        # first emit all the operands that does not use bit fields 
+        for op in un_compressed:
+            cgen.add_var(op.name.lower(), op.storage_type, 
+                         accessors='none')
+        
+        #emit the operand with bit fields
+        for i,xbin in enumerate(self.bins):
+            for op in xbin.operands:
+                cgen.add_var(op.name.lower(), xbin.storage_ctype, 
+                             bit_width=op.bitwidth, accessors='none')
+        
+        self._report_layout(un_compressed, self.bins)
         lines = cgen.emit_decl()
         fe.writelines(lines)
         
@@ -487,6 +507,70 @@ class operands_storage_t(object):
             op.compressed = True
         return bins
             
+    def _layout_by_heat(self):
+        ''' the hottest operands that fit in the first cache line come
+            first and do not use bit fields. the other operands that are
+            narrower than their c type are packed into bins, hottest
+            first. returns the list of operands that do not use bit
+            fields and the bins '''
+        operands = sort_cmp_operands(list(self.operand_fields.values()))
+        operands.sort(key=lambda x: -x.heat)
+        
+        hot = []
+        used = 0
+        for op in operands:
+            size = _storage_bytes[op.storage_type]
+            if op.heat > 0 and used + size <= _cache_line_bytes:
+                hot.append(op)
+                used += size
+        hot_names = set([ op.name for op in hot ])
+        candidate_names = set([ op.name for op in 
+                                self._get_candidates_for_compression() ])
+        cold = [ op for op in operands if op.name not in hot_names ]
+        packed = [ op for op in cold if op.name in candidate_names ]
+        un_compressed = [ op for op in cold 
+                          if op.name not in candidate_names ]
+        bins = self._partition_to_bins(packed)
+        
+        # wider types first so that there is no padding
+        key_size = lambda x: -_storage_bytes[x.storage_type]
+        hot.sort(key=key_size)
+        un_compressed.sort(key=key_size)
+        return (hot + un_compressed, bins)
+    
+    def _report_layout(self,un_compressed,bins):
+        ''' print the size of the operand storage and the fields in each
+            cache line. follows the C struct layout rules for the
+            fields and the bit fields '''
+        lines = collections.defaultdict(list)
+        offset = 0 # in bits
+        align = 1  # in bytes
+        for op in un_compressed:
+            size = _storage_bytes[op.storage_type]
+            offset = (offset + 8*size - 1) // (8*size) * (8*size)
+            lines[offset // (8*_cache_line_bytes)].append(op)
+            offset += 8*size
+            align = max(align, size)
+        for xbin in bins:
+            for op in xbin.operands:
+                # a bit field does not cross its 32b storage unit
+                if offset % 32 + op.bitwidth > 32:
+                    offset = (offset + 31) // 32 * 32
+                lines[offset // (8*_cache_line_bytes)].append(op)
+                offset += op.bitwidth
+            align = max(align, 4)
+        size = (offset + 8*align - 1) // (8*align) * align
+        
+        genutil.msgb("OPERAND STORAGE", "%d bytes, %d cache lines" % 
+                     (size, len(lines)))
+        total_heat = sum([ op.heat for op in self.operand_fields.values() ])
+        for i in sorted(lines.keys()):
+            line_heat = sum([ op.heat for op in lines[i] ])
+            s = "%d fields" % len(lines[i])
+            if total_heat:
+                s += ", %.1f%% of the uses" % (100.0 * line_heat / total_heat)
+            genutil.msgb("OPERAND STORAGE LINE %d" % i, s)
+        
     def _compress_operands(self):
         ''' most of the operands's width are less than their c type.
         in order to save space we are bin packing the operands.
@@ -27,6 +27,12 @@ class operand_info_t(object):
    """This is one of the major classes of the program. It describes
    the captured fields and lookup functions that are required for
    decoding."""
+   # unique_id and cvt_index are set by the generator's
+   # remember_operand() and collect_convert_decorations().
+   __slots__ = ('name', 'type', 'xtype', 'internal', 'multireg', 'inline',
+                'bits', 'lookupfn_name', 'rw', 'cvt', 'invert',
+                'rightmost_bitpos', 'bit_positions', 'visibility', 'oc2',
+                'bit_extractor', 'bit_packer', 'unique_id', 'cvt_index')
 
    decimal_number_pattern = re.compile(r'[0-9]+')
    
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- python -*-
+#BEGIN_LEGAL
+#
+#Copyright (c) 2019 Intel Corporation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#END_LEGAL
+
+"""Per phase timing for the generator.
+
+Wrap the work in named phases:
+
+    with phaseprof.phase('gen_regs'):
+        gen_regs(options, agi)
+
+When enabled, every phase records its wall time, CPU time and the
+process peak RSS and write_report() writes them as JSON. Phases nest
+and a phase that runs more than once (in a loop) under the same
+parent is accumulated in to one entry. Optionally the outermost phases
+also get a cProfile dump each. When not enabled, phase() does nothing.
+"""
+
+import os
+import sys
+import re
+import time
+import json
+import contextlib
+
+import genutil
+
+try:
+    import resource
+except ImportError: # windows
+    resource = None
+
+_wall_clock = getattr(time, 'perf_counter', time.time)
+
+class _phase_stats_t(object):
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.maxrss = 0
+        self.maxrss_growth = 0
+
+    def dict(self):
+        return { 'name': self.name,
+                 'path': '/'.join(self.path),
+                 'depth': len(self.path) - 1,
+                 'calls': self.calls,
+                 'wall_sec': round(self.wall, 6),
+                 'cpu_sec': round(self.cpu, 6),
+                 'maxrss_kb': self.maxrss,
+                 'maxrss_growth_kb': self.maxrss_growth }
+
+_enabled = False
+_dump_dir = None
+_start = None
+_stack = []   # names of the active phases
+_stats = {}   # path tuple -> _phase_stats_t
+_order = []   # path tuples in the order the phases were first entered
+
+def enable(dump_dir=None):
+    """Start recording phases. With a dump_dir, the outermost phases
+    are also run under cProfile and their stats are written to
+    dump_dir/<phase name>.prof"""
+    global _enabled, _dump_dir, _start
+    _enabled = True
+    _dump_dir = dump_dir
+    if dump_dir:
+        genutil.cmkdir(dump_dir)
+    _start = _sample()
+
+def enabled():
+    return _enabled
+
+def _cpu_time():
+    """User and system time of this process and of the child
+    processes that have been waited for, like the graph build
+    workers."""
+    t = os.times()
+    return t[0] + t[1] + t[2] + t[3]
+
+def _maxrss_kb():
+    """Peak resident set size of the process so far, or 0 if we
+    cannot tell."""
+    if not resource:
+        return 0
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin': # bytes, not KB
+        r //= 1024
+    return r
+
+def _sample():
+    return (_wall_clock(), _cpu_time(), _maxrss_kb())
+
+def _dump_file_name(name):
+    return os.path.join(_dump_dir, re.sub(r'[^\w.-]', '_', name) + '.prof')
+
+@contextlib.contextmanager
+def phase(name):
+    """Record the time and memory of the with statement body as the
+    phase called name"""
+    if not _enabled:
+        yield
+        return
+
+    _stack.append(name)
+    path = tuple(_stack)
+    profiler = None
+    if _dump_dir and len(_stack) == 1:
+        import cProfile
+        profiler = cProfile.Profile()
+    start = _sample()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        end = _sample()
+        _stack.pop()
+        if path not in _stats:
+            _stats[path] = _phase_stats_t(name, path)
+            _order.append(path)
+        s = _stats[path]
+        s.calls += 1
+        s.wall += end[0] - start[0]
+        s.cpu += end[1] - start[1]
+        s.maxrss = max(s.maxrss, end[2])
+        s.maxrss_growth += end[2] - start[2]
+        if profiler:
+            profiler.dump_stats(_dump_file_name(name))
+
+def report():
+    """Return the phase report as a dictionary"""
+    end = _sample()
+    total = { 'wall_sec': round(end[0] - _start[0], 6),
+              'cpu_sec': round(end[1] - _start[1], 6),
+              'maxrss_kb': end[2] }
+    return { 'format': 'xed-generator-profile',
+             'version': 1,
+             'command': sys.argv,
+             'python': sys.version.split()[0],
+             'total': total,
+             'phases': [ _stats[p].dict() for p in _order ] }
+
+def write_report(fn):
+    """Write the JSON phase report to the file fn"""
+    f = open(fn, 'w')
+    json.dump(report(), f, indent=1, sort_keys=True)
+    f.write('\n')
+    f.close()
+    genutil.msgb("PROFILE REPORT", fn)
@@ -89,6 +89,7 @@ except:
 import actions
 import ins_emit
 import encutil
+import phaseprof
 from patterns import *
 
 storage_fields = {}
@@ -2694,50 +2695,55 @@ class encoder_configuration_t(object):
     def run(self):
         # this is the main loop
 
-        # read the state bits 
-        f = self.files.state_bits_file
-        lines = open(f,'r').readlines()
-        self.state_bits = self.parse_state_bits(lines)
-        del lines
+        with phaseprof.phase('read_inputs'):
+            # read the state bits 
+            f = self.files.state_bits_file
+            lines = open(f,'r').readlines()
+            self.state_bits = self.parse_state_bits(lines)
+            del lines
 
-        # writes self.sequences and self.nonterminals
-        self.read_encoder_files()
-        # writes self.deocoder_nonterminals and self.decoder_ntlufs
-        self.read_decoder_files()
+            # writes self.sequences and self.nonterminals
+            self.read_encoder_files()
+            # writes self.deocoder_nonterminals and self.decoder_ntlufs
+            self.read_decoder_files()
 
         if vdumpinput():
             self.dump()
         
         ## inline all the nt in the conditions section
-        dfile = open(mbuild.join(self.gendir,'inline_nt.txt'),'w')
-        self.inline_conditions(self.nonterminals,dfile)
-        self.inline_conditions(self.decoder_ntlufs,dfile)
-        dfile.close()
+        with phaseprof.phase('inline_conditions'):
+            dfile = open(mbuild.join(self.gendir,'inline_nt.txt'),'w')
+            self.inline_conditions(self.nonterminals,dfile)
+            self.inline_conditions(self.decoder_ntlufs,dfile)
+            dfile.close()
         
-        self.make_sequence_functions()
+        with phaseprof.phase('make_nonterminal_functions'):
+            self.make_sequence_functions()
         
-        f_gen = nt_func_gen.nt_function_gen_t(self,storage_fields)
-        fos, operand_lu_fos = f_gen.gen_nt_functions()
-        self.emit_lu_functions(operand_lu_fos)
-        self.functions.extend(fos)
+            f_gen = nt_func_gen.nt_function_gen_t(self,storage_fields)
+            fos, operand_lu_fos = f_gen.gen_nt_functions()
+            self.emit_lu_functions(operand_lu_fos)
+            self.functions.extend(fos)
         
-        self.make_nonterminal_functions(self.nonterminals)
-        self.make_nonterminal_functions(self.decoder_ntlufs)
-        self.make_nonterminal_functions(self.decoder_nonterminals)
+            self.make_nonterminal_functions(self.nonterminals)
+            self.make_nonterminal_functions(self.decoder_ntlufs)
+            self.make_nonterminal_functions(self.decoder_nonterminals)
 
-        self.make_encode_order_tables()# FIXME  too early?
-        # emit the per instruction bind & emit functions
-        self.make_isa_encode_functions()
-        self.emit_group_encode_functions()
+        with phaseprof.phase('make_isa_encode_functions'):
+            self.make_encode_order_tables()# FIXME  too early?
+            # emit the per instruction bind & emit functions
+            self.make_isa_encode_functions()
+            self.emit_group_encode_functions()
         
-        self.emit_lu_tables()
-        self.emit_encoder_iform_table()
-        # write the dispatch table initialization function
-        self.emit_encode_function_table_init()
+        with phaseprof.phase('emit_tables_and_functions'):
+            self.emit_lu_tables()
+            self.emit_encoder_iform_table()
+            # write the dispatch table initialization function
+            self.emit_encode_function_table_init()
         
-        self.emit_function_bodies_and_header_numbered()
+            self.emit_function_bodies_and_header_numbered()
 
-        self.emit_iforms()
+            self.emit_iforms()
 
     def look_for_encoder_inputs(self): 
         encoder_inputs_by_iclass = {}  # dictionary mapping iclass -> set of field names
@@ -2919,7 +2925,8 @@ class encoder_configuration_t(object):
                                      self.xeddir,
                                      self.gendir,
                                      os.path.join(self.gendir, 'include-private'),
-                                     other_headers=headers)
+                                     other_headers=headers,
+                                     stable_shards=True)
         if 0:
             # move the generated header file to the private generated headers
             efile = os.path.join(self.gendir, 'include-private', 'xed-encoder.h')
@@ -3065,6 +3072,10 @@ def setup_arg_parser():
     arg_parser.add_option('--verbosity', '-v',
                       action='append', dest='verbosity', default=[],
                       help='list of verbosity tokens, repeatable.')
+    arg_parser.add_option('--profile-report',
+                      action='store', dest='profile_report', default='',
+                      help='Write the wall time, CPU time and peak RSS ' +
+                      'of each generator phase to this JSON file.')
     return arg_parser
 
 
@@ -3072,10 +3083,15 @@ if __name__ == '__main__':
     arg_parser = setup_arg_parser()
     (options, args ) = arg_parser.parse_args()
     set_verbosity_options(options.verbosity)
+    if options.profile_report:
+        phaseprof.enable()
     enc_inputs = encoder_input_files_t(options)
     enc = encoder_configuration_t(enc_inputs, options.amd_enabled)
     enc.run()
     enc.look_for_encoder_inputs()      # exploratory stuff
     enc.emit_encode_defines()  # final stuff after all tables are sized
     enc.dump_output_file_names()
+    write_emit_manifests() # codegen
+    if options.profile_report:
+        phaseprof.write_report(options.profile_report)
     sys.exit(0)
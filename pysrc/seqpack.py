@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#BEGIN_LEGAL
+#
+#Copyright (c) 2019 Intel Corporation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#END_LEGAL
+"""Pack integer sequences in to one array so that each sequence is a
+window (offset, length) of the array. Sequences that are contained in
+other sequences share their storage and the others are overlapped
+with the greedy shortest common superstring heuristic."""
+
+from __future__ import print_function
+import collections
+
+def _find(parent, x):
+    while parent[x] != x:
+        parent[x] = parent[parent[x]]
+        x = parent[x]
+    return x
+
+def _drop_contained(seqs):
+    """Return the indices of the sequences that are not contained in
+    other sequences and a dictionary of the contained ones to
+    (containing index, offset)"""
+    kept = []
+    contained = {}
+    windows = {} # tuple -> (index of a kept sequence, offset)
+    by_length = sorted(range(len(seqs)), key=lambda i: -len(seqs[i]))
+    for i in by_length:
+        s = seqs[i]
+        if s in windows:
+            contained[i] = windows[s]
+            continue
+        kept.append(i)
+        for b in range(len(s)):
+            for e in range(b+1, len(s)+1):
+                w = s[b:e]
+                if w not in windows:
+                    windows[w] = (i, b)
+    kept.sort()
+    return kept, contained
+
+def _link_by_overlap(seqs, kept):
+    """Greedily join the kept sequences with the largest overlaps
+    first. Returns dictionaries of the successors and of the overlap
+    with the successor."""
+    succ = {}
+    pred = {}
+    overlap = {}
+    parent = dict([ (i,i) for i in kept ])
+    max_len = max([ len(seqs[i]) for i in kept ] + [0])
+    for k in range(max_len-1, 0, -1):
+        by_prefix = collections.defaultdict(list)
+        for b in kept:
+            if len(seqs[b]) > k and b not in pred:
+                by_prefix[seqs[b][:k]].append(b)
+        for a in kept:
+            if len(seqs[a]) <= k or a in succ:
+                continue
+            candidates = by_prefix.get(seqs[a][-k:])
+            if not candidates:
+                continue
+            for b in candidates:
+                if b in pred or _find(parent, a) == _find(parent, b):
+                    continue
+                succ[a] = b
+                pred[b] = a
+                overlap[a] = k
+                parent[_find(parent, b)] = _find(parent, a)
+                break
+    return succ, pred, overlap
+
+def pack(seqs):
+    """seqs is a list of distinct tuples of integers. Returns the
+    packed list and the list of the offsets of the sequences in it.
+    The first sequences are placed first."""
+    starts = [0] * len(seqs)
+    nonempty = [ i for i in range(len(seqs)) if seqs[i] ]
+    sub = [ seqs[i] for i in nonempty ]
+    kept, contained = _drop_contained(sub)
+    succ, pred, overlap = _link_by_overlap(sub, kept)
+
+    # each chain of linked sequences goes where its first member in
+    # the input order would go
+    chain_rank = {}
+    for i in kept:
+        if i not in pred:
+            rank = i
+            j = i
+            while j in succ:
+                j = succ[j]
+                rank = min(rank, j)
+            chain_rank[i] = rank
+    table = []
+    sub_starts = {}
+    for head in sorted(chain_rank.keys(), key=lambda i: chain_rank[i]):
+        i = head
+        sub_starts[i] = len(table)
+        table.extend(sub[i])
+        while i in succ:
+            k = overlap[i]
+            i = succ[i]
+            sub_starts[i] = len(table) - k
+            table.extend(sub[i][k:])
+    for i, (host, offset) in contained.items():
+        sub_starts[i] = sub_starts[host] + offset
+    for j, i in enumerate(nonempty):
+        starts[i] = sub_starts[j]
+    return table, starts
+
+def test_seqpack():
+    seqs = [ (1,2,3), (3,4), (2,3), (4,5,1), (), (7,), (3,4,5) ]
+    table, starts = pack(seqs)
+    print(table)
+    for s, b in zip(seqs, starts):
+        print(s, b, tuple(table[b:b+len(s)]) == s)
+
+if __name__ == '__main__':
+    test_seqpack()
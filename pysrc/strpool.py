@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+#BEGIN_LEGAL
+#
+#Copyright (c) 2019 Intel Corporation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#END_LEGAL
+"""A pool of the strings of a generated table. The strings are stored
+once in one char array and the tables hold offsets in to it instead
+of pointers. A string that is the end of another string uses the
+storage of the longer one. Offsets need no relocations when the
+library is loaded."""
+
+from __future__ import print_function
+import collections
+import genutil
+
+# totals over all the pools, for report()
+_totals = collections.Counter()
+
+class string_pool_t(object):
+    def __init__(self, name):
+        """name is the name of the C array"""
+        self.name = name
+        self.strings = []  # unique strings in the order they were added
+        self.offsets = {}  # string -> offset, after finish()
+        self.hosts = {}    # string -> the string whose storage it uses
+        self.size = 0
+        self.n_adds = 0
+        self.literal_bytes = 0
+
+    def add(self, s):
+        self.n_adds += 1
+        self.literal_bytes += len(s) + 1
+        if s not in self.offsets:
+            self.offsets[s] = None
+            self.strings.append(s)
+
+    def finish(self):
+        """Assign the offsets. The strings that are not the suffix of
+        another string are placed in the order they were added."""
+        # in the order of the reversed strings, the strings that end
+        # with s follow s.
+        by_suffix = sorted(self.strings, key=lambda x: x[::-1])
+        for i in range(len(by_suffix)-1, -1, -1):
+            s = by_suffix[i]
+            self.hosts[s] = s
+            if i+1 < len(by_suffix) and by_suffix[i+1].endswith(s):
+                self.hosts[s] = self.hosts[by_suffix[i+1]]
+        self.size = 0
+        for s in self.strings:
+            if self.hosts[s] == s:
+                self.offsets[s] = self.size
+                self.size += len(s) + 1
+        for s in self.strings:
+            h = self.hosts[s]
+            self.offsets[s] = self.offsets[h] + len(h) - len(s)
+
+        _totals['pools'] += 1
+        _totals['strings'] += self.n_adds
+        _totals['literal_bytes'] += self.literal_bytes
+        _totals['pool_bytes'] += self.size
+
+    def offset(self, s):
+        return self.offsets[s]
+
+    def offset_ctype(self):
+        """The smallest unsigned C type for the offsets"""
+        if self.size <= 0xFFFF:
+            return 'unsigned short'
+        return 'unsigned int'
+
+    def emit(self, qualifiers='static const'):
+        """Return the lines of the C array. The characters are numbers
+        so that there is no limit on the length of a string literal."""
+        lines = [ '%s char %s[%d] = {' % (qualifiers, self.name,
+                                          max(1,self.size)) ]
+        for s in self.strings:
+            if self.hosts[s] != s:
+                continue
+            chars = [ str(c) for c in bytearray(s.encode('utf-8')) ]
+            chars.append('0')
+            comment = s.replace('*/', '* /')
+            lines.append('/* %5d %s */ %s,' % (self.offsets[s], comment,
+                                               ','.join(chars)))
+        if self.size == 0:
+            lines.append('0')
+        lines.append('};')
+        return lines
+
+def report():
+    """Print the sizes of the string pools compared to one string
+    literal and one pointer per string"""
+    if not _totals['pools']:
+        return
+    genutil.msgb("STRING POOLS",
+                 "%d pools, %d strings, %d bytes as literals, %d pooled" %
+                 (_totals['pools'], _totals['strings'],
+                  _totals['literal_bytes'], _totals['pool_bytes']))
+
+def test_strpool():
+    p = string_pool_t('test_pool')
+    for s in ['ADD', 'FADD', 'ADD', 'SUB', 'PADD', 'B', 'SUB', '']:
+        p.add(s)
+    p.finish()
+    print("\n".join(p.emit()))
+    for s in p.strings:
+        print(repr(s), p.offset(s))
+
+if __name__ == '__main__':
+    test_strpool()
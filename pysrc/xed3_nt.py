@@ -120,7 +120,7 @@ def _get_all_cnames(gi):
         cnames.extend(list(rule.xed3_constraints.keys()))
     return set(cnames)
     
-def _gen_cdict(agi, nt_name, all_state_space):
+def _gen_cdict(agi, nt_name, all_state_space, all_ops_widths):
     """
     Creates a ild_cdict.constraint_dict_t corresponding to NT 
     defined by gi.
@@ -140,19 +140,25 @@ def _gen_cdict(agi, nt_name, all_state_space):
         get_ii_constraints(rule, state_space, rule.xed3_constraints)
     
     cnames = _get_all_cnames(gi)
+    key_widths = ild_cdict.get_key_widths(cnames, all_state_space,
+                                          all_ops_widths)
         
     for rule in gi.parser_output.instructions:
         cdict = ild_cdict.constraint_dict_t(
                                     cnames, 
                                     rule.xed3_constraints, 
                                     all_state_space,
-                                    rule)
+                                    rule,
+                                    all_ops_widths,
+                                    key_widths)
         cdict_list.append(cdict)
     msg = "cdict conflict in NT %s\n" % nt_name
     united_dict = ild_cdict.constraint_dict_t.unite_dicts(
                                             cdict_list, 
                                             msg, 
                                             cnames)
+    if united_dict:
+        united_dict.create_tuple2int()
     return united_dict
 
 
@@ -752,7 +758,8 @@ def work(agi, all_state_space, all_ops_widths, patterns):
 
         _vlog(log_f,'processing %s\n' % nt_name)
         #create a constraint_dict_t for each NT
-        nt_cdict = _gen_cdict(agi, nt_name, all_state_space)
+        nt_cdict = _gen_cdict(agi, nt_name, all_state_space,
+                              all_ops_widths)
         _vlog(log_f,'NT:%s:\n%s\n' % (nt_name, nt_cdict))
         gi = agi.generator_dict[nt_name]
         gi.xed3_cdict = nt_cdict #just for transporting
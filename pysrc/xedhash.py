@@ -33,6 +33,10 @@ class hash_fun_interface_t(object):
         self._raise_error()
     def kind(self):
         self._raise_error()
+    def op_counts(self):
+        """Return a dictionary of the number of 'mul', 'mod', 'shift' and
+        'add' operations in the emitted C expression."""
+        self._raise_error()
         
 def is_perfect(keylist, hash_f):
     "Does each input map to a different bucket? If so, it is perfect."""
@@ -69,3 +73,55 @@ def is_well_distributed(keylist, hash_f, maxbin):
 
     okay = _measure_bucket_max(table, maxbin)
     return okay
+
+# The hash function searches can optionally use numpy to evaluate many
+# candidate hash functions at once. The vectorized searches return
+# exactly the same hash functions as the scalar searches.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_vectorize = numpy is not None
+# for smaller key lists the scalar searches are faster
+_vector_min_keys = 16
+
+def set_vectorized(enable):
+    """Enable or disable the numpy hash function searches. Has no
+    effect when numpy is not available."""
+    global _vectorize
+    _vectorize = bool(enable) and numpy is not None
+
+def key_array(keylist):
+    """Return a numpy int64 array of the keys, or None if the
+    vectorized search is disabled or cannot represent the keys."""
+    if not _vectorize:
+        return None
+    keys = list(keylist)
+    if len(keys) < _vector_min_keys or min(keys) < 0 or max(keys) >= (1<<62):
+        return None
+    return numpy.array(keys, dtype=numpy.int64)
+
+def first_perfect(hash_vals):
+    """hash_vals is a 2D array with one row of hash values per
+    candidate hash function. Return the index of the first row without
+    collisions or None."""
+    s = numpy.sort(hash_vals, axis=1)
+    ok = numpy.all(s[:,1:] != s[:,:-1], axis=1)
+    idx = numpy.flatnonzero(ok)
+    if idx.size:
+        return int(idx[0])
+    return None
+
+def first_well_distributed(hash_vals, table_size, maxbin):
+    """Like first_perfect but return the first row where no bucket of
+    the table_size buckets gets maxbin or more keys."""
+    rows = hash_vals.shape[0]
+    flat = hash_vals + (numpy.arange(rows, dtype=numpy.int64) *
+                        table_size)[:,None]
+    counts = numpy.bincount(flat.ravel(), minlength=rows*table_size)
+    ok = counts.reshape(rows, table_size).max(axis=1) < maxbin
+    idx = numpy.flatnonzero(ok)
+    if idx.size:
+        return int(idx[0])
+    return None
@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+#-*- python -*-
+#BEGIN_LEGAL
+#
+#Copyright (c) 2019 Intel Corporation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#END_LEGAL
+
+# Measure the encode speed of every enc2 test function and of
+# xed_encode() on the same operands.
+#
+# The enc2 tester (built with --enc2) writes the median cycles of each
+# test function with its --bench option. The tester is run --samples
+# times and we keep the median of the per run medians. The tests are
+# joined with the testtable-m*-a*.txt file that enc2gen.py writes,
+# which gives the iclass, extension, ISA set and encoding space of
+# every test function. The results are aggregated per iclass,
+# extension and space and written as JSON.
+#
+# The baselines are stored as JSON, one file per host and config, like
+# perftest.py. A group regresses if the per function enc2 cycles are
+# significantly slower (Mann-Whitney U test) and the median slowed
+# down by more than --min-change percent.
+#
+#  scripts/enc2bench.py --save-baseline
+#  ... change something ...
+#  scripts/enc2bench.py
+
+from __future__ import print_function
+import os
+import sys
+import re
+import argparse
+import platform
+import json
+import time
+import collections
+import find_dir
+import perftest
+
+try:
+    import mbuild
+except:
+    sys.path.append(find_dir.find_dir('mbuild'))
+    import mbuild
+
+group_kinds = ['space', 'extension', 'iclass']
+
+class test_t(object):
+    def __init__(self, test_id, function, iclass, extension, isa_set,
+                 space):
+        self.test_id = test_id
+        self.function = function
+        self.iclass = iclass
+        self.extension = extension
+        self.isa_set = isa_set
+        self.space = space
+        self.enc2 = None        # median cycles
+        self.xed_encode = None  # median cycles, None if not encodable
+
+    def dict(self):
+        return { 'id': self.test_id,
+                 'function': self.function,
+                 'iclass': self.iclass,
+                 'extension': self.extension,
+                 'isa_set': self.isa_set,
+                 'space': self.space,
+                 'enc2': self.enc2,
+                 'xed_encode': self.xed_encode }
+
+def read_manifest(fn):
+    """Return the list of test_t from the enc2gen test table file"""
+    tests = []
+    for line in open(fn, 'r'):
+        if line.startswith('#'):
+            continue
+        wrds = line.split()
+        if len(wrds) < 7:
+            mbuild.die("{} has no extension, ISA set and space ".format(fn) +
+                       "columns. Rebuild with the current enc2gen.py")
+        tests.append(test_t(int(wrds[0]), wrds[3], wrds[2], wrds[4],
+                            wrds[5], wrds[6]))
+    return tests
+
+def run_tester(args, out_fn):
+    """Run the tester once and return a dictionary test id -> (enc2
+    cycles, xed_encode cycles or None)"""
+    cmd = '{} --reps {} --bench {}'.format(args.tester, args.reps, out_fn)
+    (retval, output, error_output) = mbuild.run_command(cmd)
+    if retval != 0:
+        for line in output:
+            print("   ", line, end='')
+        mbuild.die("Error running: {}".format(cmd))
+    results = {}
+    for line in open(out_fn, 'r'):
+        if line.startswith('#'):
+            continue
+        (test_id, enc2, xed) = [ int(x) for x in line.split() ]
+        results[test_id] = (enc2, xed if xed >= 0 else None)
+    return results
+
+def median(lst):
+    return perftest.percentile(sorted(lst), 50)
+
+def measure(args, tests):
+    out_fn = os.path.join(args.work_dir, 'enc2bench-raw.txt')
+    runs = []
+    for sample in range(0, args.samples):
+        print("Running sample {}/{}...".format(sample + 1, args.samples))
+        runs.append(run_tester(args, out_fn))
+    for t in tests:
+        if t.test_id not in runs[0]:
+            mbuild.die("Test {} is not in the tester output. ".format(
+                t.test_id) + "Is the test table from the same build?")
+        t.enc2 = median([ r[t.test_id][0] for r in runs ])
+        xed = [ r[t.test_id][1] for r in runs if r[t.test_id][1] is not None ]
+        if len(xed) == len(runs):
+            t.xed_encode = median(xed)
+
+def group_tests(tests, kind):
+    groups = collections.defaultdict(list)
+    for t in tests:
+        groups[getattr(t, kind)].append(t)
+    return groups
+
+def summarize_group(tests):
+    enc2 = [ t.enc2 for t in tests ]
+    both = [ t for t in tests if t.xed_encode is not None ]
+    s = { 'functions': len(tests),
+          'enc2_median': median(enc2),
+          'enc2_p90': perftest.percentile(sorted(enc2), 90),
+          'xed_encode_functions': len(both) }
+    if both:
+        s['enc2_median_common'] = median([ t.enc2 for t in both ])
+        s['xed_encode_median'] = median([ t.xed_encode for t in both ])
+    return s
+
+def summarize(tests):
+    groups = { 'all': { 'all': summarize_group(tests) } }
+    for kind in group_kinds:
+        groups[kind] = dict([ (name, summarize_group(lst))
+                              for name, lst in group_tests(tests,
+                                                           kind).items() ])
+    return groups
+
+def print_groups(groups, kind, limit=None):
+    if kind == 'all':
+        print("\nOverall (median cycles/encode):")
+    else:
+        print("\nBy {} (median cycles/encode):".format(kind))
+    print("  {:<28} {:>6} {:>8} {:>8} {:>10} {:>7}".format(
+        kind, 'funcs', 'enc2', 'p90', 'xed_encode', 'ratio'))
+    rows = sorted(groups[kind].items(),
+                  key=lambda x: x[1]['enc2_median'], reverse=True)
+    if limit:
+        rows = rows[:limit]
+    for name, s in rows:
+        if 'xed_encode_median' in s:
+            xed = "{:10.1f}".format(s['xed_encode_median'])
+            ratio = "{:7.1f}".format(s['xed_encode_median'] /
+                                     max(s['enc2_median_common'], 1))
+        else:
+            xed = "{:>10}".format('-')
+            ratio = "{:>7}".format('-')
+        print("  {:<28} {:6d} {:8.1f} {:8.1f} {} {}".format(
+            name, s['functions'], s['enc2_median'], s['enc2_p90'],
+            xed, ratio))
+
+def compare(args, tests, baseline):
+    """Return the number of groups with significant regressions"""
+    regressions = 0
+    base_tests = [ test_t(b['id'], b['function'], b['iclass'],
+                          b['extension'], b['isa_set'], b['space'])
+                   for b in baseline['tests'] ]
+    for t, b in zip(base_tests, baseline['tests']):
+        t.enc2 = b['enc2']
+    # function names are stable across datafile changes, test ids are not
+    current = dict([ (t.function, t) for t in tests ])
+    common = set([ t.function for t in base_tests ]) & set(current.keys())
+    print("\nComparing with the baseline from {} ({} common functions)".format(
+        baseline.get('date', 'unknown date'), len(common)))
+    for kind in ['all'] + group_kinds:
+        if kind == 'all':
+            base_groups = { 'all': base_tests }
+        else:
+            base_groups = group_tests(base_tests, kind)
+        for name, lst in sorted(base_groups.items()):
+            a = [ current[t.function].enc2 for t in lst if t.function in common ]
+            b = [ t.enc2 for t in lst if t.function in common ]
+            if len(a) < args.min_functions:
+                continue
+            ma = median(a)
+            mb = median(b)
+            change = 100.0 * (ma - mb) / max(mb, 1)
+            p = perftest.mann_whitney(a, b)
+            if p < args.alpha and abs(change) >= args.min_change:
+                status = 'improved'
+                if change > 0:
+                    status = 'REGRESSION'
+                    regressions += 1
+                print("  {0:<10} {1:<28} {2:8.1f} -> {3:8.1f}  {4:+6.1f}%  "
+                      "p={5:.4f}  {6}".format(kind, name, mb, ma, change,
+                                              p, status))
+    return regressions
+
+def baseline_file_name(args):
+    if args.baseline:
+        return args.baseline
+    return os.path.join(args.baseline_dir,
+                        '{}-{}.json'.format(args.host, args.config))
+
+def work(args):
+    m = re.match(r'enc2-m(\d+)-a(\d+)$', args.config)
+    if not m:
+        mbuild.warn("Bad config name {}".format(args.config))
+        return 2
+    config_dir = os.path.join(args.build_dir, args.config)
+    if not args.tester:
+        args.tester = os.path.join(config_dir,
+                                   'enc2tester-{}'.format(args.config))
+    if not args.manifest:
+        args.manifest = os.path.join(config_dir, 'test', 'src',
+                                     'testtable-m{}-a{}.txt'.format(
+                                         m.group(1), m.group(2)))
+    for fn in [args.tester, args.manifest]:
+        if not os.path.exists(fn):
+            mbuild.warn("Could not find {}".format(fn))
+            return 2
+    if args.reps < 1 or args.samples < 1:
+        mbuild.warn("Need at least 1 repeat and 1 sample")
+        return 2
+    mbuild.cmkdir(args.work_dir)
+
+    tests = read_manifest(args.manifest)
+    measure(args, tests)
+    groups = summarize(tests)
+    print_groups(groups, 'all')
+    print_groups(groups, 'space')
+    print_groups(groups, 'extension', args.top)
+    print_groups(groups, 'iclass', args.top)
+
+    output = { 'format': 'xed-enc2bench',
+               'version': 1,
+               'config': args.config,
+               'host': args.host,
+               'platform': platform.platform(),
+               'processor': platform.processor(),
+               'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'reps': args.reps,
+               'samples': args.samples,
+               'groups': groups,
+               'tests': [ t.dict() for t in tests ] }
+    fn = baseline_file_name(args)
+    if args.save_baseline:
+        args.output = fn
+        mbuild.cmkdir(os.path.dirname(os.path.abspath(fn)))
+    f = open(args.output, 'w')
+    json.dump(output, f, indent=1, sort_keys=True)
+    f.write('\n')
+    f.close()
+    print("\nWrote {}".format(args.output))
+    if args.save_baseline:
+        return 0
+
+    if not os.path.exists(fn):
+        print("No baseline {}".format(fn))
+        return 0
+    regressions = compare(args, tests, json.load(open(fn)))
+    if regressions:
+        print("PERFORMANCE DEGRADATION: {} groups with significant "
+              "regressions of more than {:.1f}%".format(regressions,
+                                                       args.min_change))
+        return 1
+    print("Success. No significant regressions.")
+    return 0
+
+def setup(defaults):
+    parser = argparse.ArgumentParser(
+        description='XED enc2 and xed_encode performance by iclass.')
+    parser.add_argument("--build-dir", dest='build_dir',
+                        help='XED build directory. ' +
+                        'Default: {}'.format(defaults.build_dir),
+                        default=defaults.build_dir)
+    parser.add_argument("--config", help='enc2 config. ' +
+                        'Default: {}'.format(defaults.config),
+                        default=defaults.config)
+    parser.add_argument("--tester", help='enc2 tester executable. ' +
+                        'Default: BUILD_DIR/CONFIG/enc2tester-CONFIG',
+                        default=defaults.tester)
+    parser.add_argument("--manifest", help='enc2gen test table file. ' +
+                        'Default: BUILD_DIR/CONFIG/test/src/' +
+                        'testtable-mM-aA.txt',
+                        default=defaults.manifest)
+    parser.add_argument("--work-dir", dest='work_dir',
+                        help='directory for the raw tester output. ' +
+                        'Default: {}'.format(defaults.work_dir),
+                        default=defaults.work_dir)
+    parser.add_argument("--output", help='JSON result file. ' +
+                        'Default: {}'.format(defaults.output),
+                        default=defaults.output)
+    parser.add_argument("--reps", help='calls per function and sample. ' +
+                        'Default: {}'.format(defaults.reps),
+                        type=int, default=defaults.reps)
+    parser.add_argument("--samples", help='number of tester runs. ' +
+                        'Default: {}'.format(defaults.samples),
+                        type=int, default=defaults.samples)
+    parser.add_argument("--top", help='number of extensions and ' +
+                        'iclasses to print. Default: {}'.format(defaults.top),
+                        type=int, default=defaults.top)
+    parser.add_argument("--host", help='host name for the baseline. ' +
+                        'Default: {}'.format(defaults.host),
+                        default=defaults.host)
+    parser.add_argument("--baseline-dir", dest='baseline_dir',
+                        help='directory of the per host baselines. ' +
+                        'Default: {}'.format(defaults.baseline_dir),
+                        default=defaults.baseline_dir)
+    parser.add_argument("--baseline", help='baseline file name. ' +
+                        'Default: BASELINE_DIR/HOST-CONFIG.json',
+                        default=defaults.baseline)
+    parser.add_argument("--save-baseline", dest='save_baseline',
+                        help='save the results as the baseline',
+                        action="store_true",
+                        default=defaults.save_baseline)
+    parser.add_argument("--alpha", help='significance level. ' +
+                        'Default: {}'.format(defaults.alpha),
+                        type=float, default=defaults.alpha)
+    parser.add_argument("--min-change", dest='min_change',
+                        help='smallest median change in percent that ' +
+                        'counts as a regression. Default: {}'.format(
+                            defaults.min_change),
+                        type=float, default=defaults.min_change)
+    parser.add_argument("--min-functions", dest='min_functions',
+                        help='smallest group that is compared. ' +
+                        'Default: {}'.format(defaults.min_functions),
+                        type=int, default=defaults.min_functions)
+    args = parser.parse_args()
+    return args
+
+class args_t:
+    pass
+
+def mkargs():
+    args = args_t()
+    args.build_dir = 'obj'
+    args.config = 'enc2-m64-a64'
+    args.tester = None
+    args.manifest = None
+    args.work_dir = 'obj'
+    args.output = 'enc2bench.json'
+    args.reps = 101
+    args.samples = 3
+    args.top = 20
+    args.host = platform.node()
+    args.baseline_dir = 'perf-baselines'
+    args.baseline = None
+    args.save_baseline = False
+    args.alpha = 0.01
+    args.min_change = 5.0
+    args.min_functions = 8
+    return args
+
+if __name__ == "__main__":
+    defaults = mkargs()
+    args = setup(defaults)
+    r = work(args)
+    sys.exit(r)
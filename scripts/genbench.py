@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+#-*- python -*-
+#BEGIN_LEGAL
+#
+#Copyright (c) 2019 Intel Corporation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#END_LEGAL
+
+# Benchmark the table generators (generator.py, read-encfile.py and
+# enc2gen.py) on several datafile configurations.  For each
+# configuration, mfile.py just-prep concatenates the datafiles and
+# then each generator runs with --profile-report.  The time and
+# memory of every phase are written to a JSON file and optionally
+# compared against an earlier result file to flag regressions.
+#
+#  scripts/genbench.py --output base.json
+#  ... change something ...
+#  scripts/genbench.py --baseline base.json
+
+from __future__ import print_function
+import os
+import sys
+import json
+import argparse
+import collections
+import find_dir
+
+try:
+    import mbuild
+except:
+    sys.path.append(find_dir.find_dir('mbuild'))
+    import mbuild
+
+# mfile.py knobs for each configuration
+configurations = collections.OrderedDict([
+    ('base',           ['--no-avx']),
+    ('base-no-amd',    ['--no-avx', '--no-amd']),
+    ('no-avx512',      ['--no-avx512']),
+    ('default',        []),
+    ('default-no-amd', ['--no-amd']),
+    ('knc',            ['--knc']),
+])
+
+tools = ['generator', 'read-encfile', 'enc2gen']
+
+# generator option and concatenated input file type. These follow
+# generator_inputs_t.decode_command() and encode_command() in
+# xed_mbuild.py.
+dec_inputs = [('--spine', 'dec-spine'),
+              ('--isa', 'dec-instructions'),
+              ('--patterns', 'dec-patterns'),
+              ('--input-fields', 'fields'),
+              ('--input-state', 'state'),
+              ('--chip-models', 'chip-models'),
+              ('--ctables', 'conversion-table'),
+              ('--input-regs', 'registers'),
+              ('--input-widths', 'widths'),
+              ('--input-extra-widths', 'extra-widths'),
+              ('--input-element-types', 'element-types'),
+              ('--input-element-type-base', 'element-type-base'),
+              ('--input-pointer-names', 'pointer-names'),
+              ('--ild-scanners', 'ild-scanners'),
+              ('--cpuid', 'cpuid'),
+              ('--ild-getters', 'ild-getters')]
+
+enc_inputs = [('--isa', 'enc-instructions'),
+              ('--enc-patterns', 'enc-patterns'),
+              ('--enc-dec-patterns', 'enc-dec-patterns'),
+              ('--input-fields', 'fields'),
+              ('--input-state', 'state'),
+              ('--input-regs', 'registers')]
+
+def q(s):
+    """Quote s for the shell if required"""
+    if ' ' in s:
+        return '"{}"'.format(s)
+    return s
+
+def run(cmd, log_prefix):
+    """Run cmd, saving the output next to log_prefix. Return True on
+    success"""
+    (status, stdout, stderr) = mbuild.run_command(cmd, separate_stderr=True)
+    for (ext, lines) in (('.out', stdout), ('.err', stderr)):
+        f = open(log_prefix + ext, 'w')
+        if lines:
+            f.writelines(lines)
+        f.close()
+    if status:
+        print("FAILED: {}".format(cmd))
+        for line in (stderr or [])[-20:]:
+            print("   ", line, end='')
+        return False
+    return True
+
+def prep(args, config, build_dir):
+    """Concatenate the datafiles for config in to build_dir/dgen"""
+    dgen = os.path.join(build_dir, 'dgen')
+    if args.no_prep and os.path.exists(dgen):
+        return True
+    s = [q(args.python), q(os.path.join(args.xed_dir, 'mfile.py')),
+         'just-prep', '--build-dir=' + q(build_dir)]
+    s.extend(configurations[config])
+    print("Preparing {}...".format(config))
+    return run(' '.join(s), os.path.join(build_dir, 'prep'))
+
+def input_args(dgen, inputs):
+    s = []
+    for (option, ftype) in inputs:
+        fn = os.path.join(dgen, 'all-{}.txt'.format(ftype))
+        # the build omits the optional inputs that have no files
+        if os.path.exists(fn) and os.path.getsize(fn):
+            s.append('{} {}'.format(option, q(fn)))
+    return s
+
+def tool_command(args, config, tool, build_dir, report_fn):
+    pysrc = os.path.join(args.xed_dir, 'pysrc')
+    dgen = os.path.join(build_dir, 'dgen')
+    s = [q(args.python), q(os.path.join(pysrc, tool + '.py'))]
+    if tool == 'generator':
+        s.extend(input_args(dgen, dec_inputs))
+        s.append('--gendir ' + q(build_dir))
+    elif tool == 'read-encfile':
+        s.extend(input_args(dgen, enc_inputs))
+        s.append('--gendir ' + q(build_dir))
+        if '--no-amd' in configurations[config]:
+            s.append('--no-amd')
+    elif tool == 'enc2gen':
+        # enc2gen finds the inputs in gendir/dgen
+        s.extend(['-m64', '-a64', '--gendir ' + q(build_dir)])
+        s.append('--output-file-list ' +
+                 q(os.path.join(build_dir, 'enc2-list-of-files.txt')))
+    s.append('--xeddir ' + q(args.xed_dir))
+    s.append('--profile-report ' + q(report_fn))
+    return ' '.join(s)
+
+def summarize(reports):
+    """Combine the --profile-report results of several samples. The
+    times are the minimum over the samples, the memory the maximum."""
+    def _combine(old, new):
+        if old is None:
+            return dict(new)
+        old['wall_sec'] = min(old['wall_sec'], new['wall_sec'])
+        old['cpu_sec'] = min(old['cpu_sec'], new['cpu_sec'])
+        old['maxrss_kb'] = max(old['maxrss_kb'], new['maxrss_kb'])
+        return old
+
+    total = None
+    phases = collections.OrderedDict()
+    for r in reports:
+        total = _combine(total, r['total'])
+        for p in r['phases']:
+            v = { 'wall_sec': p['wall_sec'],
+                  'cpu_sec': p['cpu_sec'],
+                  'maxrss_kb': p['maxrss_kb'],
+                  'calls': p['calls'] }
+            phases[p['path']] = _combine(phases.get(p['path']), v)
+    return { 'total': total, 'phases': phases }
+
+def bench_config(args, config):
+    """Return a dictionary of tool -> summary for config or None on
+    failure"""
+    build_dir = os.path.abspath(os.path.join(args.work_dir, config))
+    mbuild.cmkdir(build_dir)
+    mbuild.cmkdir(os.path.join(build_dir, 'include-private'))
+    if not prep(args, config, build_dir):
+        return None
+    results = collections.OrderedDict()
+    for tool in args.tools:
+        reports = []
+        for sample in range(0, args.samples):
+            print("Running {} {} sample {}...".format(config, tool, sample))
+            report_fn = os.path.join(build_dir,
+                                     '{}-profile-{}.json'.format(tool, sample))
+            cmd = tool_command(args, config, tool, build_dir, report_fn)
+            if not run(cmd, os.path.join(build_dir, tool)):
+                return None
+            reports.append(json.load(open(report_fn)))
+        results[tool] = summarize(reports)
+    return results
+
+def print_results(results):
+    fmt = "{0:<16} {1:<14} {2:>9} {3:>9} {4:>10}  {5}"
+    print(fmt.format('config', 'tool', 'cpu(s)', 'wall(s)', 'rss(KB)',
+                     'phase'))
+    for config, tresults in results.items():
+        for tool, summary in tresults.items():
+            rows = [('TOTAL', summary['total'])]
+            rows.extend([ (p, v) for (p, v) in summary['phases'].items()
+                          if '/' not in p ])
+            for (name, v) in rows:
+                print(fmt.format(config, tool,
+                                 "{0:.2f}".format(v['cpu_sec']),
+                                 "{0:.2f}".format(v['wall_sec']),
+                                 v['maxrss_kb'], name))
+
+def compare(args, results, baseline):
+    """Print the changes relative to the baseline. Return the number
+    of regressions: CPU time or peak memory growth beyond the
+    threshold."""
+    regressions = 0
+    limit = 1.0 + args.threshold / 100.0
+    fmt = "{0:<10} {1:<16} {2:<14} {3:<10} {4:>10} {5:>10} {6:>+7.1f}%  {7}"
+    print("\nChanges relative to the baseline {}:".format(args.baseline))
+    for config, tresults in results.items():
+        if config not in baseline:
+            print("No baseline for configuration {}".format(config))
+            continue
+        for tool, summary in tresults.items():
+            if tool not in baseline[config]:
+                print("No baseline for {} {}".format(config, tool))
+                continue
+            bsummary = baseline[config][tool]
+            checks = [('TOTAL', summary['total'], bsummary['total'])]
+            for p, v in summary['phases'].items():
+                if p in bsummary['phases']:
+                    checks.append((p, v, bsummary['phases'][p]))
+            for (name, new, old) in checks:
+                metrics = [('cpu_sec', args.min_seconds)]
+                if name == 'TOTAL':
+                    metrics.append(('maxrss_kb', 0))
+                for (metric, minimum) in metrics:
+                    if old[metric] < minimum or old[metric] <= 0:
+                        continue
+                    ratio = float(new[metric]) / old[metric]
+                    status = 'ok'
+                    if ratio > limit:
+                        status = 'REGRESSION'
+                        regressions += 1
+                    elif ratio < 1.0 / limit:
+                        status = 'improved'
+                    print(fmt.format(status, config, tool, metric,
+                                     old[metric], new[metric],
+                                     (ratio - 1.0) * 100.0, name))
+    return regressions
+
+def work(args):
+    for config in args.configs:
+        if config not in configurations:
+            mbuild.warn("Unknown configuration: {}".format(config))
+            return 2
+    for tool in args.tools:
+        if tool not in tools:
+            mbuild.warn("Unknown tool: {}".format(tool))
+            return 2
+
+    results = collections.OrderedDict()
+    for config in args.configs:
+        r = bench_config(args, config)
+        if r is None:
+            mbuild.warn("Benchmark failed for configuration {}".format(config))
+            return 2
+        results[config] = r
+
+    print()
+    print_results(results)
+    output = { 'format': 'xed-genbench',
+               'version': 1,
+               'python': sys.version.split()[0],
+               'results': results }
+    f = open(args.output, 'w')
+    json.dump(output, f, indent=1)
+    f.write('\n')
+    f.close()
+    print("\nWrote {}".format(args.output))
+
+    if args.baseline:
+        baseline = json.load(open(args.baseline))
+        regressions = compare(args, results, baseline['results'])
+        if regressions:
+            print("{} REGRESSIONS beyond {:.1f}%".format(regressions,
+                                                        args.threshold))
+            return 1
+        print("No regressions beyond {:.1f}%".format(args.threshold))
+    return 0
+
+def setup():
+    xed_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(
+        description='XED generator benchmark. Configurations: ' +
+        ', '.join(configurations.keys()))
+    parser.add_argument("--xed-dir", dest='xed_dir',
+                        help='XED source directory. Default: {}'.format(
+                            xed_dir),
+                        default=xed_dir)
+    parser.add_argument("--work-dir", dest='work_dir',
+                        help='directory for the generator inputs and ' +
+                        'outputs. Default: genbench',
+                        default='genbench')
+    parser.add_argument("--config", dest='configs', action='append',
+                        help='configuration to run, repeatable. ' +
+                        'Default: all')
+    parser.add_argument("--tool", dest='tools', action='append',
+                        help='generator to run, repeatable: ' +
+                        ', '.join(tools) + '. Default: all')
+    parser.add_argument("--samples", help='number of runs of each ' +
+                        'generator. The minimum time is reported',
+                        type=int, default=1)
+    parser.add_argument("--no-prep", dest='no_prep', action='store_true',
+                        help='reuse the concatenated datafiles from an ' +
+                        'earlier run in the work directory')
+    parser.add_argument("--python", help='python interpreter for the ' +
+                        'generators. Default: {}'.format(sys.executable),
+                        default=sys.executable)
+    parser.add_argument("--output", help='results file name. ' +
+                        'Default: WORK_DIR/genbench.json')
+    parser.add_argument("--baseline", help='results file of an earlier ' +
+                        'run to compare against')
+    parser.add_argument("--threshold", help='percent growth of CPU time ' +
+                        'or peak memory flagged as a regression. ' +
+                        'Default: 10', type=float, default=10.0)
+    parser.add_argument("--min-seconds", dest='min_seconds',
+                        help='ignore phases faster than this in the ' +
+                        'baseline. Default: 0.5', type=float, default=0.5)
+    args = parser.parse_args()
+    if not args.configs:
+        args.configs = list(configurations.keys())
+    if not args.tools:
+        args.tools = list(tools)
+    args.xed_dir = os.path.abspath(args.xed_dir)
+    if not args.output:
+        args.output = os.path.join(args.work_dir, 'genbench.json')
+    return args
+
+if __name__ == "__main__":
+    args = setup()
+    r = work(args)
+    sys.exit(r)
@@ -15,27 +15,57 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-#  
+#
 #END_LEGAL
+
+# Measure the XED decode, format and encode speed with the xed command
+# line tool on one or more input binaries.
+#
+# Each sample is one run of the xed tool and yields the average
+# cycles/instruction it reports. The runs for the different inputs and
+# modes are interleaved so that slow drifts of the machine state
+# affect all of them alike. We report the median, p90 and p99 with a
+# distribution free confidence interval for the median.
+#
+# The baselines are stored as JSON, one file per host. Runs are
+# compared to the baseline with the Mann-Whitney U test. A slowdown is
+# a regression only if it is statistically significant and larger than
+# --min-change percent. Without a baseline, the decode median is checked
+# against --max-decode-cpi.
+
 from __future__ import print_function
 import os
 import sys
 import argparse
 import textwrap
-import find_dir
+import subprocess
+import platform
+import json
 import math
+import time
+import find_dir
 
 try:
     import mbuild
-except:    
+except:
     sys.path.append(find_dir.find_dir('mbuild'))
     import mbuild
 
-def graph_it(lst):
+# mode -> (xed tool arguments before the input file name, the stats
+# name in the xed output). The FORMAT stats are only collected when
+# the disassembly is printed.
+modes = { 'decode': (['-v', '0', '-i'],   'DECODE'),
+          'format': (['-v', '2', '-i'],   'FORMAT'),
+          'encode': (['-v', '0', '-ide'], 'ENCODE') }
+mode_order = ['decode', 'format', 'encode']
+
+def graph_it(series):
     import numpy as np
     import matplotlib.pyplot as plt
 
-    plt.plot(lst)
+    for name, lst in series:
+        plt.plot(lst, label=name)
+    plt.legend()
     plt.show()
 
 def variance(cpd):
@@ -46,81 +76,255 @@ def variance(cpd):
         s += d*d
     return s/(len(cpd)-1)
 def standard_deviation(cpd):
+    if len(cpd) < 2:
+        return 0.0
     return math.sqrt(variance(cpd))
 
+def percentile(sorted_samples, pct):
+    """Linear interpolation between the closest ranks"""
+    n = len(sorted_samples)
+    if n == 1:
+        return sorted_samples[0]
+    pos = (n - 1) * pct / 100.0
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, n - 1)
+    frac = pos - lo
+    return sorted_samples[lo] * (1.0 - frac) + sorted_samples[hi] * frac
+
+def median_confidence_interval(sorted_samples, z=1.96):
+    """Distribution free confidence interval for the median from the
+    order statistics. z=1.96 gives about 95%."""
+    n = len(sorted_samples)
+    half_width = z * math.sqrt(n) / 2.0
+    lo = int(math.floor(n / 2.0 - half_width))
+    hi = int(math.ceil(n / 2.0 + half_width))
+    lo = max(lo, 0)
+    hi = min(hi, n - 1)
+    return (sorted_samples[lo], sorted_samples[hi])
+
+def summarize(samples):
+    s = sorted(samples)
+    (ci_lo, ci_hi) = median_confidence_interval(s)
+    return { 'samples': len(s),
+             'median': percentile(s, 50),
+             'p90': percentile(s, 90),
+             'p99': percentile(s, 99),
+             'mean': sum(s) / len(s),
+             'stddev': standard_deviation(s),
+             'min': s[0],
+             'max': s[-1],
+             'ci95_median': [ci_lo, ci_hi] }
+
+def normal_cdf(x):
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+def mann_whitney(a, b):
+    """Two sided Mann-Whitney U test with the normal approximation and
+    tie correction. Return the p-value for the null hypothesis that a
+    and b come from the same distribution."""
+    n1 = len(a)
+    n2 = len(b)
+    combined = sorted([ (x, 0) for x in a ] + [ (x, 1) for x in b ])
+    ranks = [0.0] * len(combined)
+    tie_sum = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j+1][0] == combined[i][0]:
+            j += 1
+        r = (i + j) / 2.0 + 1.0 # average rank of the ties
+        for k in range(i, j + 1):
+            ranks[k] = r
+        t = j - i + 1
+        tie_sum += t * t * t - t
+        i = j + 1
+    r1 = sum([ ranks[k] for k in range(len(combined))
+               if combined[k][1] == 0 ])
+    u1 = r1 - n1 * (n1 + 1) / 2.0
+    mu = n1 * n2 / 2.0
+    n = n1 + n2
+    var = n1 * n2 / 12.0 * ((n + 1) - tie_sum / (n * (n - 1)))
+    if var <= 0:
+        return 1.0
+    z = (abs(u1 - mu) - 0.5) / math.sqrt(var) # continuity correction
+    return min(1.0, 2.0 * (1.0 - normal_cdf(max(z, 0.0))))
+
+def run_xed(args, mode, input_fn):
+    """Run xed once and return the cycles/instruction for mode or None
+    if xed failed or did not report it."""
+    (xed_args, stats_name) = modes[mode]
+    cmd = [args.xed] + xed_args + [input_fn]
+    tag = '#Total cycles/instruction {}:'.format(stats_name)
+    cpi = None
+    # the format mode prints the disassembly. Only keep the stats.
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                         stderr=subprocess.STDOUT,
+                         universal_newlines=True)
+    last_lines = []
+    for line in p.stdout:
+        if line.startswith(tag):
+            cpi = float(line.strip().split()[-1])
+        last_lines = (last_lines + [line])[-10:]
+    status = p.wait()
+    if status or cpi is None:
+        print("Error running: {}".format(' '.join(cmd)))
+        for line in last_lines:
+            print("   ", line, end='')
+        return None
+    return cpi
+
+def measure(args):
+    """Return a dictionary (input, mode) -> list of samples or None on
+    failure"""
+    runs = [ (i, m) for i in args.inputs for m in args.modes ]
+    print("Skipping {} samples...".format(args.skip))
+    for sample in range(0, args.skip):
+        for (input_fn, mode) in runs:
+            if run_xed(args, mode, input_fn) is None:
+                return None
+
+    print("Running  {} tests...".format(args.samples))
+    samples = {}
+    for sample in range(0, args.samples):
+        for (input_fn, mode) in runs:
+            cpi = run_xed(args, mode, input_fn)
+            if cpi is None:
+                print("MISSING SAMPLES")
+                return None
+            samples.setdefault((input_fn, mode), []).append(cpi)
+    return samples
+
+def print_summary(input_fn, mode, cpd, summary):
+    print("{} {}:".format(mode.upper(), input_fn))
+    print(textwrap.fill("  Samples: " +
+                        ", ".join(["{0:6.2f}".format(x) for x in cpd]),
+                        subsequent_indent = "           "))
+    print("  Median : {0:6.2f} cycles/instruction  "
+          "({1:.1f} instructions/kcycle)".format(summary['median'],
+                                                 1000.0 / summary['median']))
+    print("  95% CI : {0:6.2f} .. {1:6.2f}".format(*summary['ci95_median']))
+    print("  p90    : {0:6.2f}".format(summary['p90']))
+    print("  p99    : {0:6.2f}".format(summary['p99']))
+    print("  Average: {0:6.2f}".format(summary['mean']))
+    print("  Range  : {0:6.2f}".format(summary['max'] - summary['min']))
+    print("  Stddev : {0:6.2f}".format(summary['stddev']))
+
+def result_key(input_fn, mode):
+    # baselines are shared across checkouts; key on the file name
+    return '{}:{}'.format(mode, os.path.basename(input_fn))
+
+def baseline_file_name(args):
+    if args.baseline:
+        return args.baseline
+    return os.path.join(args.baseline_dir, '{}.json'.format(args.host))
+
+def compare(args, results, baseline):
+    """Return the number of significant regressions"""
+    regressions = 0
+    print("\nComparing with the baseline from {}".format(
+        baseline.get('date', 'unknown date')))
+    for key, r in sorted(results.items()):
+        if key not in baseline['results']:
+            print("  {:<40} no baseline".format(key))
+            continue
+        b = baseline['results'][key]
+        change = 100.0 * (r['median'] - b['median']) / b['median']
+        p = mann_whitney(r['cpd'], b['cpd'])
+        status = 'same'
+        if p < args.alpha and abs(change) >= args.min_change:
+            if change > 0:
+                status = 'REGRESSION'
+                regressions += 1
+            else:
+                status = 'improved'
+        print("  {0:<40} {1:8.2f} -> {2:8.2f}  {3:+6.1f}%  "
+              "p={4:.4f}  {5}".format(key, b['median'], r['median'],
+                                      change, p, status))
+    return regressions
 
 def work(args):
     print("Testing performance...")
 
-    if not os.path.exists(args.input):
-        mbuild.warn("Performance test input binary not found: {}".format(args.input))
-        return 2
     if not os.path.exists(args.xed):
         mbuild.warn("Performance test executable binary not found: {}".format(args.xed))
         return 2
+    for input_fn in args.inputs:
+        if not os.path.exists(input_fn):
+            mbuild.warn("Performance test input binary not found: {}".format(input_fn))
+            return 2
+    if args.samples < 2:
+        mbuild.warn("Need at least 2 samples")
+        return 2
 
-    s = args.xed + ' -v 0 -i ' + args.input
-    cpd = []
-    
-    print("Skipping {} samples...".format(args.skip))
-    for sample in range(0,args.skip):
-        (status, stdout, stderr) =  mbuild.run_command(s)
+    samples = measure(args)
+    if samples is None:
+        return 2
 
-    print("Running  {} tests...".format(args.samples))
-    for sample in range(0,args.samples):
-        (status, stdout, stderr) =  mbuild.run_command(s)
-        found=False
-        if status == 0 and stdout:
-            for line in stdout:
-                if '#Total cycles/instruction DECODE' in line:
-                    chunks = line.strip().split()
-                    cpd_one = float(chunks[-1])
-                    found = True
-        if status and stdout:
-            print("Error messages from sample {0:d}:".format(sample))
-            for line in stdout:
-                print("   ",line, end=' ')
-        if found:
-            cpd.append(cpd_one)
-    
-    if len(cpd) == args.samples:
-
-        expected = 450.0  # cycles / decode 
-
-        cpd_min = min(cpd)
-        cpd_max = max(cpd)
-        cpd_avg = sum(cpd)/len(cpd)
-        print(textwrap.fill("Samples: " +  
-                            ", ".join(["{0:6.2f}".format(x) for x in cpd]),
-                            subsequent_indent = "         "))
-
-        print("Minimum: {0:6.2f}".format(cpd_min))
-        print("Average: {0:6.2f}".format(cpd_avg))
-        print("Maximum: {0:6.2f}".format(cpd_max))
-        print("Range  : {0:6.2f}".format(cpd_max-cpd_min))
-        print("Stddev : {0:6.2f}".format(standard_deviation(cpd)))
-
-
-        if cpd_avg > expected:
+    results = {}
+    for input_fn in args.inputs:
+        for mode in args.modes:
+            cpd = samples[(input_fn, mode)]
+            summary = summarize(cpd)
+            print_summary(input_fn, mode, cpd, summary)
+            summary['cpd'] = cpd
+            results[result_key(input_fn, mode)] = summary
+
+    if args.graph:
+        graph_it([ (k, v['cpd']) for k, v in sorted(results.items()) ])
+
+    fn = baseline_file_name(args)
+    if args.save_baseline:
+        output = { 'host': args.host,
+                   'platform': platform.platform(),
+                   'processor': platform.processor(),
+                   'xed': os.path.abspath(args.xed),
+                   'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'results': results }
+        mbuild.cmkdir(os.path.dirname(os.path.abspath(fn)))
+        f = open(fn, 'w')
+        json.dump(output, f, indent=1, sort_keys=True)
+        f.write('\n')
+        f.close()
+        print("Saved baseline {}".format(fn))
+        return 0
+
+    if os.path.exists(fn):
+        regressions = compare(args, results, json.load(open(fn)))
+        if regressions:
+            print("PERFORMANCE DEGRADATION: {} significant regressions "
+                  "of more than {:.1f}%".format(regressions, args.min_change))
+            return 1 # error
+        print("Success. No significant regressions.")
+        return 0
+
+    # no baseline for this host. Just check for gross problems.
+    print("\nNo baseline {} for this host.".format(fn))
+    failed = False
+    for input_fn in args.inputs:
+        key = result_key(input_fn, 'decode')
+        if key in results and results[key]['median'] > args.max_decode_cpi:
             s =  ["PERFORMANCE DEGREDATION: "]
-            s.append("Observed {0:.2f} vs Expected {1:.2f}".format(
-                    cpd_avg, expected))
+            s.append("{0} observed {1:.2f} vs expected {2:.2f}".format(
+                key, results[key]['median'], args.max_decode_cpi))
             print("".join(s))
-            return 1 # error
-        print("Success. Average less than {0:.2f}".format(expected))
-        
-        if args.graph:
-            graph_it(cpd)
-        return 0 # success
-    print("MISSING SAMPLES")
-    return 2
+            failed = True
+    if failed:
+        return 1 # error
+    print("Success. Median decode less than {0:.2f}".format(
+        args.max_decode_cpi))
+    return 0 # success
 
 def setup(defaults):
     parser = argparse.ArgumentParser(description='XED Performance testing.')
     parser.add_argument("--xed", help='input XED executable',
                         default=defaults.xed)
-    parser.add_argument("--input", help='input test file name',
-                        default=defaults.input)
+    parser.add_argument("--input", dest='inputs', action='append',
+                        help='input test file name, repeatable. ' +
+                        'Default: {}'.format(', '.join(defaults.inputs)))
+    parser.add_argument("--mode", dest='modes', action='append',
+                        choices=mode_order,
+                        help='what to measure, repeatable. Default: ' +
+                        ', '.join(defaults.modes))
     parser.add_argument("--graph", help='graph the samples',
                         action="store_true",
                         default=defaults.graph)
@@ -128,7 +332,38 @@ def setup(defaults):
                         type=int, default=defaults.samples)
     parser.add_argument("--skip", help='number of samples to skip',
                         type=int, default=defaults.skip)
+    parser.add_argument("--host", help='host name for the baseline. ' +
+                        'Default: {}'.format(defaults.host),
+                        default=defaults.host)
+    parser.add_argument("--baseline-dir", dest='baseline_dir',
+                        help='directory of the per host baselines. ' +
+                        'Default: {}'.format(defaults.baseline_dir),
+                        default=defaults.baseline_dir)
+    parser.add_argument("--baseline", help='baseline file name. ' +
+                        'Default: BASELINE_DIR/HOST.json',
+                        default=defaults.baseline)
+    parser.add_argument("--save-baseline", dest='save_baseline',
+                        help='save the results as the baseline',
+                        action="store_true",
+                        default=defaults.save_baseline)
+    parser.add_argument("--alpha", help='significance level. ' +
+                        'Default: {}'.format(defaults.alpha),
+                        type=float, default=defaults.alpha)
+    parser.add_argument("--min-change", dest='min_change',
+                        help='smallest median change in percent that ' +
+                        'counts as a regression. Default: {}'.format(
+                            defaults.min_change),
+                        type=float, default=defaults.min_change)
+    parser.add_argument("--max-decode-cpi", dest='max_decode_cpi',
+                        help='decode cycles/instruction limit when there ' +
+                        'is no baseline. Default: {}'.format(
+                            defaults.max_decode_cpi),
+                        type=float, default=defaults.max_decode_cpi)
     args = parser.parse_args()
+    if not args.inputs:
+        args.inputs = defaults.inputs
+    if not args.modes:
+        args.modes = defaults.modes
     return args
 
 class args_t:
@@ -137,10 +372,18 @@ class args_t:
 def mkargs():
     args = args_t()
     args.xed = 'obj/examples/xed'
-    args.input = '/usr/bin/emacs24-x'
+    args.inputs = ['/usr/bin/emacs24-x']
+    args.modes = list(mode_order)
     args.graph = False
-    args.samples=10
-    args.skip=12
+    args.samples=20
+    args.skip=2
+    args.host = platform.node()
+    args.baseline_dir = 'perf-baselines'
+    args.baseline = None
+    args.save_baseline = False
+    args.alpha = 0.01
+    args.min_change = 2.0
+    args.max_decode_cpi = 450.0  # cycles / decode
     return args
 
 if __name__ == "__main__":
@@ -148,4 +391,3 @@ if __name__ == "__main__":
     args = setup(defaults)
     r = work(args)
     sys.exit(r)
-    
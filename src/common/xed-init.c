@@ -26,13 +26,7 @@ END_LEGAL */
 
 #include "xed-init.h"
 
-extern void xed_init_inst_table(void);
-extern void xed_init_pointer_names(void);
 extern void xed_init_operand_ctypes(void);
-extern void xed_init_width_mappings(void);
-extern void xed_init_reg_mappings(void);
-extern void xed_init_chip_model_info(void);
-extern void xed_init_convert_tables(void);
 extern void xed_ild_init(void);
 #if defined(XED_MESSAGES)
 # include <stdio.h>
@@ -59,14 +53,9 @@ xed_decode_init(void)
 	return;
     first_time = 0;
     xed_common_init();
-    xed_init_width_mappings();
-    xed_init_reg_mappings();
-
-    xed_init_pointer_names(); // generated function
+    // the instruction, register, width, pointer name, chip feature
+    // and convert tables are generated as initialized const data.
     xed_init_operand_ctypes(); // generated function
-    xed_init_inst_table(); // generated function
-    xed_init_chip_model_info();
-    xed_init_convert_tables();
 }
 
 #if defined(XED_ENCODER)
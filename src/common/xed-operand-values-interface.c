@@ -783,7 +783,7 @@ xed_operand_values_set_operand_reg(xed_operand_values_t* p,
 // PRINTING
 ////////////////////////////////////////////////////////////////////
 static const char* xed_ptr_size(xed_uint_t bytes) {
-    extern const char* xed_pointer_name[XED_MAX_POINTER_NAMES];
+    extern const char* const xed_pointer_name[XED_MAX_POINTER_NAMES];
     if (bytes < XED_MAX_POINTER_NAMES)
         if (xed_pointer_name[bytes])
             return xed_pointer_name[bytes];
@@ -205,7 +205,7 @@ xed_decoded_inst_dump_xed_format(const xed_decoded_inst_t* p,
 }
 
 static const char* xed_decoded_inst_print_ptr_size(xed_uint_t bytes) {
-    extern const char* xed_pointer_name[XED_MAX_POINTER_NAMES];
+    extern const char* const xed_pointer_name[XED_MAX_POINTER_NAMES];
     if (bytes < XED_MAX_POINTER_NAMES)
         if (xed_pointer_name[bytes])
             return xed_pointer_name[bytes];
@@ -213,7 +213,7 @@ static const char* xed_decoded_inst_print_ptr_size(xed_uint_t bytes) {
 }
 
 static const char* instruction_suffix_att(const xed_decoded_inst_t* p) {
-    extern const char* xed_pointer_name_suffix[XED_MAX_POINTER_NAMES];
+    extern const char* const xed_pointer_name_suffix[XED_MAX_POINTER_NAMES];
     if (xed_decoded_inst_number_of_memory_operands(p)) {
         xed_uint_t bytes = xed_decoded_inst_get_memory_operand_length(p,0);
         if (bytes < XED_MAX_POINTER_NAMES)
@@ -69,11 +69,9 @@ char const* xed_iform_to_iclass_string(xed_iform_enum_t iform, int att) {
     const xed_iform_info_t* ii = xed_iform_map(iform);
     if (ii) {
         if (ii->string_table_idx) {
-            char const* p = 0;
             xed_assert(ii->string_table_idx + att < XED_ICLASS_NAME_STR_MAX);
-            p = xed_iclass_string[ii->string_table_idx + att];
-            if (p)
-                return p;
+            return xed_iclass_string_pool +
+                   xed_iclass_string_offset[ii->string_table_idx + att];
         }
         return xed_iclass_enum_t2str( ii->iclass );
     }
@@ -147,8 +147,189 @@ int test_all(test_func_t* base, const char** str_table, const xed_iclass_enum_t*
 }
 
 
+static int decodes_as(xed_uint8_t* buf, xed_uint32_t len,
+                      xed_iclass_enum_t ref_iclass)
+{
+    xed_decoded_inst_t xedd;
+    xed_decoded_inst_zero_set_mode(&xedd, &dstate);
+    xed3_operand_set_cet(&xedd, 1);
+    xed3_operand_set_cldemote(&xedd, 1);
+    xed3_operand_set_wbnoinvd(&xedd, 1);
+    if (xed_decode(&xedd, buf, len) != XED_ERROR_NONE)
+        return 0;
+    return xed_decoded_inst_get_iclass(&xedd) == ref_iclass;
+}
+
+// Encode the tests listed in id_file, in that order, and write the
+// encodings back to back to out_file. Used for building decoder
+// benchmark inputs. See pysrc/gen_corpus.py.
+static int emit_corpus(test_func_t* base,
+                       const char** str_table,
+                       const xed_iclass_enum_t* iclass_table,
+                       int m,
+                       char const* id_file,
+                       char const* out_file)
+{
+    FILE* fin;
+    FILE* fout;
+    int test_id;
+    xed_uint32_t count=0, skipped=0;
+    xed_uint64_t bytes=0;
+    
+    fin = fopen(id_file, "r");
+    if (!fin) {
+        printf("Could not open %s\n", id_file);
+        return 1;
+    }
+    fout = fopen(out_file, "wb");
+    if (!fout) {
+        printf("Could not open %s\n", out_file);
+        fclose(fin);
+        return 1;
+    }
+    while (fscanf(fin, "%d", &test_id) == 1) {
+        xed_uint8_t output_buffer[2*XED_MAX_INSTRUCTION_BYTES];
+        xed_uint32_t enclen;
+        if (test_id < 0 || test_id >= m) {
+            printf("Test ID %d out of range (0...%d)\n", test_id, m-1);
+            fclose(fin);
+            fclose(fout);
+            return 1;
+        }
+        enclen = (*base[test_id])(output_buffer);
+        if (enclen == 0 || enclen > XED_MAX_INSTRUCTION_BYTES ||
+            !decodes_as(output_buffer, enclen, iclass_table[test_id]))
+        {
+            printf("\ttest id %d skipped: bad encoding (%s)\n",
+                   test_id, str_table[test_id]);
+            skipped++;
+            continue;
+        }
+        fwrite(output_buffer, 1, enclen, fout);
+        count++;
+        bytes += enclen;
+    }
+    fclose(fin);
+    fclose(fout);
+    printf("Instructions: %6u\n", count);
+    printf("Bytes:        " XED_FMT_LU "\n", bytes);
+    printf("Skipped:      %6u\n", skipped);
+    return 0;
+}
+
+static int cmp_u64(const void* a, const void* b) {
+    xed_uint64_t x = *(const xed_uint64_t*)a;
+    xed_uint64_t y = *(const xed_uint64_t*)b;
+    return (x > y) - (x < y);
+}
+
+static xed_uint64_t median(xed_uint64_t* samples, xed_uint_t n) {
+    qsort(samples, n, sizeof(xed_uint64_t), cmp_u64);
+    return samples[n/2];
+}
+
+// Time one test function and xed_encode() on the same operands.  The
+// operands for xed_encode() come from decoding the enc2 output. The
+// medians are returned in *enc2_cycles and *xed_cycles. *xed_cycles is
+// -1 if xed_encode() fails or does not reproduce the decoded iclass.
+static int bench_test(int test_id, test_func_t* base,
+                      xed_iclass_enum_t ref_iclass,
+                      xed_uint64_t* samples,
+                      xed_int64_t* enc2_cycles,
+                      xed_int64_t* xed_cycles)
+{
+    xed_decoded_inst_t xedd;
+    xed_encoder_request_t req0, req;
+    xed_uint8_t output_buffer[2*XED_MAX_INSTRUCTION_BYTES];
+    xed_uint8_t xed_buffer[XED_MAX_INSTRUCTION_BYTES];
+    xed_uint32_t enclen=0;
+    unsigned int olen=0;
+    xed_uint64_t t1, t2;
+    xed_uint_t i;
+
+    for(i=0;i<reps;i++) {
+        t1 = xed_get_time();
+        enclen = (*base[test_id])(output_buffer);
+        t2 = xed_get_time();
+        samples[i] = t2 > t1 ? t2-t1 : 0;
+    }
+    *enc2_cycles = (xed_int64_t)median(samples, reps);
+    *xed_cycles = -1;
+
+    if (enclen == 0 || enclen > XED_MAX_INSTRUCTION_BYTES)
+        return 1;
+    xed_decoded_inst_zero_set_mode(&xedd, &dstate);
+    xed3_operand_set_cet(&xedd, 1);
+    xed3_operand_set_cldemote(&xedd, 1);
+    xed3_operand_set_wbnoinvd(&xedd, 1);
+    if (xed_decode(&xedd, output_buffer, enclen) != XED_ERROR_NONE ||
+        xed_decoded_inst_get_iclass(&xedd) != ref_iclass)
+        return 1;
+
+    xed_encoder_request_init_from_decode(&xedd);
+    req0 = xedd;
+    for(i=0;i<reps;i++) {
+        req = req0;
+        t1 = xed_get_time();
+        if (xed_encode(&req, xed_buffer, XED_MAX_INSTRUCTION_BYTES, &olen)
+            != XED_ERROR_NONE)
+            return 0;
+        t2 = xed_get_time();
+        samples[i] = t2 > t1 ? t2-t1 : 0;
+    }
+    if (!decodes_as(xed_buffer, olen, ref_iclass))
+        return 0;
+    *xed_cycles = (xed_int64_t)median(samples, reps);
+    return 0;
+}
+
+// Write "test-id enc2-cycles xed-encode-cycles" lines to out_file,
+// with the median cycles of reps calls per test. See
+// scripts/enc2bench.py for the per iclass, extension and encoding
+// space reports.
+static int bench_all(test_func_t* base,
+                     const char** str_table,
+                     const xed_iclass_enum_t* iclass_table,
+                     int m,
+                     char const* out_file)
+{
+    FILE* fout;
+    xed_uint64_t* samples;
+    xed_int64_t enc2_cycles, xed_cycles;
+    xed_uint32_t errors=0, no_xed=0;
+    int test_id;
+
+    fout = fopen(out_file, "w");
+    if (!fout) {
+        printf("Could not open %s\n", out_file);
+        return 1;
+    }
+    samples = (xed_uint64_t*)malloc(reps*sizeof(xed_uint64_t));
+    fprintf(fout, "# test-id enc2-cycles xed-encode-cycles\n");
+    for(test_id=0;test_id<m;test_id++) {
+        if (bench_test(test_id, base, iclass_table[test_id], samples,
+                       &enc2_cycles, &xed_cycles)) {
+            printf("\ttest id %d ERROR: bad encoding (%s)\n",
+                   test_id, str_table[test_id]);
+            errors++;
+        }
+        if (xed_cycles < 0)
+            no_xed++;
+        fprintf(fout, "%d %lld %lld\n", test_id,
+                (long long)enc2_cycles, (long long)xed_cycles);
+    }
+    free(samples);
+    fclose(fout);
+    printf("Tests:   %6d\n", m);
+    printf("Repeats: %6u\n", reps);
+    printf("Errors:  %6u\n", errors);
+    printf("No xed_encode: %6u\n", no_xed);
+    return errors;
+}
+
 int main(int argc, char** argv) {
     int i=0, m=0, test_id=0, errors=0,specific_tests=0, enable_histogram=0;
+    char const* bench_file = 0;
 #if defined(XED_ENC2_CONFIG_M64_A64)
     test_func_t* base = test_functions_m64_a64;
     const char** str_table = test_functions_m64_a64_str;
@@ -186,9 +367,34 @@ int main(int argc, char** argv) {
         if (strcmp(argv[i],"--histo")==0) {
             enable_histogram = 1;
         }
+        else if (strcmp(argv[i],"--corpus")==0) {
+            if (i+2 >= argc) {
+                fprintf(stderr,"--corpus requires a test id file "
+                        "and an output file name\n");
+                exit(1);
+            }
+            return emit_corpus(base, str_table, iclass_table, m,
+                               argv[i+1], argv[i+2]);
+        }
+        else if (strcmp(argv[i],"--bench")==0) {
+            if (i+1 >= argc) {
+                fprintf(stderr,"--bench requires an output file name\n");
+                exit(1);
+            }
+            bench_file = argv[++i];
+        }
+        else if (strcmp(argv[i],"--reps")==0) {
+            if (i+1 >= argc || atoi(argv[i+1]) < 1) {
+                fprintf(stderr,"--reps requires a positive number\n");
+                exit(1);
+            }
+            reps = (xed_uint_t)atoi(argv[++i]);
+        }
         else if ( strcmp(argv[i],"-h")==0 ||
                   strcmp(argv[i],"--help")==0 )  {
-            fprintf(stderr,"%s [-h|--help] [--histo] [test_id ...]\n", argv[0]);
+            fprintf(stderr,"%s [-h|--help] [--histo] [--reps n] [test_id ...]\n", argv[0]);
+            fprintf(stderr,"%s --corpus test-id-file output-file\n", argv[0]);
+            fprintf(stderr,"%s [--reps n] --bench output-file\n", argv[0]);
             exit(0);
         }
         else {
@@ -210,6 +416,8 @@ int main(int argc, char** argv) {
             }
         }
     }
+    if (bench_file)
+        return bench_all(base, str_table, iclass_table, m, bench_file) > 0;
     if (specific_tests==0) {
         printf("Testing all...\n");
         errors = test_all(base, str_table, iclass_table);
@@ -26,6 +26,12 @@
 # This can also create a bunch of test directories from a bulk command
 # line file. It substitutes BUILDDIR for the path to the xed examples,
 # typically ../obj and that value comes from the env['build_dir']
+#
+# The commands run on env['jobs'] threads (-j). The results are checked
+# and printed in the test order so the output does not depend on the
+# number of jobs. With --batch, the xed commands are sent to "xed
+# --batch" processes that initialize the tables once and fork a child
+# for each command, instead of starting xed once per test.
 
 from __future__ import print_function
 import sys
@@ -33,6 +39,10 @@ import os
 import re
 import time
 import difflib
+import shutil
+import tempfile
+import subprocess
+from multiprocessing.pool import ThreadPool
 
 def find_dir(d):
     dir = os.getcwd()
@@ -147,18 +157,99 @@ def _prep_stream(strm,name):
         print("[{}] {} {}".format(name,len(line),line))
     return strm
 
-def one_test(env,test_dir):
-
+def test_command(env,test_dir):
     cmd_fn = os.path.join(test_dir,"cmd")
     cmd = open(cmd_fn,'r').readlines()[0]
 
     # abspath required for windoze
     build_dir = mbuild.posix_slashes(os.path.abspath(env['build_dir']))
     cmd2 = re.sub('BUILDDIR',build_dir,cmd)
-    cmd2 = cmd2.strip()
+    return cmd2.strip()
+
+def _run_one(cmd):
+    return mbuild.run_command(cmd,separate_stderr=True)
+
+# commands with these characters need the shell
+_shell_chars = re.compile(r'[\'"|<>;&$`*?()\\]')
+
+def _batchable(cmd):
+    words = cmd.split()
+    return (len(words) > 0 and
+            os.path.basename(words[0]) == 'xed' and
+            not _shell_chars.search(cmd))
+
+def _run_batch(job):
+    """Run a list of commands for the same xed with xed --batch. Return
+    the (retcode, stdout, stderr) list or None if xed --batch did not
+    report on every command."""
+    (cmds, tmp_dir) = job
+    xed = cmds[0].split()[0]
+    batch_input = []
+    files = []
+    for i,cmd in enumerate(cmds):
+        out_fn = os.path.join(tmp_dir, "%05d.stdout" % (i))
+        err_fn = os.path.join(tmp_dir, "%05d.stderr" % (i))
+        files.append((out_fn,err_fn))
+        batch_input.append("%s %s %s\n" % (out_fn, err_fn, cmd))
+    p = subprocess.Popen([xed, '--batch'],
+                         stdin=subprocess.PIPE,
+                         stdout=subprocess.PIPE,
+                         universal_newlines=True)
+    (output,_) = p.communicate(''.join(batch_input))
+    statuses = output.split()
+    if p.returncode != 0 or len(statuses) != len(cmds):
+        return None
+    results = []
+    for (status,(out_fn,err_fn)) in zip(statuses,files):
+        results.append((int(status),
+                        open(out_fn,'r').readlines(),
+                        open(err_fn,'r').readlines()))
+    return results
+
+def run_commands(env, cmds):
+    """Return the list of (retcode, stdout, stderr) for the list of
+    commands, in the same order."""
+    jobs = max(1, env['jobs'])
+    results = [None]*len(cmds)
+    if env['batch'] and not env.on_windows():
+        # split the batchable commands in to one chunk per job
+        batched = [ i for i,cmd in enumerate(cmds) if _batchable(cmd) ]
+        by_xed = {}
+        for i in batched:
+            by_xed.setdefault(cmds[i].split()[0], []).append(i)
+        chunks = []
+        for indices in by_xed.values():
+            n = (len(indices) + jobs - 1) // jobs
+            for k in range(0, len(indices), n):
+                chunks.append(indices[k:k+n])
+        tmp_dir = tempfile.mkdtemp(prefix='xed-tests-')
+        batch_jobs = []
+        for k,chunk in enumerate(chunks):
+            chunk_dir = os.path.join(tmp_dir, str(k))
+            os.mkdir(chunk_dir)
+            batch_jobs.append(([ cmds[i] for i in chunk ], chunk_dir))
+        pool = ThreadPool(jobs)
+        for chunk, chunk_results in zip(chunks, pool.map(_run_batch,
+                                                         batch_jobs)):
+            if chunk_results is None:
+                mbuild.warn("xed --batch failed. Running the commands one by one.")
+                continue
+            for i,r in zip(chunk, chunk_results):
+                results[i] = r
+        pool.close()
+        shutil.rmtree(tmp_dir)
+
+    todo = [ i for i in range(len(cmds)) if results[i] is None ]
+    pool = ThreadPool(jobs)
+    for i,r in zip(todo, pool.map(_run_one, [ cmds[i] for i in todo ])):
+        results[i] = r
+    pool.close()
+    return results
+
+def one_test(env,test_dir,cmd2,result):
     print(cmd2)
 
-    (retcode, stdout,stderr) = mbuild.run_command(cmd2,separate_stderr=True)
+    (retcode, stdout,stderr) = result
     print("Retcode %s" % (str(retcode)))
     if stdout:
         stdout = _prep_stream(stdout,"STDOUT")
@@ -200,17 +291,25 @@ def run_tests(env):
     test_dirs = find_tests(env)
     errors = 0
     skipped = 0
+
+    selected = []
+    for tdir in test_dirs:
+        codes_fn = os.path.join(tdir,"codes")
+        codes = open(codes_fn,'r').readlines()[0].strip().split()
+        if all_codes_present(env['codes'],codes):
+            selected.append(tdir)
+    cmds = [ test_command(env,tdir) for tdir in selected ]
+    results = dict(zip(selected, zip(cmds, run_commands(env, cmds))))
+
     for tdir in test_dirs:
         #if env.on_windows():
         #    time.sleep(1) # try to avoid a bug on windows running commands to quickly
         print('-'*40) 
         mbuild.msgb("TESTING" , tdir)
 
-        codes_fn = os.path.join(tdir,"codes")
-        codes = open(codes_fn,'r').readlines()[0].strip().split()
-
-        if all_codes_present(env['codes'],codes):
-            okay = one_test(env,tdir)
+        if tdir in results:
+            (cmd, result) = results[tdir]
+            okay = one_test(env,tdir,cmd,result)
             if not okay:
                 failing_tests.append(tdir)
                 errors += 1
@@ -265,6 +364,13 @@ def work():
                           help="Codes for test subsetting (DEC, ENC, AVX, " 
                              + "AVX512X, AVX512PF, XOP, VIA, KNC)." 
                              + " Only used for running tests, not creating them.")
+    env.parser.add_option("--batch", 
+                          dest="batch", 
+                          action="store_true",
+                          default=False, 
+                          help="Run the xed commands through xed --batch " 
+                             + "instead of one xed process per test. " 
+                             + "Not on windows.")
     env.parse_args()
 
     if not env['tests']:
@@ -315,6 +315,9 @@ def run_decode_generator(gc, env):
     
     if env['compress_operands']:
         gen_extra_args += " --compress-operands" 
+
+    if env['optimize_operand_layout']:
+        gen_extra_args += " --optimize-operand-layout"
         
     cmd = env.expand(gc.decode_command(xedsrc, gen_extra_args))
 
@@ -635,6 +638,7 @@ def mkenv():
                                  pti_test=False,
                                  verbose = 0,
                                  compress_operands=False,
+                                 optimize_operand_layout=False,
                                  test_perf=False,
                                  example_linkflags='',
                                  example_flags='',
@@ -923,6 +927,11 @@ def xed_args(env):
                           dest="compress_operands",
                           help="use bit-fields to compress the "+
                           "operand storage.")
+    env.parser.add_option("--optimize-operand-layout", 
+                          action="store_true",
+                          dest="optimize_operand_layout",
+                          help="Lay out the operand storage by how often "+
+                          "the decoder uses the fields.")
     env.parser.add_option("--test-perf", 
                           action="store_true",
                           dest="test_perf",
@@ -1464,9 +1473,10 @@ def add_encoder_command(env, gc, gen_dag, prep):
                'pysrc/constraint_vec_gen.py', 'pysrc/xedhash.py',
                'pysrc/ild_phash.py', 'pysrc/actions_codegen.py',
                'pysrc/hashlin.py', 'pysrc/hashfks.py', 'pysrc/hashmul.py',
-               'pysrc/func_gen.py', 'pysrc/refine_regs.py',
+               'pysrc/hashlincomb.py', 'pysrc/func_gen.py', 'pysrc/refine_regs.py',
                'pysrc/slash_expand.py', 'pysrc/nt_func_gen.py',
-               'pysrc/scatter.py', 'pysrc/ins_emit.py']
+               'pysrc/scatter.py', 'pysrc/ins_emit.py', 'pysrc/phaseprof.py',
+               'pysrc/gencache.py', 'pysrc/enumer.py', 'pysrc/strpool.py']
 
     enc_py = env.src_dir_join(enc_py)
     gc.enc_hash_file = env.build_dir_join('.mbuild.hash.xedencgen')
@@ -1517,7 +1527,8 @@ def add_encoder2_command(env, dag, input_files, config):
               'pysrc/gen_setup.py',              
               'pysrc/enc2gen.py',
               'pysrc/enc2test.py',
-              'pysrc/enc2argcheck.py' ]
+              'pysrc/enc2argcheck.py',
+              'pysrc/phaseprof.py' ]
 
     enc2args = dummy_obj_t()
     enc_py = env.src_dir_join(enc_py)
@@ -1554,7 +1565,8 @@ def add_decoder_command(env, gc, gen_dag, prep):
              'pysrc/xedhash.py', 'pysrc/ild_phash.py',
              'pysrc/actions_codegen.py', 'pysrc/patterns.py',
              'pysrc/operand_storage.py', 'pysrc/opnds.py', 'pysrc/hashlin.py',
-             'pysrc/hashfks.py', 'pysrc/ild_info.py', 'pysrc/ild_cdict.py',
+             'pysrc/hashfks.py', 'pysrc/hashlincomb.py',
+             'pysrc/ild_info.py', 'pysrc/ild_cdict.py',
              'pysrc/xed3_nt.py', 'pysrc/codegen.py', 'pysrc/ild_nt.py',
              'pysrc/hashmul.py', 'pysrc/enumer.py', 'pysrc/enum_txt_writer.py',
              'pysrc/xed3_nt.py', 'pysrc/ild_disp.py', 'pysrc/ild_imm.py',
@@ -1562,7 +1574,9 @@ def add_decoder_command(env, gc, gen_dag, prep):
              'pysrc/ild_storage_data.py', 'pysrc/slash_expand.py',
              'pysrc/chipmodel.py', 'pysrc/flag_gen.py', 'pysrc/opnd_types.py',
              'pysrc/hlist.py', 'pysrc/ctables.py', 'pysrc/ild.py',
-             'pysrc/refine_regs.py', 'pysrc/metaenum.py', 'pysrc/classifier.py']
+             'pysrc/refine_regs.py', 'pysrc/metaenum.py', 'pysrc/classifier.py',
+             'pysrc/gencache.py', 'pysrc/phaseprof.py', 'pysrc/seqpack.py',
+             'pysrc/strpool.py']
           
     dec_py = env.src_dir_join(dec_py)
     dec_py += mbuild.glob(env['src_dir'], 'datafiles/*enum.txt')
@@ -1918,6 +1932,8 @@ def _test_perf(env):
     import perftest
     args = perftest.mkargs()
     args.xed = xed
+    if not env['encoder']:
+        args.modes.remove('encode')
     r = perftest.work(args) # 2016-04-22 FIXME: need to update interface
     if r != 0:
         # perf test failed. Although calling xbc.cexit() avoids saving
@@ -2538,6 +2554,10 @@ def _run_canned_tests(env,osenv):
     env['test_dir'] = env.escape_string(mbuild.join(env['src_dir'],'tests'))
     wkit = env['wkit']
     cmd = "%(python)s %(test_dir)s/run-cmd.py --build-dir {} ".format(wkit.bin)
+    cmd += " -j {} ".format(env['jobs'])
+    if not env.on_windows():
+        # one xed process runs many tests
+        cmd += " --batch "
 
     dirs = ['tests-base', 'tests-knc', 'tests-avx512', 'tests-xop', 'tests-syntax']
     if env['cet']: